@@ -938,10 +938,14 @@ async def _get_historical_messages_for_task(
     history_length: int | None = None,
 ) -> list[Any]:
     """Get historical messages for a specific task by matching run_id."""
-    history = await get_client().threads.get_history(
-        context_id,
-        limit=LANGGRAPH_HISTORY_QUERY_LIMIT,
-        metadata={"run_id": task_run_id},
+    # threads.get_history can't restrict channels, and only messages are used
+    history = await get_client().http.post(
+        f"/threads/{context_id}/history",
+        json={
+            "limit": LANGGRAPH_HISTORY_QUERY_LIMIT,
+            "metadata": {"run_id": task_run_id},
+            "channels": ["messages"],
+        },
         headers=request_headers,
     )
 
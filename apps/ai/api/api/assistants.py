@@ -17,7 +17,7 @@ from api.feature_flags import FF_USE_CORE_API, USE_RUNTIME_CONTEXT_API
 from api.graph import get_assistant_id, get_graph
 from api.js.base import BaseRemotePregel
 from api.route import ApiRequest, ApiResponse, ApiRoute
-from api.schema import ASSISTANT_FIELDS
+from api.schema import ASSISTANT_FIELDS, ASSISTANT_JSON_FIELDS
 from api.serde import json_loads
 from api.utils import (
     fetchone,
@@ -198,7 +198,9 @@ async def search_assistants(
 ) -> ApiResponse:
     """List assistants."""
     payload = await request.json(AssistantSearchRequest)
-    select = validate_select_columns(payload.get("select") or None, ASSISTANT_FIELDS)
+    select = validate_select_columns(
+        payload.get("select") or None, ASSISTANT_FIELDS, ASSISTANT_JSON_FIELDS
+    )
     offset = int(payload.get("offset") or 0)
     config = payload.get("config")
     if config:
@@ -207,7 +209,7 @@ async def search_assistants(
         except jsonschema_rs.ValidationError as e:
             raise HTTPException(status_code=422, detail=str(e)) from e
     async with connect() as conn:
-        assistants_iter, next_offset = await CrudAssistants.search(
+        assistants_iter, page = await CrudAssistants.search(
             conn,
             graph_id=payload.get("graph_id"),
             metadata=payload.get("metadata"),
@@ -216,10 +218,10 @@ async def search_assistants(
             sort_by=payload.get("sort_by"),
             sort_order=payload.get("sort_order"),
             select=select,
+            cursor=payload.get("cursor"),
+            count=payload.get("count") or "exact",
         )
-    assistants, response_headers = await get_pagination_headers(
-        assistants_iter, next_offset, offset
-    )
+    assistants, response_headers = await get_pagination_headers(assistants_iter, page)
     return ApiResponse(assistants, headers=response_headers)
 
 
@@ -5,8 +5,12 @@ from starlette.responses import JSONResponse, PlainTextResponse
 from api import __version__, config, metadata
 from api.http_metrics import HTTP_METRICS_COLLECTOR
 from api.route import ApiRequest
+from storage.async_postgres_checkpointer import COMPACTION_STATS
+from storage.blob_cache import BLOB_CACHE
 from storage.database import connect, pool_stats
+from storage.inmem_stream import stream_stats
 from storage.ops import Runs
+from storage.partitioning import PARTITION_STATS
 
 
 def plus_features_enabled() -> bool:
@@ -58,16 +62,11 @@ async def meta_metrics(request: ApiRequest):
         metadata.PROJECT_ID, metadata.HOST_REVISION_ID, metrics_format
     )
 
-    pg_redis_stats = pool_stats(
-        project_id=metadata.PROJECT_ID,
-        revision_id=metadata.HOST_REVISION_ID,
-        format=metrics_format,
-    )
-
     if metrics_format == "json":
         async with connect() as conn:
             resp = {
-                **pg_redis_stats,
+                **pool_stats(),
+                "streams": stream_stats(),
                 "queue": await Runs.stats(conn),
                 **http_metrics,
             }
@@ -111,8 +110,109 @@ async def meta_metrics(request: ApiRequest):
                 ]
             )
 
+        blob_cache = BLOB_CACHE.stats()
+        metrics.extend(
+            [
+                "# HELP lg_api_checkpoint_blob_cache_hits_total Checkpoint blob versions served from the cache.",
+                "# TYPE lg_api_checkpoint_blob_cache_hits_total counter",
+                f'lg_api_checkpoint_blob_cache_hits_total{{project_id="{metadata.PROJECT_ID}", revision_id="{metadata.HOST_REVISION_ID}"}} {blob_cache["hits"]}',
+                "# HELP lg_api_checkpoint_blob_cache_misses_total Checkpoint blob versions fetched from Postgres.",
+                "# TYPE lg_api_checkpoint_blob_cache_misses_total counter",
+                f'lg_api_checkpoint_blob_cache_misses_total{{project_id="{metadata.PROJECT_ID}", revision_id="{metadata.HOST_REVISION_ID}"}} {blob_cache["misses"]}',
+                "# HELP lg_api_checkpoint_blob_cache_evictions_total Checkpoint blob versions evicted to stay within the byte budget.",
+                "# TYPE lg_api_checkpoint_blob_cache_evictions_total counter",
+                f'lg_api_checkpoint_blob_cache_evictions_total{{project_id="{metadata.PROJECT_ID}", revision_id="{metadata.HOST_REVISION_ID}"}} {blob_cache["evictions"]}',
+                "# HELP lg_api_checkpoint_blob_cache_bytes Bytes held by the checkpoint blob cache.",
+                "# TYPE lg_api_checkpoint_blob_cache_bytes gauge",
+                f'lg_api_checkpoint_blob_cache_bytes{{project_id="{metadata.PROJECT_ID}", revision_id="{metadata.HOST_REVISION_ID}"}} {blob_cache["bytes"]}',
+            ]
+        )
+
+        metrics.extend(
+            [
+                "# HELP lg_api_checkpoint_compaction_passes_total Completed checkpoint compaction passes.",
+                "# TYPE lg_api_checkpoint_compaction_passes_total counter",
+                f'lg_api_checkpoint_compaction_passes_total{{project_id="{metadata.PROJECT_ID}", revision_id="{metadata.HOST_REVISION_ID}"}} {COMPACTION_STATS["passes"]}',
+                "# HELP lg_api_checkpoint_compaction_threads_total Thread namespaces compacted.",
+                "# TYPE lg_api_checkpoint_compaction_threads_total counter",
+                f'lg_api_checkpoint_compaction_threads_total{{project_id="{metadata.PROJECT_ID}", revision_id="{metadata.HOST_REVISION_ID}"}} {COMPACTION_STATS["threads"]}',
+                "# HELP lg_api_checkpoint_compaction_checkpoints_deleted_total Superseded checkpoints deleted.",
+                "# TYPE lg_api_checkpoint_compaction_checkpoints_deleted_total counter",
+                f'lg_api_checkpoint_compaction_checkpoints_deleted_total{{project_id="{metadata.PROJECT_ID}", revision_id="{metadata.HOST_REVISION_ID}"}} {COMPACTION_STATS["checkpoints_deleted"]}',
+                "# HELP lg_api_checkpoint_compaction_writes_deleted_total Writes of superseded checkpoints deleted.",
+                "# TYPE lg_api_checkpoint_compaction_writes_deleted_total counter",
+                f'lg_api_checkpoint_compaction_writes_deleted_total{{project_id="{metadata.PROJECT_ID}", revision_id="{metadata.HOST_REVISION_ID}"}} {COMPACTION_STATS["writes_deleted"]}',
+                "# HELP lg_api_checkpoint_compaction_blobs_deleted_total Unreferenced checkpoint blob versions deleted.",
+                "# TYPE lg_api_checkpoint_compaction_blobs_deleted_total counter",
+                f'lg_api_checkpoint_compaction_blobs_deleted_total{{project_id="{metadata.PROJECT_ID}", revision_id="{metadata.HOST_REVISION_ID}"}} {COMPACTION_STATS["blobs_deleted"]}',
+                "# HELP lg_api_checkpoint_partitions_created_total Checkpoint time partitions created.",
+                "# TYPE lg_api_checkpoint_partitions_created_total counter",
+                f'lg_api_checkpoint_partitions_created_total{{project_id="{metadata.PROJECT_ID}", revision_id="{metadata.HOST_REVISION_ID}"}} {PARTITION_STATS["partitions_created"]}',
+                "# HELP lg_api_checkpoint_partitions_dropped_total Expired checkpoint time partitions dropped.",
+                "# TYPE lg_api_checkpoint_partitions_dropped_total counter",
+                f'lg_api_checkpoint_partitions_dropped_total{{project_id="{metadata.PROJECT_ID}", revision_id="{metadata.HOST_REVISION_ID}"}} {PARTITION_STATS["partitions_dropped"]}',
+            ]
+        )
+
+        metrics.extend(stream_metrics())
         metrics.extend(http_metrics)
-        metrics.extend(pg_redis_stats)
 
         metrics_response = "\n".join(metrics)
         return PlainTextResponse(metrics_response)
+
+
+# (stats key, type, help) of the stream metrics exported per run and per subscriber
+STREAM_RUN_METRICS = (
+    ("buffered_messages", "gauge", "Messages in a run's replay buffer."),
+    ("buffered_bytes", "gauge", "Bytes in a run's replay buffer."),
+    ("evicted_messages", "counter", "Messages evicted from a run's replay buffer."),
+)
+STREAM_SUBSCRIBER_METRICS = (
+    ("queued_messages", "gauge", "Messages queued for a subscriber."),
+    ("queued_bytes", "gauge", "Bytes queued for a subscriber."),
+    ("dropped_messages", "counter", "Messages dropped from a slow subscriber's queue."),
+    (
+        "coalesced_messages",
+        "counter",
+        "Messages coalesced in a slow subscriber's queue.",
+    ),
+)
+
+
+def stream_metrics() -> list[str]:
+    """Prometheus lines for the in-memory stream queues and replay buffers.
+
+    Subscribers are labelled by their run_id and their position among the run's
+    subscribers.
+    """
+    stats = stream_stats()
+    labels = (
+        f'project_id="{metadata.PROJECT_ID}", revision_id="{metadata.HOST_REVISION_ID}"'
+    )
+    runs = [(run, f'{labels}, run_id="{run["run_id"]}"') for run in stats["runs"]]
+    subscribers = [
+        (subscriber, f'{run_labels}, subscriber="{i}"')
+        for run, run_labels in runs
+        for i, subscriber in enumerate(run["subscribers"])
+    ]
+    metrics = [
+        "# HELP lg_api_stream_queued_bytes Bytes queued for stream subscribers.",
+        "# TYPE lg_api_stream_queued_bytes gauge",
+        f"lg_api_stream_queued_bytes{{{labels}}} {stats['queued_bytes']}",
+        "# HELP lg_api_stream_buffered_bytes Bytes kept in replay buffers of resumable streams.",
+        "# TYPE lg_api_stream_buffered_bytes gauge",
+        f"lg_api_stream_buffered_bytes{{{labels}}} {stats['buffered_bytes']}",
+    ]
+    for prefix, series, entries in (
+        ("lg_api_stream_run", STREAM_RUN_METRICS, runs),
+        ("lg_api_stream_subscriber", STREAM_SUBSCRIBER_METRICS, subscribers),
+    ):
+        for key, kind, help_ in series:
+            name = f"{prefix}_{key}_total" if kind == "counter" else f"{prefix}_{key}"
+            metrics.append(f"# HELP {name} {help_}")
+            metrics.append(f"# TYPE {name} {kind}")
+            metrics.extend(
+                f"{name}{{{entry_labels}}} {entry[key]}"
+                for entry, entry_labels in entries
+            )
+    return metrics
@@ -12,13 +12,14 @@ from api import config
 from api.asyncio import ValueEvent
 from api.models.run import create_valid_run
 from api.route import ApiRequest, ApiResponse, ApiRoute
-from api.schema import CRON_FIELDS, RUN_FIELDS
+from api.schema import CRON_FIELDS, CRON_JSON_FIELDS, RUN_FIELDS
 from api.sse import EventSourceResponse
 from api.utils import (
     fetchone,
     get_pagination_headers,
     uuid7,
     validate_select_columns,
+    validate_stream_id,
     validate_uuid,
 )
 from api.validation import (
@@ -483,6 +484,10 @@ async def join_run_stream(request: ApiRequest):
     validate_uuid(thread_id, "Invalid thread ID: must be a UUID")
     validate_uuid(run_id, "Invalid run ID: must be a UUID")
     stream_mode = request.query_params.get("stream_mode") or None
+    last_event_id = request.headers.get("last-event-id") or None
+    validate_stream_id(
+        last_event_id, "Invalid last-event-id: must be a valid Redis stream ID"
+    )
 
     async def body():
         async with await Runs.Stream.subscribe(run_id, thread_id) as sub:
@@ -492,6 +497,7 @@ async def join_run_stream(request: ApiRequest):
                 cancel_on_disconnect=cancel_on_disconnect,
                 stream_channel=sub,
                 stream_mode=stream_mode,
+                last_event_id=last_event_id,
             ):
                 yield event, message, stream_id
 
@@ -670,7 +676,9 @@ async def delete_cron(request: ApiRequest):
 async def search_crons(request: ApiRequest):
     """List all cron jobs for an assistant"""
     payload = await request.json(CronSearch)
-    select = validate_select_columns(payload.get("select") or None, CRON_FIELDS)
+    select = validate_select_columns(
+        payload.get("select") or None, CRON_FIELDS, CRON_JSON_FIELDS
+    )
     if assistant_id := payload.get("assistant_id"):
         validate_uuid(assistant_id, "Invalid assistant ID: must be a UUID")
     if thread_id := payload.get("thread_id"):
@@ -678,7 +686,7 @@ async def search_crons(request: ApiRequest):
 
     offset = int(payload.get("offset", 0))
     async with connect() as conn:
-        crons_iter, next_offset = await Crons.search(
+        crons_iter, page = await Crons.search(
             conn,
             assistant_id=assistant_id,
             thread_id=thread_id,
@@ -687,10 +695,10 @@ async def search_crons(request: ApiRequest):
             sort_by=payload.get("sort_by"),
             sort_order=payload.get("sort_order"),
             select=select,
+            cursor=payload.get("cursor"),
+            count=payload.get("count") or "exact",
         )
-    crons, response_headers = await get_pagination_headers(
-        crons_iter, next_offset, offset
-    )
+    crons, response_headers = await get_pagination_headers(crons_iter, page)
     return ApiResponse(crons, headers=response_headers)
 
 
@@ -6,7 +6,7 @@ from starlette.responses import Response
 from starlette.routing import BaseRoute
 
 from api.route import ApiRequest, ApiResponse, ApiRoute
-from api.schema import THREAD_FIELDS, ThreadStreamMode
+from api.schema import THREAD_FIELDS, THREAD_JSON_FIELDS, ThreadStreamMode
 from api.sse import EventSourceResponse
 from api.state import state_snapshot_to_thread_state
 from api.utils import (
@@ -22,6 +22,7 @@ from api.validation import (
     ThreadCreate,
     ThreadPatch,
     ThreadSearchRequest,
+    ThreadStateBulkUpdate,
     ThreadStateCheckpointRequest,
     ThreadStateSearch,
     ThreadStateUpdate,
@@ -74,11 +75,13 @@ async def search_threads(
 ):
     """List threads."""
     payload = await request.json(ThreadSearchRequest)
-    select = validate_select_columns(payload.get("select") or None, THREAD_FIELDS)
+    select = validate_select_columns(
+        payload.get("select") or None, THREAD_FIELDS, THREAD_JSON_FIELDS
+    )
     limit = int(payload.get("limit") or 10)
     offset = int(payload.get("offset") or 0)
     async with connect() as conn:
-        threads_iter, next_offset = await Threads.search(
+        threads_iter, page = await Threads.search(
             conn,
             status=payload.get("status"),
             values=payload.get("values"),
@@ -89,10 +92,10 @@ async def search_threads(
             sort_by=payload.get("sort_by"),
             sort_order=payload.get("sort_order"),
             select=select,
+            cursor=payload.get("cursor"),
+            count=payload.get("count") or "exact",
         )
-    threads, response_headers = await get_pagination_headers(
-        threads_iter, next_offset, offset
-    )
+    threads, response_headers = await get_pagination_headers(threads_iter, page)
     return ApiResponse(threads, headers=response_headers)
 
 
@@ -121,6 +124,8 @@ async def get_thread_state(
     validate_uuid(thread_id, "Invalid thread ID: must be a UUID")
     subgraphs = request.query_params.get("subgraphs") in ("true", "True")
     async with connect() as conn:
+        if not subgraphs and (state := await Threads.State.latest(conn, thread_id)):
+            return ApiResponse(state)
         config = {
             "configurable": {
                 **get_configurable_headers(request.headers),
@@ -214,6 +219,32 @@ async def update_thread_state(
     return ApiResponse(inserted)
 
 
+@retry_db
+async def bulk_update_thread_state(
+    request: ApiRequest,
+):
+    """Apply a sequence of supersteps to a thread's state."""
+    thread_id = request.path_params["thread_id"]
+    validate_uuid(thread_id, "Invalid thread ID: must be a UUID")
+    payload = await request.json(ThreadStateBulkUpdate)
+    config = {"configurable": {"thread_id": thread_id}}
+    if payload.get("checkpoint"):
+        config["configurable"].update(payload["checkpoint"])
+    try:
+        if user_id := request.user.display_name:
+            config["configurable"]["user_id"] = user_id
+    except AssertionError:
+        pass
+    config["configurable"].update(get_configurable_headers(request.headers))
+    async with connect() as conn:
+        inserted = await Threads.State.bulk(
+            conn,
+            config=config,
+            supersteps=payload["supersteps"],
+        )
+    return ApiResponse(inserted)
+
+
 @retry_db
 async def get_thread_history(
     request: ApiRequest,
@@ -238,7 +269,11 @@ async def get_thread_history(
         states = [
             state_snapshot_to_thread_state(c)
             for c in await Threads.State.list(
-                conn, config=config, limit=limit, before=before
+                conn,
+                config=config,
+                limit=limit,
+                before=before,
+                channels=request.query_params.getlist("channels") or None,
             )
         ]
     return ApiResponse(states)
@@ -264,6 +299,7 @@ async def get_thread_history_post(
                 limit=int(payload.get("limit") or 1),
                 before=payload.get("before"),
                 metadata=payload.get("metadata"),
+                channels=payload.get("channels"),
             )
         ]
     return ApiResponse(states)
@@ -367,6 +403,11 @@ threads_routes: list[BaseRoute] = [
     ApiRoute(
         "/threads/{thread_id}/state", endpoint=update_thread_state, methods=["POST"]
     ),
+    ApiRoute(
+        "/threads/{thread_id}/state/bulk",
+        endpoint=bulk_update_thread_state,
+        methods=["POST"],
+    ),
     ApiRoute(
         "/threads/{thread_id}/history", endpoint=get_thread_history, methods=["GET"]
     ),
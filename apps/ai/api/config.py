@@ -161,6 +161,29 @@ RESUMABLE_STREAM_TTL_SECONDS = env(
     cast=int,
     default=120,  # 2 minutes
 )
+RESUMABLE_STREAM_MAX_MESSAGES = env(
+    "RESUMABLE_STREAM_MAX_MESSAGES", cast=int, default=10_000
+)
+STREAM_SUBSCRIBER_QUEUE_SIZE = env(
+    "STREAM_SUBSCRIBER_QUEUE_SIZE", cast=int, default=1024
+)
+STREAM_SLOW_CONSUMER_POLICY: Literal["drop-oldest", "coalesce-values", "disconnect"] = (
+    env("STREAM_SLOW_CONSUMER_POLICY", cast=str, default="drop-oldest")
+)
+if STREAM_SLOW_CONSUMER_POLICY not in ("drop-oldest", "coalesce-values", "disconnect"):
+    raise ValueError(
+        f"Unknown STREAM_SLOW_CONSUMER_POLICY value: {STREAM_SLOW_CONSUMER_POLICY}"
+    )
+# Fields thread searches return when the request selects none: "light" leaves
+# out values and interrupts, which list views rarely need and which can be
+# large, "full" returns whole threads.
+THREAD_SEARCH_DEFAULT_FIELDS: Literal["light", "full"] = env(
+    "THREAD_SEARCH_DEFAULT_FIELDS", cast=str, default="light"
+)
+if THREAD_SEARCH_DEFAULT_FIELDS not in ("light", "full"):
+    raise ValueError(
+        f"Unknown THREAD_SEARCH_DEFAULT_FIELDS value: {THREAD_SEARCH_DEFAULT_FIELDS}"
+    )
 
 
 def _get_encryption_key(key_str: str | None):
@@ -174,12 +197,28 @@ def _get_encryption_key(key_str: str | None):
 
 LANGGRAPH_AES_KEY = env("LANGGRAPH_AES_KEY", default=None, cast=_get_encryption_key)
 
+# broker
+BROKER_BACKEND: Literal["redis", "inmem"] = env(
+    "BROKER_BACKEND", cast=str, default="redis"
+)
+"""Queue wakeups, run control, leases and streams. "inmem" keeps them all in
+this process, for single-process deployments (and tests) without Redis."""
+if BROKER_BACKEND not in ("redis", "inmem"):
+    raise ValueError(f"Unknown BROKER_BACKEND value: {BROKER_BACKEND}")
+
 # redis
-REDIS_URI = env("REDIS_URI", cast=str)
+REDIS_URI = env(
+    "REDIS_URI", cast=str, default=None if BROKER_BACKEND == "inmem" else undefined
+)
 REDIS_CLUSTER = env("REDIS_CLUSTER", cast=bool, default=False)
 REDIS_MAX_CONNECTIONS = env("REDIS_MAX_CONNECTIONS", cast=int, default=2000)
 REDIS_CONNECT_TIMEOUT = env("REDIS_CONNECT_TIMEOUT", cast=float, default=10.0)
 REDIS_KEY_PREFIX = env("REDIS_KEY_PREFIX", cast=str, default="")
+if "{" in REDIS_KEY_PREFIX or "}" in REDIS_KEY_PREFIX:
+    # would take over the {run_id} hash tags of the keys
+    raise ValueError(f"REDIS_KEY_PREFIX cannot contain braces: {REDIS_KEY_PREFIX}")
+REDIS_SHARDED_PUBSUB = env("REDIS_SHARDED_PUBSUB", cast=bool, default=False)
+"""Use sharded pubsub (SPUBLISH/SSUBSCRIBE, Redis 7+) in cluster mode."""
 RUN_STATS_CACHE_SECONDS = env("RUN_STATS_CACHE_SECONDS", cast=int, default=60)
 
 # server
@@ -254,14 +293,30 @@ BG_JOB_HEARTBEAT = 120  # seconds
 BG_JOB_INTERVAL = 30  # seconds
 BG_JOB_MAX_RETRIES = 3
 BG_JOB_ISOLATED_LOOPS = env("BG_JOB_ISOLATED_LOOPS", cast=bool, default=False)
+if BG_JOB_ISOLATED_LOOPS and BROKER_BACKEND == "inmem":
+    # the in-process broker is bound to the main event loop
+    raise ValueError("BG_JOB_ISOLATED_LOOPS is not supported with BROKER_BACKEND=inmem")
 BG_JOB_SHUTDOWN_GRACE_PERIOD_SECS = env(
     "BG_JOB_SHUTDOWN_GRACE_PERIOD_SECS",
     cast=int,
     default=180,  # 3 minutes
 )
+# publish compressed and fragmented stream frames, which pods predating them
+# can't decode, so enable once every pod reads them (e.g. after a rolling upgrade)
+STREAM_SPLIT_FRAMES = env("STREAM_SPLIT_FRAMES", cast=bool, default=False)
+# largest stream frame published
 MAX_STREAM_CHUNK_SIZE_BYTES = env(
     "MAX_STREAM_CHUNK_SIZE_BYTES", cast=int, default=1024 * 1024 * 128
 )
+# with STREAM_SPLIT_FRAMES, frames larger than this (at most
+# MAX_STREAM_CHUNK_SIZE_BYTES) are split into fragments when published
+STREAM_SPLIT_THRESHOLD_BYTES = env(
+    "STREAM_SPLIT_THRESHOLD_BYTES", cast=int, default=1024 * 1024
+)
+# stream messages at least this large are zstd-compressed when published, 0 to disable
+STREAM_COMPRESSION_MIN_BYTES = env(
+    "STREAM_COMPRESSION_MIN_BYTES", cast=int, default=1024 * 64
+)
 
 
 def _parse_thread_ttl(value: str | None) -> ThreadTTLConfig | None:
@@ -285,9 +340,122 @@ THREAD_TTL: ThreadTTLConfig | None = env(
 )
 if THREAD_TTL is None and CHECKPOINTER_CONFIG is not None:
     THREAD_TTL = CHECKPOINTER_CONFIG.get("ttl")
+# expired threads deleted per sweeper transaction
+THREAD_TTL_SWEEP_BATCH_SIZE = env("THREAD_TTL_SWEEP_BATCH_SIZE", cast=int, default=100)
 
 N_JOBS_PER_WORKER = env("N_JOBS_PER_WORKER", cast=int, default=10)
 BG_JOB_TIMEOUT_SECS = env("BG_JOB_TIMEOUT_SECS", cast=float, default=3600)
+# Runs with durability="async" queue checkpoint writes and flush them in the
+# background, at most this many statements per transaction.
+CHECKPOINT_WRITE_BEHIND = env("CHECKPOINT_WRITE_BEHIND", cast=bool, default=True)
+CHECKPOINT_WRITE_BEHIND_MAX_BATCH = env(
+    "CHECKPOINT_WRITE_BEHIND_MAX_BATCH", cast=int, default=256
+)
+# Channel values serialized to at least this many bytes are stored once per
+# distinct content and shared across threads and versions (0 disables).
+CHECKPOINT_BLOB_DEDUP_MIN_BYTES = env(
+    "CHECKPOINT_BLOB_DEDUP_MIN_BYTES", cast=int, default=1024
+)
+# List channels that only grew since their previous version are stored as
+# deltas, with a full snapshot at least every this many versions (0 disables).
+CHECKPOINT_DELTA_SNAPSHOT_INTERVAL = env(
+    "CHECKPOINT_DELTA_SNAPSHOT_INTERVAL", cast=int, default=16
+)
+# Byte budget of the process-wide cache of checkpoint blob versions (0 disables).
+CHECKPOINT_BLOB_CACHE_BYTES = env(
+    "CHECKPOINT_BLOB_CACHE_BYTES", cast=int, default=64 * 1024 * 1024
+)
+# Channel values serialized to at least this many bytes are kept in an external
+# blob store instead of Postgres, which only stores their hash and location
+# (0 disables). CHECKPOINT_BLOB_STORE is "file", a directory every server
+# shares, or "s3", a bucket on AWS or any S3-compatible endpoint (requires
+# aiobotocore).
+CHECKPOINT_BLOB_STORE_MIN_BYTES = env(
+    "CHECKPOINT_BLOB_STORE_MIN_BYTES", cast=int, default=0
+)
+CHECKPOINT_BLOB_STORE: Literal["file", "s3"] = env(
+    "CHECKPOINT_BLOB_STORE", cast=str, default="file"
+)
+if CHECKPOINT_BLOB_STORE not in ("file", "s3"):
+    raise ValueError(f"Unknown CHECKPOINT_BLOB_STORE value: {CHECKPOINT_BLOB_STORE}")
+CHECKPOINT_BLOB_STORE_PATH = env(
+    "CHECKPOINT_BLOB_STORE_PATH", cast=str, default="/var/lib/langgraph/blobs"
+)
+CHECKPOINT_BLOB_STORE_S3_BUCKET = env(
+    "CHECKPOINT_BLOB_STORE_S3_BUCKET", cast=str, default=None
+)
+CHECKPOINT_BLOB_STORE_S3_PREFIX = env(
+    "CHECKPOINT_BLOB_STORE_S3_PREFIX", cast=str, default="checkpoint-blobs/"
+)
+CHECKPOINT_BLOB_STORE_S3_ENDPOINT_URL = env(
+    "CHECKPOINT_BLOB_STORE_S3_ENDPOINT_URL", cast=str, default=None
+)
+# How checkpoint values and writes are serialized: "jsonplus" is langgraph's
+# own format, "msgpack" the typed msgpack codec of api.serde, which encodes
+# LangChain messages and registered pydantic models compactly and decodes them
+# without validation. Rows of either, and older json and pickle rows, always load.
+CHECKPOINT_SERDE: Literal["jsonplus", "msgpack"] = env(
+    "CHECKPOINT_SERDE", cast=str, default="jsonplus"
+)
+if CHECKPOINT_SERDE not in ("jsonplus", "msgpack"):
+    raise ValueError(f"Unknown CHECKPOINT_SERDE value: {CHECKPOINT_SERDE}")
+# Serialized checkpoint values and writes of at least this many bytes are
+# zstd-compressed (0 disables). Graphs listed in CHECKPOINT_ZSTD_DICTIONARIES
+# (graph_id -> path of a dictionary trained with `zstd --train`) compress with
+# their dictionary; every listed dictionary is available for decompression, so
+# keep a replaced dictionary listed under a key that isn't a graph_id (e.g.
+# "agent@v1") for as long as rows compressed with it are read.
+CHECKPOINT_COMPRESSION_MIN_BYTES = env(
+    "CHECKPOINT_COMPRESSION_MIN_BYTES", cast=int, default=512
+)
+CHECKPOINT_COMPRESSION_LEVEL = env("CHECKPOINT_COMPRESSION_LEVEL", cast=int, default=3)
+CHECKPOINT_ZSTD_DICTIONARIES: dict[str, str] | None = env(
+    "CHECKPOINT_ZSTD_DICTIONARIES", cast=_parse_json, default=None
+)
+# Keep only the latest this many checkpoints per thread and namespace, plus
+# interrupted ones and the last of each run (0 disables). Superseded checkpoints
+# and their writes and blob versions are deleted in the background every
+# CHECKPOINT_COMPACTION_INTERVAL_SECS, at most CHECKPOINT_COMPACTION_BATCH_SIZE
+# rows per statement, sleeping CHECKPOINT_COMPACTION_THROTTLE_SECS in between.
+CHECKPOINT_RETENTION_KEEP_LATEST = env(
+    "CHECKPOINT_RETENTION_KEEP_LATEST", cast=int, default=0
+)
+CHECKPOINT_COMPACTION_INTERVAL_SECS = env(
+    "CHECKPOINT_COMPACTION_INTERVAL_SECS", cast=float, default=300
+)
+CHECKPOINT_COMPACTION_BATCH_SIZE = env(
+    "CHECKPOINT_COMPACTION_BATCH_SIZE", cast=int, default=500
+)
+CHECKPOINT_COMPACTION_THROTTLE_SECS = env(
+    "CHECKPOINT_COMPACTION_THROTTLE_SECS", cast=float, default=0.1
+)
+# Partitioning of checkpoints, checkpoint_writes and checkpoint_blobs, applied
+# at startup to tables not yet partitioned. "hash" splits all three by thread
+# into CHECKPOINT_PARTITION_COUNT partitions, copying the existing rows. "time"
+# splits checkpoints and their writes into ranges of
+# CHECKPOINT_PARTITION_INTERVAL_DAYS by creation, created
+# CHECKPOINT_PARTITION_PREMAKE ranges ahead, keeps existing rows in a default
+# partition and hash-partitions blobs. Ranges entirely older than
+# CHECKPOINT_PARTITION_RETENTION_DAYS are dropped (0 disables), so set
+# LANGGRAPH_THREAD_TTL no longer than that to expire threads as a whole.
+CHECKPOINT_PARTITIONING: Literal["none", "hash", "time"] = env(
+    "CHECKPOINT_PARTITIONING", cast=str, default="none"
+)
+if CHECKPOINT_PARTITIONING not in ("none", "hash", "time"):
+    raise ValueError(
+        f"Unknown CHECKPOINT_PARTITIONING value: {CHECKPOINT_PARTITIONING}"
+    )
+CHECKPOINT_PARTITION_COUNT = env("CHECKPOINT_PARTITION_COUNT", cast=int, default=16)
+CHECKPOINT_PARTITION_INTERVAL_DAYS = env(
+    "CHECKPOINT_PARTITION_INTERVAL_DAYS", cast=int, default=7
+)
+CHECKPOINT_PARTITION_PREMAKE = env("CHECKPOINT_PARTITION_PREMAKE", cast=int, default=4)
+CHECKPOINT_PARTITION_RETENTION_DAYS = env(
+    "CHECKPOINT_PARTITION_RETENTION_DAYS", cast=int, default=0
+)
+CHECKPOINT_PARTITION_MAINTENANCE_INTERVAL_SECS = env(
+    "CHECKPOINT_PARTITION_MAINTENANCE_INTERVAL_SECS", cast=float, default=3600
+)
 
 FF_CRONS_ENABLED = env("FF_CRONS_ENABLED", cast=bool, default=True)
 FF_RICH_THREADS = env("FF_RICH_THREADS", cast=bool, default=True)
@@ -20,11 +20,14 @@ from langgraph_sdk.schema import Config
 from starlette.exceptions import HTTPException
 
 from api.schema import (
+    ASSISTANT_FIELDS,
     Assistant,
     AssistantSelectField,
     Context,
     MetadataInput,
     OnConflictBehavior,
+    Page,
+    SearchCount,
 )
 
 from .client import GrpcClient
@@ -266,9 +269,19 @@ class Assistants(Authenticated):
         sort_by: str | None = None,
         sort_order: str | None = None,
         select: list[AssistantSelectField] | None = None,
+        cursor: str | None = None,
+        count: SearchCount = "exact",
         ctx: Any = None,
-    ) -> tuple[AsyncIterator[Assistant], int | None]:  # type: ignore[return-value]
+    ) -> tuple[AsyncIterator[Assistant], Page]:  # type: ignore[return-value]
         """Search assistants via gRPC."""
+        if cursor:
+            raise HTTPException(
+                status_code=422, detail="Cursor pagination is not supported"
+            )
+        if select and any(field not in ASSISTANT_FIELDS for field in select):
+            raise HTTPException(
+                status_code=422, detail="Selecting JSON sub-paths is not supported"
+            )
         # Handle auth filters
         auth_filters = await Assistants.handle_event(
             ctx,
@@ -304,7 +317,20 @@ class Assistants(Authenticated):
 
         # Determine if there are more results
         # Note: gRPC doesn't return cursor info, so we estimate based on result count
-        cursor = offset + limit if len(assistants) == limit else None
+        more = len(assistants) == limit
+        page = Page(
+            next_offset=offset + limit if more else None,
+            next_cursor=None,
+            total=None,
+            total_estimate=None,
+        )
+        if not more and (assistants or not offset):
+            page["total"] = offset + len(assistants)
+        if count != "none":
+            # the service has no row estimates, so estimates are exact counts
+            page["total"] = await Assistants.count(
+                conn, graph_id=graph_id, metadata=metadata, ctx=ctx
+            )
 
         async def generate_results():
             for assistant in assistants:
@@ -312,7 +338,7 @@ class Assistants(Authenticated):
                     k: v for k, v in assistant.items() if select is None or k in select
                 }
 
-        return generate_results(), cursor
+        return generate_results(), page
 
     @staticmethod
     async def get(
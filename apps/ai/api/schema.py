@@ -29,6 +29,8 @@ OnCompletion = Literal["delete", "keep"]
 
 IfNotExists = Literal["create", "reject"]
 
+SearchCount = Literal["exact", "estimate", "none"]
+
 All = Literal["*"]
 
 Context: TypeAlias = dict[str, Any]
@@ -253,6 +255,19 @@ class QueueStats(TypedDict):
     med_age_secs: datetime | None
 
 
+class Page(TypedDict):
+    """Where a page of search results ends."""
+
+    next_offset: int | None
+    """The offset of the next page, if any and paging by offset."""
+    next_cursor: str | None
+    """The cursor of the next page, if any."""
+    total: int | None
+    """The number of matching rows, if counted or known."""
+    total_estimate: int | None
+    """The planner's estimate of the number of matching rows, if asked for."""
+
+
 # Canonical field sets for select= validation and type aliases for ops
 
 # Assistant select fields (intentionally excludes 'context')
@@ -269,6 +284,7 @@ AssistantSelectField = Literal[
     "version",
 ]
 ASSISTANT_FIELDS: set[str] = set(AssistantSelectField.__args__)  # type: ignore[attr-defined]
+ASSISTANT_JSON_FIELDS = frozenset({"config", "context", "metadata"})
 
 # Thread select fields
 ThreadSelectField = Literal[
@@ -283,6 +299,19 @@ ThreadSelectField = Literal[
     "interrupts",
 ]
 THREAD_FIELDS: set[str] = set(ThreadSelectField.__args__)  # type: ignore[attr-defined]
+THREAD_JSON_FIELDS = frozenset(
+    {"metadata", "config", "context", "values", "interrupts"}
+)
+# Selected by thread searches that don't select fields, unless
+# THREAD_SEARCH_DEFAULT_FIELDS is "full": values and interrupts can be large
+THREAD_LIST_FIELDS: list[str] = [
+    "thread_id",
+    "created_at",
+    "updated_at",
+    "metadata",
+    "config",
+    "status",
+]
 
 # Run select fields
 RunSelectField = Literal[
@@ -314,3 +343,4 @@ CronSelectField = Literal[
     "now",
 ]
 CRON_FIELDS: set[str] = set(CronSelectField.__args__)  # type: ignore[attr-defined]
+CRON_JSON_FIELDS = frozenset({"payload", "metadata"})
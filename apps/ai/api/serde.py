@@ -1,10 +1,12 @@
 import asyncio
+import functools
 import re
+import threading
 import uuid
 from base64 import b64encode
 from collections import deque
 from collections.abc import Mapping
-from datetime import timedelta, timezone
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 from ipaddress import (
     IPv4Address,
@@ -16,13 +18,26 @@ from ipaddress import (
 )
 from pathlib import Path
 from re import Pattern
-from typing import Any, NamedTuple, cast
+from types import NoneType
+from typing import Any, NamedTuple, TypeVar, cast
 from zoneinfo import ZoneInfo
 
 import cloudpickle
 import orjson
+import ormsgpack
 import structlog
+import zstandard
+from langchain_core import messages
+from langgraph.checkpoint.serde import jsonplus
 from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from pydantic import BaseModel
+
+from api.config import (
+    CHECKPOINT_COMPRESSION_LEVEL,
+    CHECKPOINT_COMPRESSION_MIN_BYTES,
+    CHECKPOINT_SERDE,
+    CHECKPOINT_ZSTD_DICTIONARIES,
+)
 
 logger = structlog.stdlib.get_logger(__name__)
 
@@ -157,18 +172,186 @@ async def ajson_loads(content: bytes | Fragment) -> Any:
     return await asyncio.to_thread(json_loads, content)
 
 
+ZSTD_SUFFIX = "+zstd"
+
+
+@functools.cache
+def _zstd_dictionaries() -> dict[str, zstandard.ZstdCompressionDict]:
+    """Trained dictionaries from CHECKPOINT_ZSTD_DICTIONARIES, by graph_id."""
+    dictionaries = {}
+    for graph_id, path in (CHECKPOINT_ZSTD_DICTIONARIES or {}).items():
+        with open(path, "rb") as f:
+            dictionaries[graph_id] = zstandard.ZstdCompressionDict(f.read())
+    return dictionaries
+
+
+@functools.cache
+def _zstd_dictionaries_by_id() -> dict[int, zstandard.ZstdCompressionDict]:
+    return {d.dict_id(): d for d in _zstd_dictionaries().values()}
+
+
+def zstd_dictionary(graph_id: str | None) -> zstandard.ZstdCompressionDict | None:
+    """Return the trained dictionary to compress a graph's checkpoints with."""
+    return _zstd_dictionaries().get(graph_id) if graph_id else None
+
+
+# Typed msgpack (CHECKPOINT_SERDE="msgpack") encodes UUIDs, datetimes and
+# registered pydantic models, which include every LangChain message class, as
+# extension types of their own. Models are named by their registered name
+# instead of their module and class, and decoded with model_construct from the
+# registry, without importing anything or validating fields again. Other
+# objects use the extension types of JsonPlusSerializer's msgpack, whose codes
+# are below these.
+TYPED_MSGPACK = "msgpack-typed"
+EXT_UUID = 64
+EXT_DATETIME = 65
+EXT_MODEL = 66
+
+M = TypeVar("M", bound=type[BaseModel])
+
+_msgpack_models: dict[str, type[BaseModel]] = {}
+_msgpack_model_names: dict[type[BaseModel], str] = {}
+
+
+def register_msgpack_model(cls: M, name: str | None = None) -> M:
+    """Encode instances of a pydantic model by name in typed msgpack.
+
+    Fields are stored as they are, with nested models encoded on their own, and
+    loaded without validation. Rows written before a model is registered, or
+    after it's renamed, load as their field dicts. Usable as a class decorator.
+    """
+    name = name or f"{cls.__module__}.{cls.__qualname__}"
+    if _msgpack_models.setdefault(name, cls) is not cls:
+        raise ValueError(f"Another model is registered as {name}")
+    _msgpack_model_names[cls] = name
+    return cls
+
+
+for _name in messages.__all__:
+    _cls = getattr(messages, _name)
+    if isinstance(_cls, type) and issubclass(_cls, messages.BaseMessage):
+        register_msgpack_model(_cls, _name)
+
+
+def _typed_msgpack_default(obj: Any) -> Any:
+    if isinstance(obj, uuid.UUID):
+        return ormsgpack.Ext(EXT_UUID, obj.bytes)
+    if isinstance(obj, datetime):
+        return ormsgpack.Ext(EXT_DATETIME, obj.isoformat().encode())
+    if (name := _msgpack_model_names.get(type(obj))) is not None:
+        # shallow, unlike model_dump(), so nested models keep their types
+        fields = obj.__dict__
+        if obj.__pydantic_extra__:
+            fields = {**fields, **obj.__pydantic_extra__}
+        return ormsgpack.Ext(EXT_MODEL, typed_msgpack_dumps((name, fields)))
+    return jsonplus._msgpack_default(obj)
+
+
+def _typed_msgpack_ext_hook(code: int, data: bytes) -> Any:
+    if code == EXT_UUID:
+        return uuid.UUID(bytes=data)
+    if code == EXT_DATETIME:
+        return datetime.fromisoformat(data.decode())
+    if code == EXT_MODEL:
+        name, fields = typed_msgpack_loads(data)
+        if (cls := _msgpack_models.get(name)) is None:
+            return fields
+        return cls.model_construct(**fields)
+    return jsonplus._msgpack_ext_hook(code, data)
+
+
+def typed_msgpack_dumps(obj: Any) -> bytes:
+    return ormsgpack.packb(obj, default=_typed_msgpack_default, option=jsonplus._option)
+
+
+def _msgpack_array_header(n: int) -> bytes:
+    if n < 16:
+        return bytes((0x90 | n,))
+    if n < 2**16:
+        return b"\xdc" + n.to_bytes(2, "big")
+    return b"\xdd" + n.to_bytes(4, "big")
+
+
+def typed_msgpack_loads(data: bytes) -> Any:
+    return ormsgpack.unpackb(
+        data, ext_hook=_typed_msgpack_ext_hook, option=ormsgpack.OPT_NON_STR_KEYS
+    )
+
+
 class Serializer(JsonPlusSerializer):
+    """JsonPlusSerializer with typed msgpack, a pickle fallback and zstd compression.
+
+    Values are written as CHECKPOINT_SERDE selects, and rows of every type load
+    under either setting. Values serialized to at least
+    CHECKPOINT_COMPRESSION_MIN_BYTES are stored as "<type>+zstd", so rows
+    written without compression still load.
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        compression_dict: zstandard.ZstdCompressionDict | None = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.compression_dict = compression_dict
+        # zstd (de)compressors are not thread-safe, and dumps/loads run in threads
+        self.local = threading.local()
+
     def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
         try:
-            return super().dumps_typed(obj)
+            if CHECKPOINT_SERDE == "msgpack" and not isinstance(
+                obj, NoneType | bytes | bytearray
+            ):
+                type_, data = TYPED_MSGPACK, typed_msgpack_dumps(obj)
+            else:
+                type_, data = super().dumps_typed(obj)
+        except TypeError:
+            type_, data = "pickle", cloudpickle.dumps(obj)
+        return self._compress(type_, data)
+
+    def dumps_items(self, items: list[Any]) -> list[bytes] | None:
+        """Serialize each item of a list as dumps_typed encodes it in the list.
+
+        Returns None if an item needs the list to fall back to pickle.
+        """
+        dumps = (
+            typed_msgpack_dumps
+            if CHECKPOINT_SERDE == "msgpack"
+            else jsonplus._msgpack_enc
+        )
+        try:
+            return [dumps(item) for item in items]
         except TypeError:
-            return "pickle", cloudpickle.dumps(obj)
+            return None
+
+    def dumps_typed_items(self, items: list[bytes]) -> tuple[str, bytes]:
+        """Serialize a list from the dumps_items of its items, as dumps_typed would.
+
+        A msgpack array is its length followed by its items, so the items are
+        not serialized again.
+        """
+        type_ = TYPED_MSGPACK if CHECKPOINT_SERDE == "msgpack" else "msgpack"
+        return self._compress(
+            type_, _msgpack_array_header(len(items)) + b"".join(items)
+        )
+
+    def _compress(self, type_: str, data: bytes) -> tuple[str, bytes]:
+        if 0 < CHECKPOINT_COMPRESSION_MIN_BYTES <= len(data):
+            compressed = self._compressor().compress(data)
+            if len(compressed) < len(data):
+                return type_ + ZSTD_SUFFIX, compressed
+        return type_, data
 
     def dumps(self, obj: Any) -> bytes:
         # See comment above (in json_dumpb)
         return super().dumps(obj).replace(rb"\\u0000", b"").replace(rb"\u0000", b"")
 
     def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        if data[0].endswith(ZSTD_SUFFIX):
+            data = (data[0][: -len(ZSTD_SUFFIX)], self._decompress(data[1]))
+        if data[0] == TYPED_MSGPACK:
+            return typed_msgpack_loads(data[1])
         if data[0] == "pickle":
             try:
                 return cloudpickle.loads(data[1])
@@ -179,6 +362,30 @@ class Serializer(JsonPlusSerializer):
                 return None
         return super().loads_typed(data)
 
+    def _compressor(self) -> zstandard.ZstdCompressor:
+        if (compressor := getattr(self.local, "compressor", None)) is None:
+            compressor = self.local.compressor = zstandard.ZstdCompressor(
+                level=CHECKPOINT_COMPRESSION_LEVEL, dict_data=self.compression_dict
+            )
+        return compressor
+
+    def _decompress(self, data: bytes) -> bytes:
+        # frames name the dictionary they were compressed with, if any
+        dict_id = zstandard.get_frame_parameters(data).dict_id
+        decompressors = self.local.__dict__.setdefault("decompressors", {})
+        if (decompressor := decompressors.get(dict_id)) is None:
+            dict_data = _zstd_dictionaries_by_id().get(dict_id) if dict_id else None
+            if dict_id and dict_data is None:
+                raise ValueError(
+                    f"Value was compressed with zstd dictionary {dict_id}, which "
+                    "isn't in CHECKPOINT_ZSTD_DICTIONARIES. Keep replaced "
+                    "dictionaries listed there under a key that isn't a graph_id."
+                )
+            decompressor = decompressors[dict_id] = zstandard.ZstdDecompressor(
+                dict_data=dict_data
+            )
+        return decompressor.decompress(data)
+
 
 mpack_keys = {"method", "value"}
 SERIALIZER = Serializer()
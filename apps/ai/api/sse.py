@@ -1,5 +1,7 @@
 import asyncio
+import time
 from collections.abc import AsyncIterator, Awaitable, Callable, Mapping
+from contextlib import asynccontextmanager
 from functools import partial
 from typing import Any
 
@@ -9,7 +11,7 @@ import sse_starlette.sse
 import structlog.stdlib
 from starlette.types import Receive, Scope, Send
 
-from api.asyncio import SimpleTaskGroup, aclosing
+from api.asyncio import aclosing
 from api.serde import json_dumpb
 
 logger = structlog.stdlib.get_logger(__name__)
@@ -27,6 +29,9 @@ class EventSourceResponse(sse_starlette.EventSourceResponse):
         super().__init__(content=content, status_code=status_code, headers=headers)
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # The response is streamed from this task, with a single child task
+        # listening for client disconnects. Heartbeats and the server exit
+        # signal are handled for all connections by the shared HEARTBEATS.
         async with anyio.create_task_group() as task_group:
             # https://trio.readthedocs.io/en/latest/reference-core.html#custom-supervisors
             async def wrap(func: Callable[[], Awaitable[None]]) -> None:
@@ -34,18 +39,19 @@ class EventSourceResponse(sse_starlette.EventSourceResponse):
                 # noinspection PyAsyncCall
                 task_group.cancel_scope.cancel()
 
-            task_group.start_soon(wrap, partial(self.stream_response, send))
-            task_group.start_soon(wrap, self._listen_for_exit_signal)
+            task_group.start_soon(wrap, partial(self._listen_for_disconnect, receive))
 
             if self.data_sender_callable:
                 task_group.start_soon(self.data_sender_callable)
 
-            await wrap(partial(self._listen_for_disconnect, receive))
+            await wrap(partial(self.stream_response, send, task_group.cancel_scope))
 
         if self.background is not None:  # pragma: no cover, tested in StreamResponse
             await self.background()
 
-    async def stream_response(self, send: Send) -> None:
+    async def stream_response(
+        self, send: Send, cancel_scope: anyio.CancelScope | None = None
+    ) -> None:
         await send(
             {
                 "type": "http.response.start",
@@ -54,47 +60,157 @@ class EventSourceResponse(sse_starlette.EventSourceResponse):
             }
         )
         async with (
-            SimpleTaskGroup(sse_heartbeat(send), cancel=True, wait=False),
+            HEARTBEATS.register(send, self._send_lock, cancel_scope) as stream,
             aclosing(self.body_iterator) as body,
         ):
             try:
                 async for data in body:
-                    with anyio.move_on_after(self.send_timeout) as timeout:
-                        await send(
-                            {
-                                "type": "http.response.body",
-                                "body": (
-                                    json_to_sse(*data)
-                                    if isinstance(data, tuple)
-                                    else data
-                                ),
-                                "more_body": True,
-                            }
-                        )
+                    stream.busy = True
+                    try:
+                        with anyio.move_on_after(self.send_timeout) as timeout:
+                            async with self._send_lock:
+                                await send(
+                                    {
+                                        "type": "http.response.body",
+                                        "body": (
+                                            json_to_sse(*data)
+                                            if isinstance(data, tuple)
+                                            else data
+                                        ),
+                                        "more_body": True,
+                                    }
+                                )
+                    finally:
+                        stream.busy = False
+                        stream.last_sent = time.monotonic()
                     if timeout.cancel_called:
                         raise sse_starlette.sse.SendTimeoutError()
             except sse_starlette.sse.SendTimeoutError:
                 raise
             except Exception as exc:
                 await logger.aexception("Error streaming response", exc_info=exc)
-                await send(
-                    {
-                        "type": "http.response.body",
-                        "body": json_to_sse(b"error", exc),
-                        "more_body": True,
-                    }
-                )
+                async with self._send_lock:
+                    await send(
+                        {
+                            "type": "http.response.body",
+                            "body": json_to_sse(b"error", exc),
+                            "more_body": True,
+                        }
+                    )
 
         async with self._send_lock:
             self.active = False
             await send({"type": "http.response.body", "body": b"", "more_body": False})
 
 
-async def sse_heartbeat(send: Send) -> None:
-    payload = sse_starlette.ServerSentEvent(comment="heartbeat").encode()
-    while True:
-        await asyncio.sleep(5)
-        await send({"type": "http.response.body", "body": payload, "more_body": True})
+HEARTBEAT_PAYLOAD = sse_starlette.ServerSentEvent(comment="heartbeat").encode()
+HEARTBEAT_MESSAGE = {
+    "type": "http.response.body",
+    "body": HEARTBEAT_PAYLOAD,
+    "more_body": True,
+}
+# streams idle for this long get a heartbeat
+HEARTBEAT_INTERVAL_SECS = 5.0
+# how often the shared ticker checks for idle streams
+HEARTBEAT_TICK_SECS = 1.0
+# a stream whose client doesn't take a heartbeat within this long is cancelled
+HEARTBEAT_SEND_TIMEOUT_SECS = 0.05
+
+
+class HeartbeatStream:
+    __slots__ = ("send", "lock", "cancel_scope", "last_sent", "busy")
+
+    def __init__(
+        self, send: Send, lock: anyio.Lock, cancel_scope: anyio.CancelScope | None
+    ) -> None:
+        self.send = send
+        # the response's send lock, held for every message sent on the stream
+        self.lock = lock
+        self.cancel_scope = cancel_scope
+        self.last_sent = time.monotonic()
+        self.busy = False
+
+
+class HeartbeatScheduler:
+    """Send SSE heartbeats for all open streams from a single task.
+
+    Streams that sent data within the heartbeat interval, or are in the middle
+    of sending, are skipped. Heartbeats are sent one after the other from the
+    scheduler's task, without starting a task per stream. A heartbeat only
+    needs to be buffered by the server, so a stream whose client doesn't take
+    one within the send timeout is stalled and gets cancelled, which bounds
+    how long it holds up the others. Streams are unregistered before their
+    final message, after which no heartbeat is sent. On server shutdown, the
+    streams are cancelled."""
+
+    def __init__(
+        self,
+        interval: float = HEARTBEAT_INTERVAL_SECS,
+        tick: float = HEARTBEAT_TICK_SECS,
+        send_timeout: float = HEARTBEAT_SEND_TIMEOUT_SECS,
+    ) -> None:
+        self.interval = interval
+        self.tick = tick
+        self.send_timeout = send_timeout
+        self.streams: set[HeartbeatStream] = set()
+        self.task: asyncio.Task | None = None
+
+    @asynccontextmanager
+    async def register(
+        self,
+        send: Send,
+        lock: anyio.Lock,
+        cancel_scope: anyio.CancelScope | None = None,
+    ) -> AsyncIterator[HeartbeatStream]:
+        stream = HeartbeatStream(send, lock, cancel_scope)
+        self.streams.add(stream)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+        try:
+            yield stream
+        finally:
+            self.streams.discard(stream)
+
+    async def run(self) -> None:
+        # exits once no streams are open, restarted by the next register()
+        while self.streams:
+            await asyncio.sleep(self.tick)
+            if sse_starlette.sse.AppStatus.should_exit:
+                for stream in self.streams:
+                    if stream.cancel_scope is not None:
+                        stream.cancel_scope.cancel()
+                continue
+            idle_since = time.monotonic() - self.interval
+            # streams (un)register while heartbeats are sent
+            for stream in list(self.streams):
+                if (
+                    not stream.busy
+                    and stream.last_sent <= idle_since
+                    and stream in self.streams
+                ):
+                    await self.heartbeat(stream)
+
+    async def heartbeat(self, stream: HeartbeatStream) -> None:
+        try:
+            # held by a data send, which resets the stream's idle time anyway
+            stream.lock.acquire_nowait()
+        except anyio.WouldBlock:
+            return
+        stream.busy = True
+        try:
+            with anyio.move_on_after(self.send_timeout) as timeout:
+                await stream.send(HEARTBEAT_MESSAGE)
+            if timeout.cancel_called and stream.cancel_scope is not None:
+                stream.cancel_scope.cancel()
+        except Exception as exc:
+            await logger.adebug("Error sending heartbeat", exc_info=exc)
+        finally:
+            stream.lock.release()
+            stream.busy = False
+            stream.last_sent = time.monotonic()
+
+
+HEARTBEATS = HeartbeatScheduler()
 
 
 SEP = b"\r\n"
@@ -31,6 +31,9 @@ from pydantic.v1 import ValidationError as ValidationErrorLegacy
 from storage.async_postgres_checkpointer import (
     AsyncPostgresCheckpointer as AsyncPostgresSaver,
 )
+from storage.async_postgres_checkpointer import (
+    WriteBehindCheckpointer,
+)
 
 if TYPE_CHECKING:
     from langchain_core.runnables import RunnableConfig
@@ -39,14 +42,16 @@ from api import __version__
 from api import store as api_store
 from api.asyncio import ValueEvent, wait_if_not_done
 from api.command import map_cmd
+from api.config import CHECKPOINT_WRITE_BEHIND
 from api.feature_flags import USE_DURABILITY, USE_RUNTIME_CONTEXT_API
 from api.graph import get_graph
 from api.js.base import BaseRemotePregel
 from api.metadata import HOST, PLAN, USER_API_URL, incr_nodes
 from api.schema import Run, StreamMode
-from api.serde import json_dumpb
+from api.serde import Serializer, json_dumpb, zstd_dictionary
 from api.utils.config import run_in_executor
 from api.utils.stream_codec import STREAM_CODEC
+from storage.database import current_pool
 from storage.ops import Runs
 
 logger = structlog.stdlib.get_logger(__name__)
@@ -157,10 +162,21 @@ async def astream_state(
     config = cast("RunnableConfig", kwargs.pop("config"))
     configurable = config["configurable"]
     stack = AsyncExitStack()
-    from storage.database import connect
-    checkpointer = None
-    async with connect() as conn:
-        checkpointer = AsyncPostgresSaver(conn)
+    write_behind = CHECKPOINT_WRITE_BEHIND and (
+        kwargs.get("durability") == "async"
+        if USE_DURABILITY
+        else bool(kwargs.get("checkpoint_during"))
+    )
+    # The run's checkpointer borrows a pooled connection for each write (one
+    # transaction) or read, so it never holds one across supersteps nor
+    # shares one with other requests, and cancelling returns it right away.
+    pool = await current_pool()
+    serde = Serializer(compression_dict=zstd_dictionary(configurable["graph_id"]))
+    checkpointer = (
+        WriteBehindCheckpointer(pool, serde=serde)
+        if write_behind
+        else AsyncPostgresSaver(pool, serde=serde)
+    )
     graph = await stack.enter_async_context(
         get_graph(
             configurable["graph_id"],
@@ -169,7 +185,9 @@ async def astream_state(
             checkpointer=None if (temporary or not checkpointer) else checkpointer,
         )
     )
-
+    if isinstance(checkpointer, WriteBehindCheckpointer):
+        # runs last-in-first-out, so before the graph is released
+        stack.push_async_callback(checkpointer.aflush)
 
     # Filter context parameters based on context schema if available
     if context and USE_RUNTIME_CONTEXT_API and not isinstance(graph, BaseRemotePregel):
@@ -5,8 +5,19 @@ from typing import cast
 
 import structlog
 
-from api.config import THREAD_TTL
+from api.config import (
+    CHECKPOINT_COMPACTION_INTERVAL_SECS,
+    CHECKPOINT_PARTITION_MAINTENANCE_INTERVAL_SECS,
+    CHECKPOINT_PARTITION_RETENTION_DAYS,
+    CHECKPOINT_RETENTION_KEEP_LATEST,
+    THREAD_TTL,
+)
+from storage.async_postgres_checkpointer import (
+    compact_checkpoints,
+    gc_checkpoint_blobs,
+)
 from storage.database import connect
+from storage.partitioning import maintain_checkpoint_partitions
 
 logger = structlog.stdlib.get_logger(__name__)
 
@@ -16,6 +27,8 @@ async def thread_ttl_sweep_loop():
 
     Currently implements the 'delete' strategy, which deletes entire threads
     that have been inactive for longer than their configured TTL period.
+    Checkpoint blob content no longer referenced by any thread is collected
+    on the same interval.
     """
     # Use the same interval as store TTL sweep
     thread_ttl_config = THREAD_TTL or {}
@@ -51,3 +64,71 @@ async def thread_ttl_sweep_loop():
                     )
         except Exception as exc:
             logger.exception("Thread TTL sweep iteration failed", exc_info=exc)
+        try:
+            async with connect() as conn:
+                if blobs_deleted := await gc_checkpoint_blobs(conn):
+                    await logger.ainfo(
+                        f"Collected {blobs_deleted} unreferenced checkpoint blobs",
+                        blobs_deleted=blobs_deleted,
+                    )
+        except Exception as exc:
+            logger.exception("Checkpoint blob collection failed", exc_info=exc)
+
+
+async def checkpoint_compaction_loop():
+    """Periodically delete checkpoints superseded under the retention policy.
+
+    Keeps the latest CHECKPOINT_RETENTION_KEEP_LATEST checkpoints of each thread
+    and namespace, interrupted checkpoints and the last checkpoint of each run.
+    Blob content left unreferenced is collected by the thread TTL sweeper.
+    """
+    await logger.ainfo(
+        f"Starting checkpoint compactor with interval {CHECKPOINT_COMPACTION_INTERVAL_SECS} seconds",
+        keep_latest=CHECKPOINT_RETENTION_KEEP_LATEST,
+        interval_secs=CHECKPOINT_COMPACTION_INTERVAL_SECS,
+    )
+    loop = asyncio.get_running_loop()
+
+    while True:
+        await asyncio.sleep(CHECKPOINT_COMPACTION_INTERVAL_SECS)
+        try:
+            async with connect() as conn:
+                compaction_start = loop.time()
+                stats = await compact_checkpoints(conn)
+                if stats["checkpoints_deleted"] or stats["blobs_deleted"]:
+                    await logger.ainfo(
+                        f"Checkpoint compaction completed. Deleted {stats['checkpoints_deleted']} checkpoints",
+                        **stats,
+                        duration=loop.time() - compaction_start,
+                    )
+        except Exception as exc:
+            logger.exception("Checkpoint compaction iteration failed", exc_info=exc)
+
+
+async def checkpoint_partition_loop():
+    """Periodically create upcoming checkpoint time partitions and drop expired ones.
+
+    Ranges entirely older than CHECKPOINT_PARTITION_RETENTION_DAYS are dropped
+    with their writes, then the blob versions only they referenced are deleted.
+    """
+    await logger.ainfo(
+        f"Starting checkpoint partition maintenance with interval {CHECKPOINT_PARTITION_MAINTENANCE_INTERVAL_SECS} seconds",
+        retention_days=CHECKPOINT_PARTITION_RETENTION_DAYS,
+        interval_secs=CHECKPOINT_PARTITION_MAINTENANCE_INTERVAL_SECS,
+    )
+    loop = asyncio.get_running_loop()
+
+    while True:
+        await asyncio.sleep(CHECKPOINT_PARTITION_MAINTENANCE_INTERVAL_SECS)
+        try:
+            async with connect() as conn:
+                maintenance_start = loop.time()
+                stats = await maintain_checkpoint_partitions(conn)
+                if stats["partitions_created"] or stats["partitions_dropped"]:
+                    await logger.ainfo(
+                        f"Checkpoint partition maintenance completed. Dropped {stats['partitions_dropped']} partitions",
+                        **stats,
+                        duration=loop.time() - maintenance_start,
+                    )
+        except Exception as exc:
+            logger.exception("Checkpoint partition maintenance failed", exc_info=exc)
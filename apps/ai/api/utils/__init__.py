@@ -13,6 +13,7 @@ from starlette.exceptions import HTTPException
 from starlette.schemas import BaseSchemaGenerator
 
 from api.auth.custom import SimpleUser
+from api.schema import Page
 from api.utils.uuids import uuid7
 
 logger = structlog.stdlib.get_logger(__name__)
@@ -153,35 +154,61 @@ class SchemaGenerator(BaseSchemaGenerator):
 
 async def get_pagination_headers(
     resource: AsyncIterator[T],
-    next_offset: int | None,
-    offset: int,
+    page: Page,
 ) -> tuple[list[T], dict[str, str]]:
     resources = [r async for r in resource]
-    if next_offset is None:
-        response_headers = {"X-Pagination-Total": str(len(resources) + offset)}
-    else:
-        response_headers = {
-            "X-Pagination-Total": str(next_offset + 1),  # Next offset will be "n"
-            "X-Pagination-Next": str(next_offset),
-        }
+    response_headers = {}
+    if page["next_offset"] is not None:
+        response_headers["X-Pagination-Next"] = str(page["next_offset"])
+    if page["next_cursor"] is not None:
+        response_headers["X-Pagination-Cursor"] = page["next_cursor"]
+    if page["total"] is not None:
+        response_headers["X-Pagination-Total"] = str(page["total"])
+    elif page["next_offset"] is not None:
+        # Next offset will be "n"
+        response_headers["X-Pagination-Total"] = str(page["next_offset"] + 1)
+    if page["total_estimate"] is not None:
+        response_headers["X-Pagination-Total-Estimate"] = str(page["total_estimate"])
     return resources, response_headers
 
 
+# A select of a JSON sub-path, as in "values.messages[-1]": a field, then keys
+# and array indexes, negative ones counting from the end
+SELECT_PATH_RE = re.compile(r"(\w+)((?:\.[^.\[\]]+|\[-?\d+\])+)")
+SELECT_PATH_STEP_RE = re.compile(r"\.([^.\[\]]+)|\[(-?\d+)\]")
+
+
+def parse_select_path(select: str) -> tuple[str, list[str]] | None:
+    """Split a JSON sub-path select into its field and path, if it is one."""
+    if not (match := SELECT_PATH_RE.fullmatch(select)):
+        return None
+    path = [key or index for key, index in SELECT_PATH_STEP_RE.findall(match[2])]
+    return match[1], path
+
+
 def validate_select_columns(
-    select: list[str] | None, allowed: set[str]
+    select: list[str] | None,
+    allowed: set[str],
+    json_fields: set[str] | frozenset[str] = frozenset(),
 ) -> list[str] | None:
     """Validate select columns against an allowed set.
 
-    Returns the input list (or None) if valid, otherwise raises HTTP 422.
+    Sub-paths of `json_fields` are allowed too. Returns the input list (or
+    None) if valid, otherwise raises HTTP 422.
     """
     if not select:
         return None
-    invalid = [col for col in select if col not in allowed]
+    invalid = [
+        col
+        for col in select
+        if col not in allowed
+        and ((path := parse_select_path(col)) is None or path[0] not in json_fields)
+    ]
     if invalid:
-        raise HTTPException(
-            status_code=422,
-            detail=f"Invalid select columns: {invalid}. Expected: {allowed}",
-        )
+        detail = f"Invalid select columns: {invalid}. Expected: {allowed}"
+        if json_fields:
+            detail += f" or sub-paths of {json_fields}"
+        raise HTTPException(status_code=422, detail=detail)
     return select
 
 
@@ -194,6 +221,7 @@ __all__ = [
     "next_cron_date",
     "SchemaGenerator",
     "get_pagination_headers",
+    "parse_select_path",
     "uuid7",
     "validate_select_columns",
 ]
@@ -1,10 +1,19 @@
 from __future__ import annotations
 
 import base64
+import os
 from dataclasses import dataclass
 
 import orjson
 import structlog
+import zstandard
+
+from api.config import (
+    MAX_STREAM_CHUNK_SIZE_BYTES,
+    STREAM_COMPRESSION_MIN_BYTES,
+    STREAM_SPLIT_FRAMES,
+    STREAM_SPLIT_THRESHOLD_BYTES,
+)
 
 PROTOCOL_VERSION = 1
 """
@@ -17,6 +26,14 @@ Byte Offsets
 +--------+------------------+----------------+------------------+------------------+--------------------+
    1 B         2 B                2 B              N B                 M B               variable
 
+The high bits of the version byte are flags, only set on oversized frames
+(see `StreamCodec.split`, enabled by STREAM_SPLIT_FRAMES), so that regular
+frames stay readable by decoders that predate them:
+- FLAG_COMPRESSED: the message is zstd-compressed
+- FLAG_FRAGMENT: the message is one fragment of a larger one, and is prefixed with
+  a fragment header of message_id (8 B), index (4 B) and count (4 B). Every
+  fragment repeats the stream_id and event; flags apply to the whole message.
+
 ---- Old (to be dropped soon / multiple formats)
 Version 0 (old):
 1) b"$:" + <stream_id> + b"$:" + <event> + b"$:" + <raw_json>
@@ -24,7 +41,13 @@ Version 0 (old):
 """
 
 BYTE_MASK = 0xFF
+VERSION_MASK = 0x0F
+FLAG_COMPRESSED = 0x40
+FLAG_FRAGMENT = 0x80
 HEADER_LEN = 5
+FRAGMENT_HEADER_LEN = 16
+# incomplete fragmented messages kept per subscriber, oldest dropped first
+MAX_PENDING_FRAGMENTED = 16
 logger = structlog.stdlib.get_logger(__name__)
 
 
@@ -38,6 +61,9 @@ class StreamPacket:
     event: memoryview | bytes
     message: memoryview | bytes
     stream_id: memoryview | bytes | None
+    flags: int = 0
+    # (message_id, index, count), for fragments
+    fragment: tuple[bytes, int, int] | None = None
 
     @property
     def event_bytes(self) -> bytes:
@@ -69,10 +95,29 @@ class StreamPacket:
 class StreamCodec:
     """Codec for encoding and decoding stream packets."""
 
-    __slots__ = ("_version",)
+    __slots__ = ("_version", "max_frame_size", "compress_min_size", "split_frames")
 
-    def __init__(self, *, protocol_version: int = PROTOCOL_VERSION) -> None:
-        self._version = protocol_version & BYTE_MASK
+    def __init__(
+        self,
+        *,
+        protocol_version: int = PROTOCOL_VERSION,
+        max_frame_size: int = min(
+            STREAM_SPLIT_THRESHOLD_BYTES, MAX_STREAM_CHUNK_SIZE_BYTES
+        ),
+        compress_min_size: int = STREAM_COMPRESSION_MIN_BYTES,
+        split_frames: bool = STREAM_SPLIT_FRAMES,
+    ) -> None:
+        self._version = protocol_version & VERSION_MASK
+        self.max_frame_size = max_frame_size
+        self.compress_min_size = compress_min_size
+        self.split_frames = split_frames
+
+    def needs_split(self, frame: bytes) -> bool:
+        if not self.split_frames:
+            return False
+        return len(frame) > self.max_frame_size or (
+            0 < self.compress_min_size <= len(frame)
+        )
 
     def encode(
         self,
@@ -113,12 +158,51 @@ class StreamCodec:
         frame[cursor:] = message
         return bytes(frame)
 
+    def split(self, frame: bytes) -> list[bytes]:
+        """Compress and fragment an encoded frame, if needed, so that no frame
+        exceeds `max_frame_size`. Frames that need neither are returned as-is."""
+        if not self.needs_split(frame):
+            return [frame]
+        packet = self.decode(frame)
+        prefix_len = HEADER_LEN + len(packet.stream_id or b"") + len(packet.event)
+        message = packet.message
+        flags = 0
+        if 0 < self.compress_min_size <= len(message):
+            compressed = zstandard.compress(message)
+            if len(compressed) < len(message):
+                message = compressed
+                flags |= FLAG_COMPRESSED
+        if prefix_len + len(message) <= self.max_frame_size:
+            return [bytes([self._version | flags]) + frame[1:prefix_len] + message]
+
+        flags |= FLAG_FRAGMENT
+        chunk_size = self.max_frame_size - prefix_len - FRAGMENT_HEADER_LEN
+        if chunk_size <= 0:
+            raise StreamFormatError("max frame size too small to fit a fragment")
+        header = bytes([self._version | flags]) + frame[1:prefix_len]
+        message_id = os.urandom(8)
+        view = memoryview(message)
+        count = -(-len(view) // chunk_size)
+        return [
+            b"".join(
+                (
+                    header,
+                    message_id,
+                    index.to_bytes(4, "big"),
+                    count.to_bytes(4, "big"),
+                    view[index * chunk_size : (index + 1) * chunk_size],
+                )
+            )
+            for index in range(count)
+        ]
+
     def decode(self, data: bytes | bytearray | memoryview) -> StreamPacket:
         view = data if isinstance(data, memoryview) else memoryview(data)
         if len(view) < HEADER_LEN:
             raise StreamFormatError("frame too short")
 
-        version = view[0]
+        version = view[0] & VERSION_MASK
+        flags = view[0] & ~VERSION_MASK
         if version != self._version:
             raise StreamFormatError(f"unsupported protocol version: {version}, expected: {self._version}")
 
@@ -137,12 +221,24 @@ class StreamCodec:
             raise StreamFormatError("truncated event payload")
         event_view = view[offset : offset + event_len]
         offset += event_len
+        fragment = None
+        if flags & FLAG_FRAGMENT:
+            if len(view) < offset + FRAGMENT_HEADER_LEN:
+                raise StreamFormatError("truncated fragment header")
+            fragment = (
+                view[offset : offset + 8].tobytes(),
+                int.from_bytes(view[offset + 8 : offset + 12], "big"),
+                int.from_bytes(view[offset + 12 : offset + 16], "big"),
+            )
+            offset += FRAGMENT_HEADER_LEN
         message_view = view[offset:]
         return StreamPacket(
             version=version,
             event=event_view,
             message=message_view,
             stream_id=stream_id_view,
+            flags=flags,
+            fragment=fragment,
         )
 
     def decode_safe(self, data: bytes | bytearray | memoryview) -> StreamPacket | None:
@@ -156,11 +252,63 @@ class StreamCodec:
 STREAM_CODEC = StreamCodec()
 
 
+class FragmentBuffer:
+    """Reassembles fragmented messages, for a single subscriber.
+
+    Fragments of a message may interleave with other messages. Messages whose
+    first fragments were missed (e.g., subscribed mid-message) never complete,
+    so at most `max_pending` incomplete messages are kept."""
+
+    __slots__ = ("pending", "max_pending")
+
+    def __init__(self, max_pending: int = MAX_PENDING_FRAGMENTED) -> None:
+        self.pending: dict[bytes, list[bytes | None]] = {}
+        self.max_pending = max_pending
+
+    def add(self, packet: StreamPacket) -> StreamPacket | None:
+        """Add a fragment, returning the whole message once complete.
+
+        Fragments whose index doesn't fit their message's count are dropped."""
+        message_id, index, count = packet.fragment
+        chunks = self.pending.get(message_id)
+        if index >= (count if chunks is None else len(chunks)):
+            logger.warning(
+                "Dropping malformed stream fragment", index=index, count=count
+            )
+            return None
+        if chunks is None:
+            if len(self.pending) >= self.max_pending:
+                del self.pending[next(iter(self.pending))]
+            chunks = self.pending[message_id] = [None] * count
+        chunks[index] = packet.message_bytes
+        if any(chunk is None for chunk in chunks):
+            return None
+        del self.pending[message_id]
+        return StreamPacket(
+            version=packet.version,
+            event=packet.event_bytes,
+            message=b"".join(chunks),
+            stream_id=packet.stream_id_bytes,
+            flags=packet.flags & ~FLAG_FRAGMENT,
+        )
+
+
+def _decompress(packet: StreamPacket) -> StreamPacket:
+    packet.message = zstandard.decompress(packet.message)
+    packet.flags &= ~FLAG_COMPRESSED
+    return packet
+
+
 def decode_stream_message(
     data: bytes | bytearray | memoryview,
     *,
     channel: bytes | str | None = None,
-) -> StreamPacket:
+    fragments: FragmentBuffer | None = None,
+) -> StreamPacket | None:
+    """Decode a stream message of any protocol version.
+
+    Fragments are collected in `fragments`, returning None until the message
+    they belong to is complete."""
     if isinstance(data, memoryview):
         view = data
     elif isinstance(data, (bytes, bytearray)):
@@ -171,6 +319,13 @@ def decode_stream_message(
 
     # Current protocol version
     if packet := STREAM_CODEC.decode_safe(view):
+        if packet.fragment is not None:
+            if fragments is None:
+                raise StreamFormatError("fragmented message needs a FragmentBuffer")
+            if (packet := fragments.add(packet)) is None:
+                return None
+        if packet.flags & FLAG_COMPRESSED:
+            return _decompress(packet)
         return packet
     logger.debug("Attempting to decode a v0 formatted stream message")
     # Legacy codecs. Yuck. Won't be hit unless you have stale pods running (or for a brief period during upgrade).
@@ -62,6 +62,23 @@ ThreadStateUpdate = jsonschema_rs.validator_for(
         },
     }
 )
+ThreadStateBulkUpdate = jsonschema_rs.validator_for(
+    {
+        **openapi["components"]["schemas"]["ThreadStateBulkUpdate"],
+        "components": {
+            "schemas": {
+                "CheckpointConfig": openapi["components"]["schemas"][
+                    "CheckpointConfig"
+                ],
+                "ThreadSuperstepUpdate": openapi["components"]["schemas"][
+                    "ThreadSuperstepUpdate"
+                ],
+                "Command": openapi["components"]["schemas"]["Command"],
+                "Send": openapi["components"]["schemas"]["Send"],
+            }
+        },
+    }
+)
 
 ThreadStateCheckpointRequest = jsonschema_rs.validator_for(
     {
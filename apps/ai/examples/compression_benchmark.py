@@ -0,0 +1,141 @@
+"""
+Measure checkpoint compression: ratio and encode/decode throughput.
+
+Runs two workloads through api.serde.Serializer's dumps_typed and loads_typed,
+as checkpointers store them: whole message-history states, and the small
+per-step writes of single messages. Each runs uncompressed, with zstd at
+CHECKPOINT_COMPRESSION_LEVEL and with zstd and a dictionary trained on other
+writes of the same shape (as CHECKPOINT_ZSTD_DICTIONARIES sets per graph).
+
+The ratio is serialized bytes over stored bytes. Throughput is serialized
+megabytes per second, so it includes msgpack encoding and decoding.
+
+Usage:
+  python examples/compression_benchmark.py
+  python examples/compression_benchmark.py --messages 2000 --serde msgpack
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager, nullcontext
+from typing import Any
+
+import zstandard
+from serde_benchmark import conversation
+
+from api import serde
+
+DICTIONARY_GRAPH = "benchmark"
+
+
+def measure(fn: Callable[[], Any], rounds: int) -> float:
+    """Best time of `rounds` calls, in milliseconds."""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+@contextmanager
+def uncompressed() -> Iterator[None]:
+    min_bytes = serde.CHECKPOINT_COMPRESSION_MIN_BYTES
+    serde.CHECKPOINT_COMPRESSION_MIN_BYTES = 0
+    try:
+        yield
+    finally:
+        serde.CHECKPOINT_COMPRESSION_MIN_BYTES = min_bytes
+
+
+def train_dictionary(size: int) -> str:
+    """Train a dictionary on single-message writes, returning its file path."""
+    with uncompressed():
+        samples = [
+            serde.Serializer().dumps_typed([message])[1]
+            for message in conversation(3000)
+        ]
+    dictionary = zstandard.train_dictionary(size, samples)
+    fd, path = tempfile.mkstemp(suffix=".zstd-dict")
+    with os.fdopen(fd, "wb") as f:
+        f.write(dictionary.as_bytes())
+    return path
+
+
+def run(name: str, values: list[Any], rounds: int) -> None:
+    print(f"\n{name}")
+    print(f"{'compression':<20}{'ratio':>8}{'encode MB/s':>14}{'decode MB/s':>14}")
+    with uncompressed():
+        raw = sum(len(serde.Serializer().dumps_typed(value)[1]) for value in values)
+    dictionary = serde.zstd_dictionary(DICTIONARY_GRAPH)
+    for label, compression, serializer in (
+        ("none", uncompressed(), serde.Serializer()),
+        ("zstd", nullcontext(), serde.Serializer()),
+        (
+            "zstd + dictionary",
+            nullcontext(),
+            serde.Serializer(compression_dict=dictionary),
+        ),
+    ):
+        with compression:
+            stored = [serializer.dumps_typed(value) for value in values]
+            assert [serializer.loads_typed(data) for data in stored] == values
+            encode = measure(
+                lambda s=serializer: [s.dumps_typed(value) for value in values],
+                rounds,
+            )
+            decode = measure(
+                lambda s=serializer, stored=stored: [
+                    s.loads_typed(data) for data in stored
+                ],
+                rounds,
+            )
+        ratio = raw / sum(len(data) for _, data in stored)
+        megabytes = raw / 2**20
+        print(
+            f"{label:<20}{ratio:>8.2f}{megabytes / encode * 1000:>14.1f}"
+            f"{megabytes / decode * 1000:>14.1f}"
+        )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark checkpoint compression.")
+    parser.add_argument("--messages", type=int, default=600)
+    parser.add_argument("--states", type=int, default=20)
+    parser.add_argument("--dictionary-size", type=int, default=16 * 1024)
+    parser.add_argument("--serde", choices=["jsonplus", "msgpack"], default="jsonplus")
+    parser.add_argument("--rounds", type=int, default=5)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    serde.CHECKPOINT_SERDE = args.serde
+    path = train_dictionary(args.dictionary_size)
+    serde.CHECKPOINT_ZSTD_DICTIONARIES = {DICTIONARY_GRAPH: path}
+    try:
+        print(
+            f"serde {args.serde}, level {serde.CHECKPOINT_COMPRESSION_LEVEL}, "
+            f"values of at least {serde.CHECKPOINT_COMPRESSION_MIN_BYTES} bytes "
+            "compressed"
+        )
+        history = conversation(args.messages)
+        run(
+            f"{args.states} states of {args.messages} messages",
+            [history] * args.states,
+            args.rounds,
+        )
+        run(
+            f"{len(history)} single-message writes",
+            [[message] for message in history],
+            args.rounds,
+        )
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Compare delta-encoded and full-snapshot checkpoints of a long conversation.
+
+Puts the checkpoints of a `--turns` turn thread, each turn adding a human
+message and then a reply to the `messages` channel, once with list channels
+delta-encoded (a full snapshot every CHECKPOINT_DELTA_SNAPSHOT_INTERVAL
+versions) and once storing every version in full. Prints the bytes of
+`messages` blobs stored for the thread, the latency of its puts, and of
+getting the latest checkpoint with the blob cache empty, which rebuilds it
+from the stored versions.
+
+Needs a migrated database at DATABASE_URI.
+
+Usage:
+  python examples/delta_benchmark.py
+  python examples/delta_benchmark.py --turns 1000 --snapshot-interval 32
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.base.id import uuid6
+
+from api.utils import fetchone
+from storage import async_postgres_checkpointer
+from storage.async_postgres_checkpointer import AsyncPostgresCheckpointer
+from storage.blob_cache import BLOB_CACHE
+from storage.database import create_conn
+from storage.ops import Threads
+
+STORED_BYTES_SQL = """
+    select
+        coalesce(sum(octet_length(bl.blob)), 0)
+        + coalesce(
+            (
+                select sum(octet_length(bc.blob))
+                from checkpoint_blob_content bc
+                where bc.hash in (
+                    select hash from checkpoint_blobs
+                    where thread_id = %(thread_id)s and channel = 'messages'
+                )
+            ),
+            0
+        ) as bytes,
+        count(*) as versions
+    from checkpoint_blobs bl
+    where bl.thread_id = %(thread_id)s and bl.channel = 'messages'
+"""
+
+
+def message(i: int) -> AnyMessage:
+    if i % 2:
+        return AIMessage(f"answer {i // 2} " * 50, id=str(uuid.uuid4()))
+    return HumanMessage(f"question {i // 2} " * 20, id=str(uuid.uuid4()))
+
+
+@contextmanager
+def snapshot_interval(interval: int) -> Iterator[None]:
+    previous = async_postgres_checkpointer.CHECKPOINT_DELTA_SNAPSHOT_INTERVAL
+    async_postgres_checkpointer.CHECKPOINT_DELTA_SNAPSHOT_INTERVAL = interval
+    try:
+        yield
+    finally:
+        async_postgres_checkpointer.CHECKPOINT_DELTA_SNAPSHOT_INTERVAL = previous
+
+
+@contextmanager
+def uncached() -> Iterator[None]:
+    max_bytes = BLOB_CACHE.max_bytes
+    BLOB_CACHE.max_bytes = 0
+    BLOB_CACHE.entries = OrderedDict()
+    BLOB_CACHE.size = 0
+    try:
+        yield
+    finally:
+        BLOB_CACHE.max_bytes = max_bytes
+
+
+async def run_thread(conn: Any, turns: int) -> tuple[str, list[float]]:
+    """Put a checkpoint per message of `turns` turns on a new thread.
+
+    Returns the thread's id and the seconds each put took.
+    """
+    thread_id = uuid.uuid4()
+    await fetchone(await Threads.put(conn, thread_id, metadata={}, if_exists="raise"))
+    checkpointer = AsyncPostgresCheckpointer(conn)
+    config = {"configurable": {"thread_id": str(thread_id), "checkpoint_ns": ""}}
+    checkpoint = empty_checkpoint()
+    put_secs = []
+    for step in range(turns * 2):
+        version = checkpointer.get_next_version(
+            checkpoint["channel_versions"].get("messages"), None
+        )
+        # as add_messages does, a new list of the same messages
+        messages = [*checkpoint["channel_values"].get("messages", []), message(step)]
+        checkpoint = {
+            **checkpoint,
+            "id": str(uuid6(clock_seq=step)),
+            "channel_values": {"messages": messages},
+            "channel_versions": {"messages": version},
+        }
+        metadata = {"source": "loop", "step": step, "parents": {}}
+        start = time.perf_counter()
+        config = await checkpointer.aput(
+            config, checkpoint, metadata, {"messages": version}
+        )
+        put_secs.append(time.perf_counter() - start)
+    return str(thread_id), put_secs
+
+
+async def measure_get(conn: Any, thread_id: str, rounds: int) -> tuple[float, Any]:
+    """Best time of `rounds` uncached gets of the latest checkpoint, in ms."""
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    best = float("inf")
+    with uncached():
+        for _ in range(rounds):
+            checkpointer = AsyncPostgresCheckpointer(conn)
+            start = time.perf_counter()
+            checkpoint = await checkpointer.aget_tuple(config)
+            messages = checkpoint.checkpoint["channel_values"]["messages"]
+            best = min(best, time.perf_counter() - start)
+    return best * 1000, messages
+
+
+async def run(args: argparse.Namespace) -> None:
+    conn = await create_conn()
+    await conn.set_autocommit(True)
+    async with conn:
+        print(f"{args.turns} turns, 2 messages per turn")
+        print(
+            f"{'checkpoints':<18}{'versions':>10}{'stored MB':>12}"
+            f"{'put mean ms':>13}{'put p99 ms':>12}{'get ms':>10}"
+        )
+        latest = []
+        for name, interval in (
+            (f"delta (every {args.snapshot_interval})", args.snapshot_interval),
+            ("full snapshots", 0),
+        ):
+            with snapshot_interval(interval):
+                thread_id, put_secs = await run_thread(conn, args.turns)
+                get_ms, messages = await measure_get(conn, thread_id, args.rounds)
+            latest.append([(m.type, m.content) for m in messages])
+            cur = await conn.execute(STORED_BYTES_SQL, {"thread_id": thread_id})
+            stored = await cur.fetchone()
+            put_ms = sorted(secs * 1000 for secs in put_secs)
+            print(
+                f"{name:<18}{stored['versions']:>10}"
+                f"{stored['bytes'] / 2**20:>12.1f}"
+                f"{statistics.mean(put_ms):>13.2f}"
+                f"{put_ms[int(len(put_ms) * 0.99)]:>12.2f}{get_ms:>10.2f}"
+            )
+        delta, full = latest
+        assert delta == full, "delta-encoded thread read back different messages"
+        print(f"\nboth read back the same {len(delta)} messages")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark delta checkpoints.")
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument(
+        "--snapshot-interval",
+        type=int,
+        default=async_postgres_checkpointer.CHECKPOINT_DELTA_SNAPSHOT_INTERVAL or 16,
+    )
+    parser.add_argument("--rounds", type=int, default=5)
+    return parser.parse_args()
+
+
+def main() -> None:
+    asyncio.run(run(parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Compare checkpoint serializers on encode time, decode time and size.
+
+Runs each payload through the codecs checkpoint rows can hold: JSON (older
+rows), JsonPlus (langgraph's msgpack format), typed msgpack and pickle, and
+prints a table per payload with sizes before and after zstd compression.
+
+Usage:
+  python examples/serde_benchmark.py
+  python examples/serde_benchmark.py --messages 2000 --rounds 20
+"""
+
+import argparse
+import pickle
+import time
+import uuid
+from collections.abc import Callable
+from datetime import UTC, datetime
+from typing import Any
+
+from langchain_core.load import dumps as lc_dumps
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from pydantic import BaseModel
+
+from api import serde
+
+
+class Document(BaseModel):
+    id: uuid.UUID
+    title: str
+    body: str
+    score: float
+    fetched_at: datetime
+
+
+def conversation(n: int) -> list[Any]:
+    """A message history like a tool-calling agent's, `n` messages long."""
+    history: list[Any] = []
+    for i in range(n // 3):
+        call_id = f"call_{i}"
+        history.append(HumanMessage(f"question {i} " * 20, id=str(uuid.uuid4())))
+        history.append(
+            AIMessage(
+                f"let me look that up ({i})",
+                id=str(uuid.uuid4()),
+                tool_calls=[
+                    {"name": "search", "args": {"query": f"q{i}"}, "id": call_id}
+                ],
+                usage_metadata={
+                    "input_tokens": 100 + i,
+                    "output_tokens": 20,
+                    "total_tokens": 120 + i,
+                },
+                response_metadata={
+                    "model_name": "model",
+                    "finish_reason": "tool_calls",
+                },
+            )
+        )
+        history.append(
+            ToolMessage(f"result {i} " * 50, tool_call_id=call_id, id=str(uuid.uuid4()))
+        )
+    return history
+
+
+def documents(n: int) -> list[Document]:
+    return [
+        Document(
+            id=uuid.uuid4(),
+            title=f"document {i}",
+            body=f"body of document {i} " * 30,
+            score=i / n,
+            fetched_at=datetime.now(UTC),
+        )
+        for i in range(n)
+    ]
+
+
+def codecs() -> dict[str, tuple[Callable[[Any], bytes], Callable[[bytes], Any]]]:
+    jsonplus = serde.JsonPlusSerializer()
+    return {
+        # as older rows were written, in LangChain's JSON format
+        "json": (
+            lambda obj: lc_dumps(obj).encode(),
+            lambda data: jsonplus.loads_typed(("json", data)),
+        ),
+        "jsonplus": (
+            lambda obj: jsonplus.dumps_typed(obj)[1],
+            lambda data: jsonplus.loads_typed(("msgpack", data)),
+        ),
+        "msgpack-typed": (serde.typed_msgpack_dumps, serde.typed_msgpack_loads),
+        "pickle": (pickle.dumps, pickle.loads),
+    }
+
+
+def measure(fn: Callable[[], Any], rounds: int) -> float:
+    """Best time of `rounds` calls, in milliseconds."""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def run(name: str, payload: Any, rounds: int) -> None:
+    print(f"\n{name}")
+    print(
+        f"{'codec':<16}{'encode ms':>12}{'decode ms':>12}{'bytes':>12}{'zstd bytes':>12}"
+    )
+    compressor = serde.Serializer()._compressor()
+    for codec, (dumps, loads) in codecs().items():
+        data = dumps(payload)
+        try:
+            loads(data)
+        except NotImplementedError:
+            # LangChain's JSON only revives its own serializable classes
+            print(f"{codec:<16}{'unsupported':>12}")
+            continue
+        encode = measure(lambda dumps=dumps: dumps(payload), rounds)
+        decode = measure(lambda loads=loads, data=data: loads(data), rounds)
+        compressed = len(compressor.compress(data))
+        print(
+            f"{codec:<16}{encode:>12.2f}{decode:>12.2f}{len(data):>12}{compressed:>12}"
+        )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark checkpoint serializers.")
+    parser.add_argument("--messages", type=int, default=600)
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=10)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    run(f"{args.messages} messages", conversation(args.messages), args.rounds)
+    run(f"{args.documents} pydantic documents", documents(args.documents), args.rounds)
+    serde.register_msgpack_model(Document)
+    run(
+        f"{args.documents} registered pydantic documents",
+        documents(args.documents),
+        args.rounds,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Compare SSE heartbeats from one shared task with sse_starlette's per-stream ping.
+
+Opens many idle event streams on fake ASGI connections and prints the number
+of asyncio tasks and the memory they hold with api.sse.EventSourceResponse,
+whose heartbeats are sent by the shared HEARTBEATS scheduler, and with
+sse_starlette's EventSourceResponse, which starts a ping task per stream.
+
+Then stalls one client and counts the heartbeats the other streams receive,
+which shouldn't be held up by it, and whether the stalled stream was closed.
+
+Usage:
+  python examples/sse_heartbeat_benchmark.py
+  python examples/sse_heartbeat_benchmark.py --streams 5000 --interval 0.5
+"""
+
+import argparse
+import asyncio
+import gc
+import time
+import tracemalloc
+from collections.abc import AsyncIterator, Callable
+from typing import Any
+
+import sse_starlette
+
+from api import sse
+
+SCOPE = {"type": "http", "method": "GET", "path": "/", "headers": []}
+
+
+async def idle_body() -> AsyncIterator[bytes]:
+    await asyncio.Event().wait()
+    yield b""
+
+
+def connection(
+    stalled: bool = False,
+) -> tuple[Callable[[], Any], Callable[[Any], Any], list[float]]:
+    """ASGI receive and send of a client that never disconnects.
+
+    Returns the times heartbeats were received at. A stalled client never
+    completes a send after the response start.
+    """
+    received: list[float] = []
+
+    async def receive() -> dict[str, Any]:
+        await asyncio.Event().wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict[str, Any]) -> None:
+        if message["type"] != "http.response.body" or not message.get("body"):
+            return
+        if stalled:
+            await asyncio.Event().wait()
+        received.append(time.monotonic())
+
+    return receive, send, received
+
+
+def shared(interval: float) -> Callable[[], Any]:
+    return lambda: sse.EventSourceResponse(idle_body())
+
+
+def per_stream(interval: float) -> Callable[[], Any]:
+    return lambda: sse_starlette.EventSourceResponse(idle_body(), ping=interval)
+
+
+async def open_streams(
+    make: Callable[[], Any], n: int, settle: float
+) -> tuple[int, float]:
+    """Open `n` idle streams, returning the tasks and MiB of memory they add."""
+    gc.collect()
+    tasks_before = len(asyncio.all_tasks())
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    streams = []
+    for _ in range(n):
+        receive, send, _ = connection()
+        streams.append(asyncio.create_task(make()(SCOPE, receive, send)))
+    await asyncio.sleep(settle)
+    tasks = len(asyncio.all_tasks()) - tasks_before
+    memory = (tracemalloc.get_traced_memory()[0] - before) / 2**20
+    tracemalloc.stop()
+    for stream in streams:
+        stream.cancel()
+    await asyncio.gather(*streams, return_exceptions=True)
+    return tasks, memory
+
+
+async def stalled_client(n: int, interval: float, duration: float) -> None:
+    receive, send, _ = connection(stalled=True)
+    stalled = asyncio.create_task(
+        sse.EventSourceResponse(idle_body())(SCOPE, receive, send)
+    )
+    others = []
+    received = []
+    for _ in range(n):
+        receive, send, times = connection()
+        others.append(
+            asyncio.create_task(
+                sse.EventSourceResponse(idle_body())(SCOPE, receive, send)
+            )
+        )
+        received.append(times)
+    await asyncio.sleep(duration)
+    expected = int(duration / interval) - 1
+    fewest = min(len(times) for times in received)
+    print(
+        f"\n1 stalled client, {n} others over {duration:.1f}s: at least "
+        f"{fewest} heartbeats per stream (expected {expected}), "
+        f"stalled stream closed: {stalled.done()}"
+    )
+    for stream in (stalled, *others):
+        stream.cancel()
+    await asyncio.gather(stalled, *others, return_exceptions=True)
+
+
+async def run(args: argparse.Namespace) -> None:
+    sse.HEARTBEATS.interval = args.interval
+    sse.HEARTBEATS.tick = args.interval / 5
+    print(f"{args.streams} idle streams")
+    print(f"{'heartbeats':<20}{'tasks':>10}{'MiB':>10}")
+    for name, make in (
+        ("shared scheduler", shared(args.interval)),
+        ("per-stream ping", per_stream(args.interval)),
+    ):
+        tasks, memory = await open_streams(make, args.streams, args.interval * 2)
+        print(f"{name:<20}{tasks:>10}{memory:>10.1f}")
+    await stalled_client(args.others, args.interval, args.interval * 6)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark SSE heartbeats.")
+    parser.add_argument("--streams", type=int, default=2000)
+    parser.add_argument("--others", type=int, default=100)
+    parser.add_argument("--interval", type=float, default=0.5)
+    return parser.parse_args()
+
+
+def main() -> None:
+    asyncio.run(run(parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Compare run throughput with synchronous and write-behind checkpointing.
+
+Runs a chain of no-op nodes with durability="async", checkpointing each step
+with AsyncPostgresCheckpointer, which the step waits on, and with
+WriteBehindCheckpointer, which queues the step's statements and persists them
+from a background task. Prints steps per second of the run loop alone and
+including the final aflush, which a run awaits before it's finalized, then
+checks both threads stored the same history.
+
+--latency adds a delay per statement row and per transaction, as a database
+across the network would.
+
+Needs a migrated database at DATABASE_URI.
+
+Usage:
+  python examples/write_behind_benchmark.py
+  python examples/write_behind_benchmark.py --nodes 200 --latency 1
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+from collections.abc import Sequence
+from typing import Any, TypedDict
+
+from langgraph.graph import END, START, StateGraph
+
+from api.utils import fetchone
+from storage.async_postgres_checkpointer import (
+    AsyncPostgresCheckpointer,
+    Statement,
+    WriteBehindCheckpointer,
+)
+from storage.database import create_conn
+from storage.ops import Threads
+
+LATENCY = 0.0
+
+
+class State(TypedDict):
+    step: int
+
+
+def noop(state: State) -> dict[str, Any]:
+    return {"step": state["step"] + 1}
+
+
+def graph(checkpointer: AsyncPostgresCheckpointer, nodes: int) -> Any:
+    builder = StateGraph(State)
+    previous = START
+    for i in range(nodes):
+        builder.add_node(f"node_{i}", noop)
+        builder.add_edge(previous, f"node_{i}")
+        previous = f"node_{i}"
+    builder.add_edge(previous, END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+class Remote:
+    """Delays writes by LATENCY per statement row and per transaction."""
+
+    async def _write(self, statements: Sequence[Statement]) -> None:
+        rows = sum(len(params) for _, params in statements)
+        await asyncio.sleep(LATENCY * (rows + 1))
+        await super()._write(statements)  # type: ignore[misc]
+
+
+class RemoteCheckpointer(Remote, AsyncPostgresCheckpointer):
+    pass
+
+
+class RemoteWriteBehindCheckpointer(Remote, WriteBehindCheckpointer):
+    pass
+
+
+async def run_thread(
+    conn: Any, checkpointer: AsyncPostgresCheckpointer, nodes: int
+) -> tuple[str, float, float]:
+    """Run the graph on a new thread, returning its id, run and flush seconds."""
+    thread_id = uuid.uuid4()
+    await fetchone(await Threads.put(conn, thread_id, metadata={}, if_exists="raise"))
+    config = {
+        "configurable": {"thread_id": str(thread_id)},
+        "recursion_limit": nodes + 1,
+    }
+    start = time.perf_counter()
+    await graph(checkpointer, nodes).ainvoke({"step": 0}, config, durability="async")
+    ran = time.perf_counter()
+    if isinstance(checkpointer, WriteBehindCheckpointer):
+        await checkpointer.aflush()
+    return str(thread_id), ran - start, time.perf_counter() - start
+
+
+async def history(conn: Any, thread_id: str, nodes: int) -> list[Any]:
+    app = graph(AsyncPostgresCheckpointer(conn), nodes)
+    config = {"configurable": {"thread_id": thread_id}}
+    return [
+        (snapshot.values, snapshot.metadata["step"])
+        async for snapshot in app.aget_state_history(config)
+    ]
+
+
+async def run(args: argparse.Namespace) -> None:
+    global LATENCY
+    LATENCY = args.latency / 1000
+    conn = await create_conn()
+    await conn.set_autocommit(True)
+    async with conn:
+        print(f"{args.nodes} no-op nodes, {args.latency} ms latency per statement")
+        print(f"{'checkpointer':<16}{'run steps/s':>14}{'with flush steps/s':>20}")
+        threads = []
+        for name, make in (
+            ("synchronous", RemoteCheckpointer),
+            ("write-behind", RemoteWriteBehindCheckpointer),
+        ):
+            best_run = best_total = float("inf")
+            for _ in range(args.rounds):
+                thread_id, run_secs, total_secs = await run_thread(
+                    conn, make(conn), args.nodes
+                )
+                best_run = min(best_run, run_secs)
+                best_total = min(best_total, total_secs)
+            threads.append(thread_id)
+            print(
+                f"{name:<16}{args.nodes / best_run:>14.0f}"
+                f"{args.nodes / best_total:>20.0f}"
+            )
+        sync, write_behind = [
+            await history(conn, thread_id, args.nodes) for thread_id in threads
+        ]
+        assert sync == write_behind, "write-behind stored a different history"
+        print(f"\nboth stored the same {len(sync)} checkpoints")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark write-behind checkpoints.")
+    parser.add_argument("--nodes", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="milliseconds")
+    parser.add_argument("--rounds", type=int, default=3)
+    return parser.parse_args()
+
+
+def main() -> None:
+    asyncio.run(run(parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+-- Content-addressed storage for large checkpoint channel values, shared across
+-- threads and versions. checkpoint_blobs rows reference it through "hash".
+CREATE TABLE IF NOT EXISTS checkpoint_blob_content (
+	hash bytea NOT NULL,
+	"type" text NOT NULL,
+	"blob" bytea NOT NULL,
+	touched_at timestamptz DEFAULT now() NOT NULL,
+	CONSTRAINT checkpoint_blob_content_pkey PRIMARY KEY (hash)
+);
+
+ALTER TABLE checkpoint_blobs ADD COLUMN IF NOT EXISTS hash bytea NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS checkpoint_blobs_hash_idx ON checkpoint_blobs USING btree (hash) WHERE hash IS NOT NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS checkpoint_blob_content_touched_at_idx ON checkpoint_blob_content USING btree (touched_at);
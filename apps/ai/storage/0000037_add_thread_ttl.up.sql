@@ -0,0 +1,6 @@
+-- Threads with a TTL are deleted by the sweeper once "expires_at" passes.
+-- Every status update pushes "expires_at" back to now() + "ttl_minutes".
+ALTER TABLE thread ADD COLUMN IF NOT EXISTS ttl_minutes double precision NULL;
+ALTER TABLE thread ADD COLUMN IF NOT EXISTS expires_at timestamptz NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS thread_expires_at_idx ON thread USING btree (expires_at) WHERE expires_at IS NOT NULL;
@@ -0,0 +1,7 @@
+-- Search pages are ordered by the sort field, then the row id, and the next
+-- page starts after the (sort field, id) of the last row. These indexes serve
+-- the default created_at order and the updated_at order without sorting all
+-- matching rows, in either direction.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS thread_created_at_idx ON thread USING btree (created_at DESC, thread_id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS thread_updated_at_idx ON thread USING btree (updated_at DESC, thread_id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS assistant_created_at_idx ON assistant USING btree (created_at DESC, assistant_id DESC);
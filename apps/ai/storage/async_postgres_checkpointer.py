@@ -1,30 +1,742 @@
 """Custom Checkpointer."""
 
 import asyncio
-from collections.abc import AsyncIterator, Sequence
-from typing import Any
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import nullcontext
+from collections.abc import (
+    AsyncIterator,
+    Callable,
+    Collection,
+    ItemsView,
+    Sequence,
+    ValuesView,
+)
+from typing import Any, NamedTuple, cast
+from uuid import UUID
 
+import orjson
 import structlog
 from langchain_core.runnables import RunnableConfig
 from langgraph.checkpoint.base import (
     Checkpoint,
     CheckpointMetadata,
     CheckpointTuple,
+    copy_checkpoint,
     get_serializable_checkpoint_metadata,
 )
+from langgraph.checkpoint.postgres import _ainternal
 from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
 from langgraph.checkpoint.postgres.base import ChannelVersions, get_checkpoint_id, WRITES_IDX_MAP
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from psycopg import AsyncConnection, AsyncPipeline
 from psycopg.rows import DictRow
 from psycopg.types.json import Jsonb
+from psycopg_pool import AsyncConnectionPool
 
-from api.serde import Fragment, json_loads
+from api.config import (
+    CHECKPOINT_BLOB_DEDUP_MIN_BYTES,
+    CHECKPOINT_BLOB_STORE_MIN_BYTES,
+    CHECKPOINT_COMPACTION_BATCH_SIZE,
+    CHECKPOINT_COMPACTION_THROTTLE_SECS,
+    CHECKPOINT_DELTA_SNAPSHOT_INTERVAL,
+    CHECKPOINT_RETENTION_KEEP_LATEST,
+    CHECKPOINT_WRITE_BEHIND_MAX_BATCH,
+)
+from api.serde import Fragment, Serializer, json_loads
+from storage.blob_cache import BLOB_CACHE, Blob, BlobKey
+from storage.blob_store import BLOB_STORE
 
 logger = structlog.stdlib.get_logger(__name__)
 
+# A query and the parameter rows to execute it with.
+Statement = tuple[str, Sequence[Sequence[Any]]]
+
+# Serialized channel values of at least CHECKPOINT_BLOB_DEDUP_MIN_BYTES are
+# stored once in checkpoint_blob_content, keyed by the sha256 of type and bytes,
+# and checkpoint_blobs rows only reference them. BLOB_HASH_SQL must hash exactly
+# like _blob_hash.
+BLOB_HASH_SQL = "sha256(convert_to({type}, 'UTF8') || '\\x00'::bytea || {blob})"
+# Hashes written by this process are remembered for KNOWN_BLOB_TTL_SECS so
+# repeated values skip the content write. The upsert refreshes touched_at at
+# most every BLOB_TOUCH_INTERVAL and gc_checkpoint_blobs only deletes content
+# untouched for BLOB_GC_GRACE, so a remembered hash can never be collected.
+KNOWN_BLOB_TTL_SECS = 600
+KNOWN_BLOB_MAX_ENTRIES = 65536
+BLOB_TOUCH_INTERVAL = "5 minutes"
+BLOB_GC_GRACE = "1 hour"
+BLOB_GC_BATCH_SIZE = 1000
+
+# Content of at least CHECKPOINT_BLOB_STORE_MIN_BYTES is uploaded to BLOB_STORE
+# under its hex hash, and its checkpoint_blob_content row keeps only that
+# "location". The upload is a pseudo-statement that _write runs after the
+# content upsert and before commit: a concurrent gc_checkpoint_blobs either
+# skips the locked row or has deleted it and its object before the upsert
+# proceeds, so a committed row always has its object.
+PUT_STORE_BLOBS = "-- put blob store objects"
+
+# List channels (e.g. messages) that kept a prefix of their previous version
+# are stored as a "delta" blob: the versions back to the last full snapshot,
+# the length of the prefix kept and the serialized appended items.
+DELTA_TYPE = "delta"
+
+# Channel blobs are fetched separately with SELECT_BLOBS_SQL, and only for the
+# versions missing from BLOB_CACHE.
+SELECT_SQL = """
+select
+    thread_id,
+    checkpoint,
+    checkpoint_ns,
+    checkpoint_id,
+    parent_checkpoint_id,
+    metadata,
+    (
+        select
+        array_agg(array[cw.task_id::text::bytea, cw.channel::bytea, cw.type::bytea, cw.blob] order by cw.task_id, cw.idx)
+        from checkpoint_writes cw
+        where cw.thread_id = checkpoints.thread_id
+            and cw.checkpoint_ns = checkpoints.checkpoint_ns
+            and cw.checkpoint_id = checkpoints.checkpoint_id
+    ) as pending_writes
+from checkpoints """
+
+# The writes a fork made to checkpoints it inherits, see _get_fork_pending_writes.
+SELECT_WRITES_SQL = """
+    select checkpoint_id, task_id::text as task_id, channel, type, blob
+    from checkpoint_writes
+    where thread_id = %s
+        and checkpoint_ns = %s
+        and checkpoint_id = any(%s::uuid[])
+    order by checkpoint_writes.checkpoint_id, checkpoint_writes.task_id, idx
+"""
+
+UPSERT_CHECKPOINT_BLOBS_SQL = """
+    INSERT INTO checkpoint_blobs (thread_id, checkpoint_ns, channel, version, type, blob, hash)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (thread_id, checkpoint_ns, channel, version) DO NOTHING
+"""
+
+SELECT_BLOBS_SQL = """
+    select bl.channel, bl.version, bl.type, coalesce(bl.blob, bc.blob) as blob, bc.location
+    from unnest(%s::text[], %s::text[]) as wanted(channel, version)
+    inner join checkpoint_blobs bl
+        on bl.thread_id = %s
+        and bl.checkpoint_ns = %s
+        and bl.channel = wanted.channel
+        and bl.version = wanted.version
+    left join checkpoint_blob_content bc on bc.hash = bl.hash
+"""
+
+# A fork (see Threads.copy) reads the rows of its ancestors from before its
+# fork checkpoint as its own. SELECT_LINEAGE_SQL lists the ancestors, nearest
+# first, each with the checkpoint_id the rows inherited from it sort before.
+SELECT_LINEAGE_SQL = """
+    WITH RECURSIVE lineage AS (
+        SELECT parent_thread_id, fork_checkpoint_id AS before, 1 AS depth
+        FROM thread_fork
+        WHERE thread_id = %s
+        UNION ALL
+        SELECT f.parent_thread_id, least(lineage.before, f.fork_checkpoint_id), lineage.depth + 1
+        FROM thread_fork f
+        INNER JOIN lineage ON f.thread_id = lineage.parent_thread_id
+    )
+    SELECT parent_thread_id AS thread_id, before
+    FROM lineage
+    ORDER BY depth
+"""
+
+UPSERT_BLOB_CONTENT_SQL = f"""
+    INSERT INTO checkpoint_blob_content (hash, type, blob, location)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (hash) DO UPDATE SET
+        touched_at = now(),
+        -- content stored inline before it was big enough for the blob store
+        blob = CASE WHEN excluded.location IS NULL THEN checkpoint_blob_content.blob END,
+        location = coalesce(checkpoint_blob_content.location, excluded.location)
+    WHERE checkpoint_blob_content.touched_at < now() - interval '{BLOB_TOUCH_INTERVAL}'
+        OR (excluded.location IS NOT NULL AND checkpoint_blob_content.location IS NULL)
+"""
+
+GC_BLOB_CONTENT_SQL = f"""
+    DELETE FROM checkpoint_blob_content
+    WHERE hash IN (
+        SELECT c.hash
+        FROM checkpoint_blob_content c
+        WHERE c.touched_at < now() - interval '{BLOB_GC_GRACE}'
+            AND NOT EXISTS (SELECT 1 FROM checkpoint_blobs b WHERE b.hash = c.hash)
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING location
+"""
+
+# Retention (see CHECKPOINT_RETENTION_KEEP_LATEST) keeps the latest checkpoints
+# of a thread and namespace, the last checkpoint of each run, interrupted
+# checkpoints and those up to the fork checkpoint of any fork of the thread,
+# which the fork reads as its own. The rest are deleted with their writes, then
+# blob versions that no remaining checkpoint or delta chain references.
+COMPACTION_THREADS_SQL = """
+    SELECT thread_id, checkpoint_ns
+    FROM checkpoints
+    WHERE (thread_id, checkpoint_ns) > (%s, %s)
+    GROUP BY thread_id, checkpoint_ns
+    HAVING count(*) > %s
+    ORDER BY thread_id, checkpoint_ns
+    LIMIT %s
+"""
+
+SUPERSEDED_CHECKPOINTS_SQL = """
+    SELECT checkpoint_id
+    FROM (
+        SELECT
+            checkpoint_id,
+            coalesce(run_id::text, metadata->>'run_id') AS run_id,
+            row_number() OVER (ORDER BY checkpoint_id DESC) AS recency,
+            row_number() OVER (
+                PARTITION BY coalesce(run_id::text, metadata->>'run_id')
+                ORDER BY checkpoint_id DESC
+            ) AS run_recency
+        FROM checkpoints
+        WHERE thread_id = %s AND checkpoint_ns = %s
+    ) ranked
+    WHERE recency > %s
+        AND (run_id IS NULL OR run_recency > 1)
+        AND NOT EXISTS (
+            SELECT 1 FROM checkpoint_writes cw
+            WHERE cw.thread_id = %s
+                AND cw.checkpoint_ns = %s
+                AND cw.checkpoint_id = ranked.checkpoint_id
+                AND cw.channel = '__interrupt__'
+        )
+        AND NOT EXISTS (
+            SELECT 1 FROM thread_fork f
+            WHERE f.parent_thread_id = %s AND ranked.checkpoint_id <= f.fork_checkpoint_id
+        )
+    ORDER BY checkpoint_id
+    LIMIT %s
+"""
+
+# Threads.copy share-locks the thread until the fork is committed, so a fork is
+# either seen by SUPERSEDED_CHECKPOINTS_SQL or forks from the compacted thread.
+LOCK_COMPACTED_THREAD_SQL = (
+    "SELECT 1 FROM thread WHERE thread_id = %s FOR NO KEY UPDATE"
+)
+
+DELETE_CHECKPOINT_WRITES_SQL = """
+    DELETE FROM checkpoint_writes
+    WHERE thread_id = %s AND checkpoint_ns = %s AND checkpoint_id = any(%s::uuid[])
+"""
+
+DELETE_CHECKPOINTS_SQL = """
+    DELETE FROM checkpoints
+    WHERE thread_id = %s AND checkpoint_ns = %s AND checkpoint_id = any(%s::uuid[])
+"""
+
+SELECT_BLOB_VERSIONS_SQL = """
+    SELECT channel, version
+    FROM checkpoint_blobs
+    WHERE thread_id = %s AND checkpoint_ns = %s
+"""
+
+# The blob versions of a thread are also referenced by the checkpoints and
+# delta chains of the threads forked from it, directly or through other forks.
+FORK_DESCENDANTS_SQL = """
+    WITH RECURSIVE descendants AS (
+        SELECT %s::uuid AS thread_id
+        UNION
+        SELECT f.thread_id
+        FROM thread_fork f
+        INNER JOIN descendants d ON f.parent_thread_id = d.thread_id
+    )
+"""
+
+SELECT_REFERENCED_VERSIONS_SQL = (
+    FORK_DESCENDANTS_SQL
+    + """
+    SELECT DISTINCT versions.key AS channel, versions.value #>> '{}' AS version
+    FROM descendants
+    INNER JOIN checkpoints USING (thread_id),
+        jsonb_each(checkpoints.checkpoint -> 'channel_versions') AS versions
+    WHERE checkpoints.checkpoint_ns = %s
+"""
+)
+
+SELECT_DELTA_BLOBS_SQL = f"""{FORK_DESCENDANTS_SQL}
+    SELECT bl.channel, coalesce(bl.blob, bc.blob) AS blob, bc.location
+    FROM unnest(%s::text[], %s::text[]) AS wanted(channel, version)
+    INNER JOIN checkpoint_blobs bl
+        ON bl.thread_id IN (SELECT thread_id FROM descendants)
+        AND bl.checkpoint_ns = %s
+        AND bl.channel = wanted.channel
+        AND bl.version = wanted.version
+    LEFT JOIN checkpoint_blob_content bc ON bc.hash = bl.hash
+    WHERE bl.type = '{DELTA_TYPE}'
+"""
+
+DELETE_BLOB_VERSIONS_SQL = """
+    DELETE FROM checkpoint_blobs bl
+    USING unnest(%s::text[], %s::text[]) AS orphan(channel, version)
+    WHERE bl.thread_id = %s
+        AND bl.checkpoint_ns = %s
+        AND bl.channel = orphan.channel
+        AND bl.version = orphan.version
+"""
+
+# Before a thread is deleted, each fork of it that is kept gets a copy of the
+# rows it inherits from the thread, and is then forked from the thread's own
+# parent, if any, as of the earlier of both fork checkpoints. Blob versions
+# are all copied, as deltas chain to versions no checkpoint names, and large
+# inline ones are moved into shared content on the way.
+SELECT_DETACHED_FORKS_SQL = """
+    SELECT thread_id, parent_thread_id, fork_checkpoint_id
+    FROM thread_fork
+    WHERE parent_thread_id = any(%s::uuid[]) AND NOT thread_id = any(%s::uuid[])
+    ORDER BY thread_id
+    FOR UPDATE
+"""
+
+DETACH_CHECKPOINTS_SQL = """
+    INSERT INTO checkpoints (run_id, thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, checkpoint, metadata)
+    SELECT NULL, %(thread_id)s, checkpoint_ns, checkpoint_id, parent_checkpoint_id, checkpoint,
+        jsonb_set(metadata, '{thread_id}', to_jsonb(%(thread_id)s::text))
+    FROM checkpoints
+    WHERE thread_id = %(parent_thread_id)s AND checkpoint_id < %(fork_checkpoint_id)s
+    ON CONFLICT DO NOTHING
+"""
+
+DETACH_WRITES_SQL = """
+    INSERT INTO checkpoint_writes (thread_id, checkpoint_ns, checkpoint_id, task_id, task_path, idx, channel, type, blob)
+    SELECT %(thread_id)s, w.checkpoint_ns, w.checkpoint_id, w.task_id, w.task_path, w.idx, w.channel, w.type, w.blob
+    FROM checkpoint_writes w
+    WHERE w.thread_id = %(parent_thread_id)s
+        AND w.checkpoint_id < %(fork_checkpoint_id)s
+        -- the fork's own writes to an inherited checkpoint replace the parent's
+        AND NOT EXISTS (
+            SELECT 1 FROM checkpoint_writes own
+            WHERE own.thread_id = %(thread_id)s
+                AND own.checkpoint_ns = w.checkpoint_ns
+                AND own.checkpoint_id = w.checkpoint_id
+        )
+    ON CONFLICT DO NOTHING
+"""
+
+DETACH_BLOBS_SQL = f"""
+    WITH source AS (
+        SELECT checkpoint_ns, channel, version, type, blob, coalesce(
+            hash,
+            CASE WHEN %(dedup_min_bytes)s > 0 AND octet_length(blob) >= %(dedup_min_bytes)s
+            THEN {BLOB_HASH_SQL.format(type="type", blob="blob")} END
+        ) AS hash
+        FROM checkpoint_blobs
+        WHERE thread_id = %(parent_thread_id)s
+    ), content AS (
+        INSERT INTO checkpoint_blob_content (hash, type, blob)
+        SELECT DISTINCT ON (hash) hash, type, blob
+        FROM source
+        WHERE hash IS NOT NULL AND blob IS NOT NULL
+        ON CONFLICT (hash) DO UPDATE SET touched_at = now()
+    )
+    INSERT INTO checkpoint_blobs (thread_id, checkpoint_ns, channel, version, type, blob, hash)
+    SELECT %(thread_id)s, checkpoint_ns, channel, version, type, CASE WHEN hash IS NULL THEN blob END, hash
+    FROM source
+    ON CONFLICT DO NOTHING
+"""
+
+REPARENT_FORK_SQL = """
+    UPDATE thread_fork
+    SET parent_thread_id = parent.parent_thread_id,
+        fork_checkpoint_id = least(thread_fork.fork_checkpoint_id, parent.fork_checkpoint_id)
+    FROM thread_fork parent
+    WHERE thread_fork.thread_id = %(thread_id)s AND parent.thread_id = %(parent_thread_id)s
+"""
+
+DELETE_FORK_SQL = "DELETE FROM thread_fork WHERE thread_id = %(thread_id)s"
+
+# The fork rows of the deleted threads go once the forks they had are
+# detached, as a parent's foreign key may be checked before they cascade.
+DELETE_FORKS_SQL = "DELETE FROM thread_fork WHERE thread_id = any(%s::uuid[])"
+
+# Totals since startup, for the metrics endpoint.
+COMPACTION_STATS = {
+    "passes": 0,
+    "threads": 0,
+    "checkpoints_deleted": 0,
+    "writes_deleted": 0,
+    "blobs_deleted": 0,
+}
+
+_known_blobs: OrderedDict[bytes, float] = OrderedDict()
+_known_blobs_lock = threading.Lock()
+
+
+def _blob_hash(type_: str, blob: bytes) -> bytes:
+    return hashlib.sha256(type_.encode() + b"\x00" + blob).digest()
+
+
+def _is_known_blob(hash_: bytes) -> bool:
+    with _known_blobs_lock:
+        written_at = _known_blobs.get(hash_)
+        if written_at is None:
+            return False
+        if time.monotonic() - written_at > KNOWN_BLOB_TTL_SECS:
+            del _known_blobs[hash_]
+            return False
+        return True
+
+
+def _remember_blobs(statements: Sequence[Statement]) -> None:
+    """Record content hashes once the statements writing them have committed."""
+    now = time.monotonic()
+    with _known_blobs_lock:
+        for query, params in statements:
+            if query == UPSERT_BLOB_CONTENT_SQL:
+                for hash_, *_ in params:
+                    _known_blobs[hash_] = now
+                    _known_blobs.move_to_end(hash_)
+        while len(_known_blobs) > KNOWN_BLOB_MAX_ENTRIES:
+            _known_blobs.popitem(last=False)
+
+
+async def gc_checkpoint_blobs(conn: AsyncConnection[DictRow]) -> int:
+    """Delete unreferenced checkpoint blob content, returning the number of rows."""
+    deleted = 0
+    while True:
+        async with conn.transaction():
+            cur = await conn.execute(GC_BLOB_CONTENT_SQL, (BLOB_GC_BATCH_SIZE,))
+            rows = await cur.fetchall()
+            # before commit, so writers of the same content wait on the row locks
+            # and upload it again (see PUT_STORE_BLOBS)
+            if locations := [row["location"] for row in rows if row["location"]]:
+                await BLOB_STORE.delete(locations)
+        deleted += len(rows)
+        if len(rows) < BLOB_GC_BATCH_SIZE:
+            return deleted
+
+
+async def _get_store_blobs(rows: Sequence["DictRow"]) -> None:
+    """Fill in the blob of rows whose content lives in BLOB_STORE."""
+    stored = [row for row in rows if row["blob"] is None and row["location"]]
+    for row, blob in zip(
+        stored,
+        await asyncio.gather(*(BLOB_STORE.get(row["location"]) for row in stored)),
+        strict=True,
+    ):
+        row["blob"] = blob
+
+
+class DeltaBase(NamedTuple):
+    """Last value written for a list channel, for the next version to diff against."""
+
+    version: str
+    # digest of each serialized item, None until computed from `load`
+    digests: tuple[bytes, ...] | None
+    # loads the value of a base seeded from a stored checkpoint
+    load: Callable[[], Any] | None
+    # versions from the last full snapshot up to, excluding, `version`
+    chain: tuple[str, ...]
+
+
+class Delta(NamedTuple):
+    chain: tuple[str, ...]
+    keep: int
+    type: str
+    tail: bytes
+
+
+def _dump_delta(delta: Delta) -> bytes:
+    return orjson.dumps([delta.chain, delta.keep, delta.type]) + b"\n" + delta.tail
+
+
+def _load_delta(blob: bytes) -> Delta:
+    header, _, tail = blob.partition(b"\n")
+    chain, keep, type_ = orjson.loads(header)
+    return Delta(tuple(chain), keep, type_, tail)
+
+
+class _Undecoded:
+    """Placeholder for a channel value that has not been deserialized yet."""
+
+    __slots__ = ("load", "value")
+
+    def __init__(self, load: Callable[[], Any]) -> None:
+        self.load = load
+        self.value: Any = _Undecoded
+
+    def get(self) -> Any:
+        if self.value is _Undecoded:
+            self.value = self.load()
+        return self.value
+
+
+class LazyChannelValues(dict[str, Any]):
+    """Checkpoint channel values that are deserialized on first access.
+
+    Membership, length and key iteration never decode. Reading a value through
+    any mapping method decodes it once; copies share the decoded value, like
+    the shallow copy of a plain dict would.
+    """
+
+    def __getitem__(self, key: str) -> Any:
+        value = super().__getitem__(key)
+        if type(value) is _Undecoded:
+            value = value.get()
+            super().__setitem__(key, value)
+        return value
+
+    def __iter__(self) -> Any:
+        # Overriding __iter__ keeps dict(), {**...} and update() off the C fast
+        # path that copies the raw placeholders, so they go through __getitem__.
+        return super().__iter__()
+
+    def __eq__(self, other: object) -> bool:
+        return dict(self.items()) == other
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key not in self:
+            return default
+        return self[key]
+
+    def items(self) -> ItemsView[str, Any]:  # type: ignore[override]
+        return ItemsView(self)
+
+    def values(self) -> ValuesView[Any]:  # type: ignore[override]
+        return ValuesView(self)
+
+    def pop(self, key: str, *default: Any) -> Any:
+        if key in self:
+            value = self[key]
+            super().pop(key)
+            return value
+        return super().pop(key, *default)
+
+    def popitem(self) -> tuple[str, Any]:
+        key, value = super().popitem()
+        return key, value.get() if type(value) is _Undecoded else value
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def copy(self) -> "LazyChannelValues":
+        copied = LazyChannelValues()
+        for key in self:
+            dict.__setitem__(copied, key, dict.__getitem__(self, key))
+        return copied
+
+    def set_lazy(self, key: str, load: Callable[[], Any]) -> None:
+        """Set `key` to the result of `load`, called on first access."""
+        super().__setitem__(key, _Undecoded(load))
+
+
+async def compact_checkpoints(
+    conn: AsyncConnection[DictRow],
+    keep_latest: int = CHECKPOINT_RETENTION_KEEP_LATEST,
+    *,
+    batch_size: int = CHECKPOINT_COMPACTION_BATCH_SIZE,
+    throttle_secs: float = CHECKPOINT_COMPACTION_THROTTLE_SECS,
+) -> dict[str, int]:
+    """Delete checkpoints superseded under the retention policy.
+
+    Walks every thread and namespace with more than `keep_latest` checkpoints,
+    committing each statement of at most `batch_size` rows on its own and
+    sleeping `throttle_secs` after it, so the deletes hold locks briefly and
+    leave vacuum room to keep up. Returns the counts of this pass.
+    """
+    stats = dict.fromkeys(COMPACTION_STATS, 0)
+    if keep_latest <= 0:
+        return stats
+    after: tuple[UUID, str] = (UUID(int=0), "")
+    while True:
+        async with conn.transaction():
+            cur = await conn.execute(
+                COMPACTION_THREADS_SQL, (*after, keep_latest, batch_size)
+            )
+            threads = [
+                (row["thread_id"], row["checkpoint_ns"]) for row in await cur.fetchall()
+            ]
+        for thread_id, checkpoint_ns in threads:
+            await _compact_thread(
+                conn,
+                thread_id,
+                checkpoint_ns,
+                keep_latest,
+                batch_size,
+                throttle_secs,
+                stats,
+            )
+            stats["threads"] += 1
+        if len(threads) < batch_size:
+            break
+        after = threads[-1]
+    stats["passes"] = 1
+    for key, count in stats.items():
+        COMPACTION_STATS[key] += count
+    return stats
+
+
+async def _compact_thread(
+    conn: AsyncConnection[DictRow],
+    thread_id: Any,
+    checkpoint_ns: str,
+    keep_latest: int,
+    batch_size: int,
+    throttle_secs: float,
+    stats: dict[str, int],
+) -> None:
+    while True:
+        async with conn.transaction():
+            await conn.execute(LOCK_COMPACTED_THREAD_SQL, (thread_id,))
+            cur = await conn.execute(
+                SUPERSEDED_CHECKPOINTS_SQL,
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    keep_latest,
+                    thread_id,
+                    checkpoint_ns,
+                    thread_id,
+                    batch_size,
+                ),
+            )
+            checkpoint_ids = [row["checkpoint_id"] for row in await cur.fetchall()]
+            if checkpoint_ids:
+                args = (thread_id, checkpoint_ns, checkpoint_ids)
+                cur = await conn.execute(DELETE_CHECKPOINT_WRITES_SQL, args)
+                stats["writes_deleted"] += cur.rowcount
+                cur = await conn.execute(DELETE_CHECKPOINTS_SQL, args)
+                stats["checkpoints_deleted"] += cur.rowcount
+        if not checkpoint_ids:
+            break
+        await asyncio.sleep(throttle_secs)
+        if len(checkpoint_ids) < batch_size:
+            break
+    await delete_orphan_blob_versions(
+        conn, thread_id, checkpoint_ns, batch_size, throttle_secs, stats
+    )
+
+
+async def delete_orphan_blob_versions(
+    conn: AsyncConnection[DictRow],
+    thread_id: Any,
+    checkpoint_ns: str,
+    batch_size: int,
+    throttle_secs: float,
+    stats: dict[str, int],
+) -> None:
+    """Delete the blob versions of a thread and namespace no checkpoint references.
+
+    Checkpoints of the threads forked from the thread count as references.
+    """
+    # Read the stored versions before the referenced ones: rows committed in
+    # between belong to newer checkpoints and are never candidates.
+    async with conn.transaction():
+        cur = await conn.execute(SELECT_BLOB_VERSIONS_SQL, (thread_id, checkpoint_ns))
+        stored = {(row["channel"], row["version"]) for row in await cur.fetchall()}
+        cur = await conn.execute(
+            SELECT_REFERENCED_VERSIONS_SQL, (thread_id, checkpoint_ns)
+        )
+        referenced = {(row["channel"], row["version"]) for row in await cur.fetchall()}
+        # the versions back to the snapshot of a referenced delta stay too
+        if referenced:
+            channels, versions = zip(*referenced, strict=True)
+            cur = await conn.execute(
+                SELECT_DELTA_BLOBS_SQL,
+                (thread_id, list(channels), list(versions), checkpoint_ns),
+            )
+            rows = await cur.fetchall()
+            await _get_store_blobs(rows)
+            for row in rows:
+                referenced.update(
+                    (row["channel"], version)
+                    for version in _load_delta(row["blob"]).chain
+                )
+    orphans = sorted(stored - referenced)
+    for start in range(0, len(orphans), batch_size):
+        channels, versions = zip(*orphans[start : start + batch_size], strict=True)
+        async with conn.transaction():
+            cur = await conn.execute(
+                DELETE_BLOB_VERSIONS_SQL,
+                (list(channels), list(versions), thread_id, checkpoint_ns),
+            )
+            stats["blobs_deleted"] += cur.rowcount
+        await asyncio.sleep(throttle_secs)
+
+
+async def detach_forks(
+    conn: AsyncConnection[DictRow], thread_ids: Sequence[Any]
+) -> int:
+    """Copy the rows the forks of threads about to be deleted inherit from them.
+
+    Forks that are deleted too are skipped. The threads must be locked, so
+    they aren't forked meanwhile. Returns the number of forks detached, each
+    counted once per deleted ancestor it inherited from.
+    """
+    detached = 0
+    while True:
+        cur = await conn.execute(
+            SELECT_DETACHED_FORKS_SQL, (list(thread_ids), list(thread_ids))
+        )
+        forks = await cur.fetchall()
+        if not forks:
+            await conn.execute(DELETE_FORKS_SQL, (list(thread_ids),))
+            return detached
+        for fork in forks:
+            params = {**fork, "dedup_min_bytes": CHECKPOINT_BLOB_DEDUP_MIN_BYTES}
+            await conn.execute(DETACH_CHECKPOINTS_SQL, params)
+            await conn.execute(DETACH_WRITES_SQL, params)
+            await conn.execute(DETACH_BLOBS_SQL, params)
+            cur = await conn.execute(REPARENT_FORK_SQL, params)
+            if not cur.rowcount:
+                await conn.execute(DELETE_FORK_SQL, params)
+            detached += 1
+
+
+def _next_config(config: RunnableConfig, checkpoint: Checkpoint) -> RunnableConfig:
+    return {
+        "configurable": {
+            "thread_id": config["configurable"]["thread_id"],
+            "checkpoint_ns": config["configurable"]["checkpoint_ns"],
+            "checkpoint_id": checkpoint["id"],
+        }
+    }
+
 
 class AsyncPostgresCheckpointer(AsyncPostgresSaver):
     """Custom Checkpointer with Fragment support for backward compatibility."""
 
+    SELECT_SQL = SELECT_SQL
+    UPSERT_CHECKPOINT_BLOBS_SQL = UPSERT_CHECKPOINT_BLOBS_SQL
+    # whether _write pipelines its statements on a connection it was given; one
+    # borrowed from a pool is always pipelined, as only the transaction uses it
+    pipeline_writes = False
+
+    def __init__(
+        self,
+        conn: _ainternal.Conn,
+        pipe: AsyncPipeline | None = None,
+        serde: SerializerProtocol | None = None,
+        *,
+        skip_channels: Collection[str] = (),
+    ) -> None:
+        """Set up the checkpointer.
+
+        Loaded checkpoints leave out the channels in `skip_channels` entirely,
+        so readers that only need some channels don't fetch or decode the rest.
+        """
+        super().__init__(conn, pipe, serde or Serializer())
+        self.delta_bases: dict[tuple[str, str, str], DeltaBase] = {}
+        self.skip_channels = frozenset(skip_channels)
+        # thread_id -> ancestors, see SELECT_LINEAGE_SQL
+        self.lineages: dict[str, list[tuple[str, UUID]]] = {}
 
     
     async def alist(
@@ -57,6 +769,14 @@ class AsyncPostgresCheckpointer(AsyncPostgresSaver):
         async with self._cursor() as cur:
             await cur.execute(query, args, binary=True)
             values = await cur.fetchall()
+            if (
+                config is not None
+                and config["configurable"].get("thread_id") is not None
+                and (not limit or len(values) < limit)
+            ):
+                values += await self._list_inherited(
+                    cur, config, filter, before, limit and limit - len(values)
+                )
             if not values:
                 logger.warning("No checkpoints found")
                 return
@@ -84,8 +804,9 @@ class AsyncPostgresCheckpointer(AsyncPostgresSaver):
             #                 value["checkpoint"],
             #                 value["channel_values"],
             #             )
-            for value in values:
-                yield await self._load_checkpoint_tuple(value)
+            await self._get_fork_pending_writes(cur, values)
+            for checkpoint_tuple in await self._load_checkpoint_tuples(cur, values):
+                yield checkpoint_tuple
 
     async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
         """Get a checkpoint tuple from the database asynchronously.
@@ -118,6 +839,10 @@ class AsyncPostgresCheckpointer(AsyncPostgresSaver):
                 binary=True,
             )
             value = await cur.fetchone()
+            if value is None:
+                value = await self._get_inherited(
+                    cur, thread_id, checkpoint_ns, checkpoint_id
+                )
             if value is None:
                 return None
 
@@ -136,7 +861,10 @@ class AsyncPostgresCheckpointer(AsyncPostgresSaver):
             #             value["channel_values"],
             #         )
 
-            return await self._load_checkpoint_tuple(value)
+            (checkpoint_tuple,) = await self._load_checkpoint_tuples(
+                cur, [value], seed_delta_bases=True
+            )
+            return checkpoint_tuple
 
     async def aput(
         self,
@@ -159,20 +887,80 @@ class AsyncPostgresCheckpointer(AsyncPostgresSaver):
         Returns:
             RunnableConfig: Updated configuration after storing the checkpoint.
         """
-        configurable = config["configurable"].copy()
-        thread_id = configurable.pop("thread_id")
-        checkpoint_ns = configurable.pop("checkpoint_ns")
-        checkpoint_id = configurable.pop("checkpoint_id", None)
+        statements = await self._checkpoint_statements(
+            config, checkpoint, metadata, new_versions
+        )
+        await self._write(statements)
+        _remember_blobs(statements)
+        return _next_config(config, checkpoint)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Store intermediate writes linked to a checkpoint asynchronously.
+
+        This method saves intermediate writes associated with a checkpoint to the database.
+
+        Args:
+            config: Configuration of the related checkpoint.
+            writes: List of writes to store, each as (channel, value) pair.
+            task_id: Identifier for the task creating the writes.
+            task_path: Path identifier for the task.
+        """
+        await self._write(
+            [await self._writes_statement(config, writes, task_id, task_path)]
+        )
+
+    async def _write(self, statements: Sequence[Statement]) -> None:
+        """Execute statements in order in one transaction.
+
+        Given a pool, the connection is borrowed only for this transaction, and
+        the statements are pipelined: no other run can issue queries on it
+        while the pipeline is open.
+        """
+        pipelined = self.supports_pipeline and (
+            self.pipeline_writes or isinstance(self.conn, AsyncConnectionPool)
+        )
+        async with (
+            self.lock,
+            _ainternal.get_connection(self.conn) as conn,
+            conn.transaction(),
+            conn.pipeline() if pipelined else nullcontext() as pipeline,
+            conn.cursor(binary=True) as cur,
+        ):
+            for query, params in statements:
+                if query == PUT_STORE_BLOBS:
+                    if pipeline is not None:
+                        # the content upsert must hold its row locks first
+                        await pipeline.sync()
+                    await asyncio.gather(
+                        *(BLOB_STORE.put(key, data) for key, data in params)
+                    )
+                    continue
+                # Use individual execute calls instead of executemany to avoid
+                # pipeline mode issues
+                for param in params:
+                    await cur.execute(query, param)
+
+    async def _checkpoint_statements(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> list[Statement]:
+        """Serialize a checkpoint into the statements that persist it, in order."""
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        checkpoint_ns = configurable["checkpoint_ns"]
 
         copy = checkpoint.copy()
-        copy["channel_values"] = copy["channel_values"].copy()
-        next_config = {
-            "configurable": {
-                "thread_id": thread_id,
-                "checkpoint_ns": checkpoint_ns,
-                "checkpoint_id": checkpoint["id"],
-            }
-        }
+        # items() also decodes a loaded checkpoint's LazyChannelValues
+        copy["channel_values"] = dict(copy["channel_values"].items())
 
         # inline primitive values in checkpoint table
         # others are stored in blobs table
@@ -183,54 +971,45 @@ class AsyncPostgresCheckpointer(AsyncPostgresSaver):
             else:
                 blob_values[k] = copy["channel_values"].pop(k)
 
-        async with self._cursor(pipeline=False) as cur:
-            if blob_versions := {
-                k: v for k, v in new_versions.items() if k in blob_values
-            }:
-                # Use individual execute calls instead of executemany to avoid pipeline mode issues
-                blob_params = await asyncio.to_thread(
-                    self._dump_blobs,
-                    thread_id,
-                    checkpoint_ns,
-                    blob_values,
-                    blob_versions,
-                )
-                for params in blob_params:
-                    await cur.execute(
-                        self.UPSERT_CHECKPOINT_BLOBS_SQL,
-                        params,
-                    )
-            await cur.execute(
+        statements: list[Statement] = []
+        if blob_versions := {k: v for k, v in new_versions.items() if k in blob_values}:
+            content_params, blob_params, uploads = await asyncio.to_thread(
+                self._dump_deduped_blobs,
+                thread_id,
+                checkpoint_ns,
+                blob_values,
+                blob_versions,
+            )
+            if content_params:
+                statements.append((UPSERT_BLOB_CONTENT_SQL, content_params))
+            if uploads:
+                statements.append((PUT_STORE_BLOBS, uploads))
+            statements.append((self.UPSERT_CHECKPOINT_BLOBS_SQL, blob_params))
+        statements.append(
+            (
                 self.UPSERT_CHECKPOINTS_SQL,
-                (
-                    thread_id,
-                    checkpoint_ns,
-                    checkpoint["id"],
-                    checkpoint_id,
-                    Jsonb(copy),
-                    Jsonb(get_serializable_checkpoint_metadata(config, metadata)),
-                ),
+                [
+                    (
+                        thread_id,
+                        checkpoint_ns,
+                        checkpoint["id"],
+                        configurable.get("checkpoint_id"),
+                        Jsonb(copy),
+                        Jsonb(get_serializable_checkpoint_metadata(config, metadata)),
+                    )
+                ],
             )
-        return next_config
+        )
+        return statements
 
-    async def aput_writes(
+    async def _writes_statement(
         self,
         config: RunnableConfig,
         writes: Sequence[tuple[str, Any]],
         task_id: str,
-        task_path: str = "",
-    ) -> None:
-        """Store intermediate writes linked to a checkpoint asynchronously.
-
-        This method saves intermediate writes associated with a checkpoint to the database.
-        Override to use pipeline=False instead of pipeline=True to avoid pipeline mode errors.
-
-        Args:
-            config: Configuration of the related checkpoint.
-            writes: List of writes to store, each as (channel, value) pair.
-            task_id: Identifier for the task creating the writes.
-            task_path: Path identifier for the task.
-        """
+        task_path: str,
+    ) -> Statement:
+        """Serialize pending writes into the statement that persists them."""
         query = (
             self.UPSERT_CHECKPOINT_WRITES_SQL
             if all(w[0] in WRITES_IDX_MAP for w in writes)
@@ -245,38 +1024,457 @@ class AsyncPostgresCheckpointer(AsyncPostgresSaver):
             task_path,
             writes,
         )
-        async with self._cursor(pipeline=False) as cur:
-            for param in params:
-                await cur.execute(query, param)
+        return query, params
+
+    def _dump_deduped_blobs(
+        self,
+        thread_id: str,
+        checkpoint_ns: str,
+        values: dict[str, Any],
+        versions: ChannelVersions,
+    ) -> tuple[
+        list[tuple[bytes, str, bytes | None, str | None]],
+        list[tuple[Any, ...]],
+        list[tuple[str, bytes]],
+    ]:
+        """Serialize channel values, splitting large ones out as shared content.
+
+        Returns the content rows, the blob rows and the BLOB_STORE objects to
+        upload for content kept out of Postgres.
+        """
+        content: dict[bytes, tuple[bytes, str, bytes | None, str | None]] = {}
+        uploads: list[tuple[str, bytes]] = []
+        blobs = []
+        for thread_id_, ns, channel, version, type_, blob in self._dump_blobs(
+            thread_id, checkpoint_ns, values, versions
+        ):
+            if blob is not None and (
+                0 < CHECKPOINT_BLOB_DEDUP_MIN_BYTES <= len(blob)
+                or 0 < CHECKPOINT_BLOB_STORE_MIN_BYTES <= len(blob)
+            ):
+                hash_ = _blob_hash(type_, blob)
+                if not _is_known_blob(hash_) and hash_ not in content:
+                    if 0 < CHECKPOINT_BLOB_STORE_MIN_BYTES <= len(blob):
+                        uploads.append((location := hash_.hex(), blob))
+                        content[hash_] = (hash_, type_, None, location)
+                    else:
+                        content[hash_] = (hash_, type_, blob, None)
+                blobs.append((thread_id_, ns, channel, version, type_, None, hash_))
+            else:
+                blobs.append((thread_id_, ns, channel, version, type_, blob, None))
+        return list(content.values()), blobs, uploads
+
+    def _dump_blobs(
+        self,
+        thread_id: str,
+        checkpoint_ns: str,
+        values: dict[str, Any],
+        versions: ChannelVersions,
+    ) -> list[tuple[str, str, str, str, str, bytes | None]]:
+        if not versions:
+            return []
+
+        blobs = []
+        for k, ver in versions.items():
+            version = cast("str", ver)
+            if k not in values:
+                blobs.append((thread_id, checkpoint_ns, k, version, "empty", None))
+                continue
+            value = values[k]
+            key = (str(thread_id), checkpoint_ns, k)
+            base = self.delta_bases.pop(key, None)
+            delta = items = None
+            if CHECKPOINT_DELTA_SNAPSHOT_INTERVAL > 0 and isinstance(value, list):
+                # the items are serialized once, for their digests and the blob
+                items = self._dump_items(value)
+                digests = self._digests(value, items)
+                delta = self._diff(base, digests, value, items)
+                self.delta_bases[key] = DeltaBase(
+                    version, digests, None, delta.chain if delta else ()
+                )
+            if delta:
+                typed = (DELTA_TYPE, _dump_delta(delta))
+            else:
+                typed = self._dumps_list(value, items)
+            blobs.append((thread_id, checkpoint_ns, k, version, *typed))
+        return blobs
+
+    def _dump_items(self, value: list[Any]) -> list[bytes] | None:
+        """Serialize the items of a list value, if the serializer can join them."""
+        if isinstance(self.serde, Serializer):
+            return self.serde.dumps_items(value)
+        return None
+
+    def _dumps_list(self, value: Any, items: list[bytes] | None) -> tuple[str, bytes]:
+        if items is not None:
+            return cast("Serializer", self.serde).dumps_typed_items(items)
+        return self.serde.dumps_typed(value)
+
+    def _digests(
+        self, value: list[Any], items: list[bytes] | None = None
+    ) -> tuple[bytes, ...]:
+        """Digest each item of a list by its serialized bytes."""
+        if items is None:
+            items = self._dump_items(value)
+        if items is not None:
+            return tuple(hashlib.sha256(item).digest() for item in items)
+        return tuple(_blob_hash(*self.serde.dumps_typed(item)) for item in value)
+
+    def _diff(
+        self,
+        base: DeltaBase | None,
+        digests: tuple[bytes, ...],
+        value: list[Any],
+        items: list[bytes] | None,
+    ) -> Delta | None:
+        """Encode `value` relative to `base` if it kept a prefix of its items.
+
+        Items are compared by the digests of their serialized bytes, so items
+        updated in place, which reducers may do, are stored again.
+        """
+        if base is None or len(base.chain) + 1 >= CHECKPOINT_DELTA_SNAPSHOT_INTERVAL:
+            return None
+        base_digests = base.digests
+        if base_digests is None:
+            base_value = base.load() if base.load else None
+            if not isinstance(base_value, list):
+                return None
+            base_digests = self._digests(base_value)
+        keep = 0
+        for old, new in zip(base_digests, digests, strict=False):
+            if old != new:
+                break
+            keep += 1
+        if not keep:
+            return None
+        tail = items[keep:] if items is not None else None
+        return Delta(
+            (*base.chain, base.version), keep, *self._dumps_list(value[keep:], tail)
+        )
+
+    def _load_blobs(
+        self,
+        blob_values: list[tuple[str, str, bytes | None]],
+        chain_blobs: dict[tuple[str, str], Blob] | None = None,
+        values: LazyChannelValues | None = None,
+    ) -> LazyChannelValues:
+        """Load (channel, type, blob) rows, rebuilding deltas from `chain_blobs`.
+
+        `chain_blobs` maps (channel, version) to (type, blob) for every version
+        the deltas in `blob_values` reference. Values are only deserialized when
+        first read from the returned mapping, `values` if given.
+        """
+        if values is None:
+            values = LazyChannelValues()
+        for channel, type_, blob in blob_values:
+            if type_ == "empty":
+                continue
+            values.set_lazy(
+                channel, self._blob_loader(channel, type_, blob, chain_blobs or {})
+            )
+        return values
+
+    def _blob_loader(
+        self,
+        channel: str,
+        type_: str,
+        blob: bytes | None,
+        chain_blobs: dict[tuple[str, str], Blob],
+    ) -> Callable[[], Any]:
+        """Get a function deserializing a channel's blob when called."""
+        if type_ == DELTA_TYPE:
+            return functools.partial(
+                self._load_delta_value, channel, _load_delta(blob), chain_blobs
+            )
+        return functools.partial(self.serde.loads_typed, (type_, blob))
+
+    def _load_delta_value(
+        self,
+        channel: str,
+        delta: Delta,
+        chain_blobs: dict[tuple[str, str], Blob],
+    ) -> list[Any]:
+        snapshot, *deltas = delta.chain
+        value = self.serde.loads_typed(chain_blobs[(channel, snapshot)])
+        for version in deltas:
+            step = _load_delta(chain_blobs[(channel, version)][1])
+            value = value[: step.keep] + self.serde.loads_typed((step.type, step.tail))
+        return value[: delta.keep] + self.serde.loads_typed((delta.type, delta.tail))
+
+    async def _get_lineage(self, cur: Any, thread_id: str) -> list[tuple[str, UUID]]:
+        """Get the ancestors a thread was forked from, see SELECT_LINEAGE_SQL."""
+        if (lineage := self.lineages.get(thread_id)) is None:
+            await cur.execute(SELECT_LINEAGE_SQL, (thread_id,))
+            lineage = self.lineages[thread_id] = [
+                (str(row["thread_id"]), row["before"]) for row in await cur.fetchall()
+            ]
+        return lineage
+
+    async def _get_inherited(
+        self,
+        cur: Any,
+        thread_id: Any,
+        checkpoint_ns: str,
+        checkpoint_id: str | None,
+    ) -> "DictRow | None":
+        """Get the checkpoint row a fork inherits, the latest one if no id is given.
+
+        The row keeps the thread_id it is stored under, and "fork_threads"
+        lists the threads it was read through, the fork first.
+        """
+        fork_threads = [str(thread_id)]
+        for ancestor, before in await self._get_lineage(cur, str(thread_id)):
+            if checkpoint_id:
+                if UUID(str(checkpoint_id)) >= before:
+                    return None
+                where = (
+                    "WHERE thread_id = %s AND checkpoint_ns = %s AND checkpoint_id = %s"
+                )
+                args: tuple[Any, ...] = (ancestor, checkpoint_ns, checkpoint_id)
+            else:
+                where = "WHERE thread_id = %s AND checkpoint_ns = %s AND checkpoint_id < %s ORDER BY checkpoint_id DESC LIMIT 1"
+                args = (ancestor, checkpoint_ns, before)
+            await cur.execute(self.SELECT_SQL + where, args, binary=True)
+            if (value := await cur.fetchone()) is not None:
+                value["fork_threads"] = fork_threads
+                await self._get_fork_pending_writes(cur, [value])
+                return value
+            fork_threads = [*fork_threads, ancestor]
+        return None
+
+    async def _list_inherited(
+        self,
+        cur: Any,
+        config: RunnableConfig,
+        filter: dict[str, Any] | None,
+        before: RunnableConfig | None,
+        limit: int | None,
+    ) -> list["DictRow"]:
+        """List the checkpoint rows a fork inherits, newest first, like alist."""
+        fork_threads = [str(config["configurable"]["thread_id"])]
+        before_id = get_checkpoint_id(before) if before else None
+        values: list[DictRow] = []
+        for ancestor, ancestor_before in await self._get_lineage(cur, fork_threads[0]):
+            if before_id:
+                ancestor_before = min(ancestor_before, UUID(str(before_id)))
+            where, args = self._search_where(
+                {"configurable": {**config["configurable"], "thread_id": ancestor}},
+                filter,
+                {"configurable": {"checkpoint_id": str(ancestor_before)}},
+            )
+            query = self.SELECT_SQL + where + " ORDER BY checkpoint_id DESC"
+            if limit:
+                query += f" LIMIT {limit - len(values)}"
+            await cur.execute(query, args, binary=True)
+            for value in await cur.fetchall():
+                value["fork_threads"] = fork_threads
+                values.append(value)
+            if limit and len(values) >= limit:
+                break
+            fork_threads = [*fork_threads, ancestor]
+        return values
+
+    async def _get_fork_pending_writes(self, cur: Any, values: list["DictRow"]) -> None:
+        """Let a fork's own writes to an inherited checkpoint replace its ancestors'.
+
+        Rows read through forks get the writes of the first of their
+        "fork_threads" that has any for them, if one does.
+        """
+        by_forks: dict[tuple[tuple[str, ...], str], dict[Any, DictRow]] = {}
+        for value in values:
+            if fork_threads := value.get("fork_threads"):
+                inherited = by_forks.setdefault(
+                    (tuple(fork_threads), value["checkpoint_ns"]), {}
+                )
+                inherited[value["checkpoint_id"]] = value
+        for (fork_threads, checkpoint_ns), inherited in by_forks.items():
+            for thread_id in fork_threads:
+                if not inherited:
+                    break
+                await cur.execute(
+                    SELECT_WRITES_SQL,
+                    (thread_id, checkpoint_ns, list(inherited)),
+                    binary=True,
+                )
+                own: dict[Any, list[tuple[bytes, ...]]] = {}
+                for row in await cur.fetchall():
+                    own.setdefault(row["checkpoint_id"], []).append(
+                        (
+                            row["task_id"].encode(),
+                            row["channel"].encode(),
+                            row["type"].encode(),
+                            row["blob"],
+                        )
+                    )
+                for checkpoint_id, pending_writes in own.items():
+                    inherited.pop(checkpoint_id)["pending_writes"] = pending_writes
+
+    async def _get_blobs(self, cur: Any, keys: set[BlobKey]) -> dict[BlobKey, Blob]:
+        """Get blob versions from BLOB_CACHE, fetching and caching the missing ones."""
+        blobs = BLOB_CACHE.get_many(keys)
+        missing: dict[tuple[str, str], list[tuple[str, str]]] = {}
+        for thread_id, checkpoint_ns, channel, version in keys - blobs.keys():
+            wanted = missing.setdefault((thread_id, checkpoint_ns), [])
+            wanted.append((channel, version))
+        fetched: dict[BlobKey, Blob] = {}
+        for (thread_id, checkpoint_ns), wanted in missing.items():
+            rows = await self._select_blobs(cur, thread_id, checkpoint_ns, wanted)
+            if len(rows) < len(wanted):
+                # versions from before a fork are stored with its ancestors
+                for ancestor, _ in await self._get_lineage(cur, thread_id):
+                    if rest := [key for key in wanted if key not in rows]:
+                        rows |= await self._select_blobs(
+                            cur, ancestor, checkpoint_ns, rest
+                        )
+            # Channels that were empty when versioned have no row. Blob rows
+            # commit no later than the checkpoint naming them, so a missing
+            # one stays missing and is cached as empty too.
+            for channel, version in wanted:
+                fetched[(thread_id, checkpoint_ns, channel, version)] = rows.get(
+                    (channel, version), ("empty", None)
+                )
+        BLOB_CACHE.put_many(fetched)
+        return blobs | fetched
+
+    async def _select_blobs(
+        self,
+        cur: Any,
+        thread_id: str,
+        checkpoint_ns: str,
+        wanted: list[tuple[str, str]],
+    ) -> dict[tuple[str, str], Blob]:
+        """Fetch the (channel, version) blobs of a thread stored in it."""
+        channels, versions = zip(*wanted, strict=True)
+        await cur.execute(
+            SELECT_BLOBS_SQL,
+            (list(channels), list(versions), thread_id, checkpoint_ns),
+            binary=True,
+        )
+        rows = await cur.fetchall()
+        await _get_store_blobs(rows)
+        return {
+            (row["channel"], row["version"]): (row["type"], row["blob"]) for row in rows
+        }
+
+    async def _load_checkpoint_tuples(
+        self, cur: Any, values: list["DictRow"], *, seed_delta_bases: bool = False
+    ) -> list[CheckpointTuple]:
+        """Load checkpoint rows, fetching the blobs of all of them together."""
+        keys: set[BlobKey] = set()
+        for value in values:
+            checkpoint = value["checkpoint"]
+            if isinstance(checkpoint, Fragment):
+                checkpoint = value["checkpoint"] = json_loads(checkpoint)
+            inline = checkpoint.get("channel_values") or {}
+            keys.update(
+                (str(value["thread_id"]), value["checkpoint_ns"], channel, version)
+                for channel, version in checkpoint["channel_versions"].items()
+                if channel not in inline and channel not in self.skip_channels
+            )
+        blobs = await self._get_blobs(cur, keys)
+        chain_keys = {
+            (thread_id, checkpoint_ns, channel, version)
+            for (thread_id, checkpoint_ns, channel, _), (type_, blob) in blobs.items()
+            if type_ == DELTA_TYPE
+            for version in _load_delta(blob).chain
+        }
+        if chain_keys := chain_keys - blobs.keys():
+            blobs |= await self._get_blobs(cur, chain_keys)
+        by_thread: dict[tuple[str, str], dict[tuple[str, str], Blob]] = {}
+        for (thread_id, checkpoint_ns, channel, version), blob in blobs.items():
+            thread_blobs = by_thread.setdefault((thread_id, checkpoint_ns), {})
+            thread_blobs[(channel, version)] = blob
+        checkpoint_tuples = []
+        for value in values:
+            thread_blobs = by_thread.get(
+                (str(value["thread_id"]), value["checkpoint_ns"]), {}
+            )
+            checkpoint_tuple = await self._load_checkpoint_tuple(value, thread_blobs)
+            if seed_delta_bases:
+                self._seed_delta_bases(checkpoint_tuple, thread_blobs)
+            checkpoint_tuples.append(checkpoint_tuple)
+        return checkpoint_tuples
+
+    def _seed_delta_bases(
+        self,
+        checkpoint_tuple: CheckpointTuple,
+        thread_blobs: dict[tuple[str, str], Blob],
+    ) -> None:
+        """Let the next put of a loaded checkpoint store list channels as deltas.
+
+        Bases are seeded from the stored blobs, which are only deserialized if
+        the channel is put again as a list, not from the checkpoint's values.
+        """
+        if CHECKPOINT_DELTA_SNAPSHOT_INTERVAL <= 0:
+            return
+        configurable = checkpoint_tuple.config["configurable"]
+        for channel, version in checkpoint_tuple.checkpoint["channel_versions"].items():
+            if channel in self.skip_channels or not (
+                stored := thread_blobs.get((channel, str(version)))
+            ):
+                continue
+            type_, blob = stored
+            if type_ == "empty":
+                continue
+            self.delta_bases[
+                (str(configurable["thread_id"]), configurable["checkpoint_ns"], channel)
+            ] = DeltaBase(
+                str(version),
+                None,
+                self._blob_loader(channel, type_, blob, thread_blobs),
+                _load_delta(blob).chain if type_ == DELTA_TYPE else (),
+            )
+
+    async def _load_checkpoint_tuple(
+        self, value: "DictRow", thread_blobs: dict[tuple[str, str], Blob]
+    ) -> CheckpointTuple:
+        """Load a checkpoint tuple, handling Fragment for backward compatibility.
 
-    async def _load_checkpoint_tuple(self, value: "DictRow") -> CheckpointTuple:
-        """Load a checkpoint tuple, handling Fragment for backward compatibility."""
+        `thread_blobs` maps (channel, version) to the blobs of the row's thread.
+        A row read through forks is loaded as a checkpoint of the fork.
+        """
         checkpoint = value["checkpoint"]
         checkpoint = json_loads(checkpoint) if isinstance(checkpoint, Fragment) else checkpoint
+        blob_values = [
+            (channel, *blob)
+            for channel, version in checkpoint["channel_versions"].items()
+            if channel not in self.skip_channels
+            and (blob := thread_blobs.get((channel, version)))
+        ]
+        inline = checkpoint.get("channel_values") or {}
+        channel_values = LazyChannelValues(
+            (channel, channel_value)
+            for channel, channel_value in inline.items()
+            if channel not in self.skip_channels
+        )
 
         metadata = value["metadata"]
         metadata = json_loads(metadata) if isinstance(metadata, Fragment) else metadata
+        thread_id = value["thread_id"]
+        if fork_threads := value.get("fork_threads"):
+            thread_id = fork_threads[0]
+            if "thread_id" in metadata:
+                metadata = {**metadata, "thread_id": thread_id}
 
         return CheckpointTuple(
             {
                 "configurable": {
-                    "thread_id": value["thread_id"],
+                    "thread_id": thread_id,
                     "checkpoint_ns": value["checkpoint_ns"],
                     "checkpoint_id": value["checkpoint_id"],
                 }
             },
             {
                 **checkpoint,
-                "channel_values": {
-                    **(checkpoint.get("channel_values") or {}),
-                    **self._load_blobs(value["channel_values"]),
-                },
+                "channel_values": self._load_blobs(
+                    blob_values, thread_blobs, channel_values
+                ),
             },
             metadata,
             (
                 {
                     "configurable": {
-                        "thread_id": value["thread_id"],
+                        "thread_id": thread_id,
                         "checkpoint_ns": value["checkpoint_ns"],
                         "checkpoint_id": value["parent_checkpoint_id"],
                     }
@@ -285,4 +1483,193 @@ class AsyncPostgresCheckpointer(AsyncPostgresSaver):
                 else None
             ),
             await asyncio.to_thread(self._load_writes, value["pending_writes"]),
-        )
\ No newline at end of file
+        )
+
+
+class WriteBehindCheckpointer(AsyncPostgresCheckpointer):
+    """Checkpointer for durability="async" runs that persists in the background.
+
+    Checkpoints and writes are serialized when they are put, queued in order and
+    flushed by a single background task, one transaction per batch, so the run
+    does not wait on a database round trip per superstep. Reads flush first, and
+    `aflush` must be awaited when the run finishes or is interrupted. A failed
+    flush is re-raised on the next put or flush.
+    """
+
+    def __init__(
+        self,
+        conn: _ainternal.Conn,
+        *,
+        max_batch: int = CHECKPOINT_WRITE_BEHIND_MAX_BATCH,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(conn, **kwargs)
+        self.max_batch = max_batch
+        self.pending: deque[Statement] = deque()
+        self.flusher: asyncio.Task[None] | None = None
+        self.error: BaseException | None = None
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        await self.aflush()
+        return await super().aget_tuple(config)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        await self.aflush()
+        async for value in super().alist(
+            config, filter=filter, before=before, limit=limit
+        ):
+            yield value
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        self._raise_for_error()
+        self._enqueue(
+            await self._checkpoint_statements(
+                config, checkpoint, metadata, new_versions
+            )
+        )
+        return _next_config(config, checkpoint)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        self._raise_for_error()
+        self._enqueue(
+            [await self._writes_statement(config, writes, task_id, task_path)]
+        )
+
+    async def aflush(self) -> None:
+        """Wait until every queued statement is persisted."""
+        if self.flusher is not None:
+            await asyncio.shield(self.flusher)
+        self._raise_for_error()
+
+    def _raise_for_error(self) -> None:
+        if self.error is not None:
+            raise self.error
+
+    def _enqueue(self, statements: list[Statement]) -> None:
+        self.pending.extend(statements)
+        if self.flusher is None or self.flusher.done():
+            self.flusher = asyncio.create_task(self._flush())
+
+    async def _flush(self) -> None:
+        while self.pending:
+            batch: list[Statement] = []
+            while self.pending and len(batch) < self.max_batch:
+                batch.append(self.pending.popleft())
+            try:
+                await self._write(batch)
+                _remember_blobs(batch)
+            except Exception as exc:
+                await logger.aexception("Failed to flush checkpoint writes")
+                self.error = exc
+                self.pending.clear()
+                return
+
+
+class BulkCheckpointer(WriteBehindCheckpointer):
+    """Checkpointer for applying many state updates in a row.
+
+    Puts are only queued, and the last checkpoint put is kept in memory so the
+    next update reads it back without a round trip. `aflush` writes everything
+    queued in one pipelined transaction and must be awaited before the
+    connection is released.
+    """
+
+    pipeline_writes = True
+
+    def __init__(self, conn: _ainternal.Conn, **kwargs: Any) -> None:
+        super().__init__(conn, **kwargs)
+        self.latest: CheckpointTuple | None = None
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        if self.latest is not None and self._is_latest(config):
+            return self.latest
+        return await super().aget_tuple(config)
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        next_config = await super().aput(config, checkpoint, metadata, new_versions)
+        self.latest = CheckpointTuple(
+            next_config,
+            copy_checkpoint(checkpoint),
+            get_serializable_checkpoint_metadata(config, metadata),
+            (
+                {
+                    "configurable": {
+                        **next_config["configurable"],
+                        "checkpoint_id": config["configurable"]["checkpoint_id"],
+                    }
+                }
+                if config["configurable"].get("checkpoint_id")
+                else None
+            ),
+            [],
+        )
+        return next_config
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await super().aput_writes(config, writes, task_id, task_path)
+        if (
+            self.latest is not None
+            and get_checkpoint_id(config) is not None
+            and self._is_latest(config)
+        ):
+            pending_writes = self.latest.pending_writes
+            for channel, value in writes:
+                if channel in WRITES_IDX_MAP:
+                    # special writes replace the task's previous one, as upserts do
+                    pending_writes[:] = [
+                        w for w in pending_writes if w[:2] != (task_id, channel)
+                    ]
+                pending_writes.append((task_id, channel, value))
+
+    async def aflush(self) -> None:
+        """Persist every queued statement in a single transaction."""
+        self._raise_for_error()
+        if self.pending:
+            batch = list(self.pending)
+            self.pending.clear()
+            await self._write(batch)
+            _remember_blobs(batch)
+
+    def _is_latest(self, config: RunnableConfig) -> bool:
+        """Whether `config` points at the last checkpoint put, or doesn't pin one."""
+        configurable = config["configurable"]
+        latest = cast("CheckpointTuple", self.latest).config["configurable"]
+        return (
+            str(configurable["thread_id"]) == str(latest["thread_id"])
+            and configurable.get("checkpoint_ns", "") == latest["checkpoint_ns"]
+            and get_checkpoint_id(config) in (None, latest["checkpoint_id"])
+        )
+
+    def _enqueue(self, statements: list[Statement]) -> None:
+        self.pending.extend(statements)
@@ -0,0 +1,82 @@
+"""Process-wide cache of serialized checkpoint blobs."""
+
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable
+
+from api.config import CHECKPOINT_BLOB_CACHE_BYTES
+
+# thread_id, checkpoint_ns, channel, version
+BlobKey = tuple[str, str, str, str]
+# type, serialized value (None for empty channels)
+Blob = tuple[str, bytes | None]
+
+# Rough per-entry cost of the key, tuple and dict slot, charged to the budget.
+ENTRY_OVERHEAD_BYTES = 256
+
+
+class BlobCache:
+    """LRU cache of checkpoint blob versions bounded by a byte budget.
+
+    A (thread_id, checkpoint_ns, channel, version) row never changes once
+    written, so entries never go stale and only need evicting for space.
+    Values are kept serialized, so callers always decode a private copy.
+    """
+
+    __slots__ = ("max_bytes", "entries", "size", "hits", "misses", "evictions", "lock")
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[BlobKey, Blob] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # checkpointers also run on the isolated background job loops
+        self.lock = threading.Lock()
+
+    def get_many(self, keys: Iterable[BlobKey]) -> dict[BlobKey, Blob]:
+        found = {}
+        with self.lock:
+            for key in keys:
+                if (blob := self.entries.get(key)) is not None:
+                    self.entries.move_to_end(key)
+                    found[key] = blob
+                    self.hits += 1
+                else:
+                    self.misses += 1
+        return found
+
+    def put_many(self, blobs: dict[BlobKey, Blob]) -> None:
+        if self.max_bytes <= 0:
+            return
+        with self.lock:
+            for key, blob in blobs.items():
+                cost = _cost(blob)
+                if cost > self.max_bytes or key in self.entries:
+                    continue
+                self.entries[key] = blob
+                self.size += cost
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= _cost(evicted)
+                self.evictions += 1
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+def _cost(blob: Blob) -> int:
+    return len(blob[1] or b"") + ENTRY_OVERHEAD_BYTES
+
+
+BLOB_CACHE = BlobCache(CHECKPOINT_BLOB_CACHE_BYTES)
+
+__all__ = ["BLOB_CACHE", "Blob", "BlobCache", "BlobKey"]
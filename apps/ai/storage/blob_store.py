@@ -0,0 +1,170 @@
+"""External storage for oversized checkpoint blob content."""
+
+import asyncio
+import os
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from collections.abc import Sequence
+from contextlib import AsyncExitStack
+from pathlib import Path
+from typing import Any
+
+from api.config import (
+    CHECKPOINT_BLOB_STORE,
+    CHECKPOINT_BLOB_STORE_MIN_BYTES,
+    CHECKPOINT_BLOB_STORE_PATH,
+    CHECKPOINT_BLOB_STORE_S3_BUCKET,
+    CHECKPOINT_BLOB_STORE_S3_ENDPOINT_URL,
+    CHECKPOINT_BLOB_STORE_S3_PREFIX,
+)
+
+# S3 DeleteObjects accepts at most this many keys per request.
+S3_DELETE_BATCH_SIZE = 1000
+
+
+class BlobStore(ABC):
+    """Object store for checkpoint blob content too large to keep in Postgres.
+
+    Objects are keyed by the hex hash of their content, so an object never
+    changes once written and writing it again is harmless.
+    """
+
+    @abstractmethod
+    async def put(self, key: str, data: bytes) -> None: ...
+
+    @abstractmethod
+    async def get(self, key: str) -> bytes:
+        """Get an object, raising KeyError if it doesn't exist."""
+
+    @abstractmethod
+    async def delete(self, keys: Sequence[str]) -> None:
+        """Delete objects, ignoring keys that don't exist."""
+
+
+class FileBlobStore(BlobStore):
+    """Store objects as files under `root`, fanned out by key prefix."""
+
+    def __init__(self, root: str | os.PathLike[str]) -> None:
+        self.root = Path(root)
+
+    async def put(self, key: str, data: bytes) -> None:
+        await asyncio.to_thread(self._put, self._path(key), data)
+
+    async def get(self, key: str) -> bytes:
+        try:
+            return await asyncio.to_thread(self._path(key).read_bytes)
+        except FileNotFoundError:
+            raise KeyError(key) from None
+
+    async def delete(self, keys: Sequence[str]) -> None:
+        await asyncio.to_thread(self._delete, [self._path(key) for key in keys])
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    @staticmethod
+    def _put(path: Path, data: bytes) -> None:
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write aside and rename, so readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @staticmethod
+    def _delete(paths: list[Path]) -> None:
+        for path in paths:
+            path.unlink(missing_ok=True)
+
+
+class S3BlobStore(BlobStore):
+    """Store objects in an S3 bucket, or with any client exposing the same API.
+
+    `client_factory` returns an async context manager yielding a client with
+    aiobotocore's put_object, get_object and delete_objects, e.g. a MinIO or
+    other S3-compatible endpoint, or a local stand-in for tests. aiobotocore
+    clients are bound to an event loop, and checkpointers also run on the
+    background job loops, so each thread opens its own client.
+    """
+
+    def __init__(
+        self, bucket: str, prefix: str = "", client_factory: Any = None
+    ) -> None:
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client_factory = client_factory or _aiobotocore_client
+        self.local = threading.local()
+
+    async def put(self, key: str, data: bytes) -> None:
+        client = await self._client()
+        await client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data)
+
+    async def get(self, key: str) -> bytes:
+        client = await self._client()
+        try:
+            response = await client.get_object(
+                Bucket=self.bucket, Key=self.prefix + key
+            )
+        except client.exceptions.NoSuchKey:
+            raise KeyError(key) from None
+        async with response["Body"] as body:
+            return await body.read()
+
+    async def delete(self, keys: Sequence[str]) -> None:
+        client = await self._client()
+        for start in range(0, len(keys), S3_DELETE_BATCH_SIZE):
+            await client.delete_objects(
+                Bucket=self.bucket,
+                Delete={
+                    "Objects": [
+                        {"Key": self.prefix + key}
+                        for key in keys[start : start + S3_DELETE_BATCH_SIZE]
+                    ],
+                    "Quiet": True,
+                },
+            )
+
+    async def _client(self) -> Any:
+        if (client := getattr(self.local, "client", None)) is None:
+            # kept open for the thread's lifetime, like the thread-local pools
+            self.local.stack = AsyncExitStack()
+            client = self.local.client = await self.local.stack.enter_async_context(
+                self.client_factory()
+            )
+        return client
+
+
+def _aiobotocore_client() -> Any:
+    try:
+        from aiobotocore.session import get_session
+    except ImportError as e:
+        raise ImportError(
+            'CHECKPOINT_BLOB_STORE="s3" requires aiobotocore to be installed'
+        ) from e
+    return get_session().create_client(
+        "s3", endpoint_url=CHECKPOINT_BLOB_STORE_S3_ENDPOINT_URL
+    )
+
+
+def _create_blob_store() -> BlobStore:
+    if CHECKPOINT_BLOB_STORE == "s3":
+        if CHECKPOINT_BLOB_STORE_MIN_BYTES > 0 and not CHECKPOINT_BLOB_STORE_S3_BUCKET:
+            raise ValueError(
+                'CHECKPOINT_BLOB_STORE="s3" requires CHECKPOINT_BLOB_STORE_S3_BUCKET'
+            )
+        return S3BlobStore(
+            CHECKPOINT_BLOB_STORE_S3_BUCKET, CHECKPOINT_BLOB_STORE_S3_PREFIX
+        )
+    return FileBlobStore(CHECKPOINT_BLOB_STORE_PATH)
+
+
+BLOB_STORE = _create_blob_store()
+
+__all__ = ["BLOB_STORE", "BlobStore", "FileBlobStore", "S3BlobStore"]
@@ -0,0 +1,485 @@
+"""Broker for worker wakeups, run control, run leases and run streams.
+
+Backed by Redis by default. With BROKER_BACKEND=inmem everything stays in this
+process, on top of the in-memory StreamManager, which suits single-process
+deployments and running the queue without outside services."""
+
+import asyncio
+import time
+from collections.abc import Sequence
+from contextlib import AbstractAsyncContextManager, suppress
+from types import TracebackType
+from typing import Any, Protocol, Self
+from uuid import UUID
+
+import coredis.exceptions
+import structlog
+from coredis.recipes.locks import LuaLock
+
+from api.config import BROKER_BACKEND
+from api.utils.config import run_in_executor
+from api.utils.stream_codec import STREAM_CODEC
+from storage.inmem_stream import (
+    THREADLESS_KEY,
+    ContextQueue,
+    Message,
+    StreamId,
+    StreamManager,
+    _ensure_uuid,
+    _parse_stream_id,
+    get_stream_manager,
+    start_stream,
+    stop_stream,
+    stream_stats,
+)
+from storage.redis import (
+    CHANNEL_RUN_CONTROL,
+    CHANNEL_RUN_STREAM,
+    LIST_RUN_QUEUE,
+    LOCK_RUN_SWEEP,
+    STRING_RUN_ATTEMPT,
+    STRING_RUN_CONTROL,
+    STRING_RUN_RUNNING,
+    get_pubsub,
+    get_redis,
+    get_redis_noretry,
+    publish,
+    redis_stats,
+    run_stream_channel,
+    start_redis,
+    stop_redis,
+    subscribe_run,
+)
+
+logger = structlog.stdlib.get_logger(__name__)
+
+PubSubMessage = dict[str, Any]
+
+# how long a control message is kept for runs that have yet to start listening
+CONTROL_TTL_SECS = 60
+# how long the attempt counter of a run is kept after it was last acquired
+ATTEMPT_TTL_SECS = 60
+
+
+class Subscriber(Protocol):
+    """Subscription to run streams and control channels.
+    Messages are pubsub-style dicts, with "type", "channel" and "data" keys."""
+
+    async def subscribe_run(
+        self, run_id: UUID, stream_mode: str | None = None
+    ) -> None: ...
+
+    async def subscribe_control(self, run_id: UUID) -> None: ...
+
+    async def get_message(
+        self, ignore_subscribe_messages: bool = False, timeout: float | None = None
+    ) -> PubSubMessage | None: ...
+
+    async def listen(self) -> PubSubMessage | None: ...
+
+    async def replay(self, run_id: UUID, last_event_id: str) -> list[PubSubMessage]:
+        """Get the buffered messages of a subscribed run after `last_event_id`.
+        They are not delivered again by `get_message`."""
+        ...
+
+    def close(self) -> None: ...
+
+    async def __aenter__(self) -> Self: ...
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> bool | None: ...
+
+
+class Broker(Protocol):
+    async def start(self) -> None: ...
+
+    async def stop(self) -> None: ...
+
+    async def ping(self) -> None: ...
+
+    def stats(self) -> dict[str, Any]: ...
+
+    async def wake_up_worker(self) -> None:
+        """Signal that a run is available, waking up one waiting worker."""
+        ...
+
+    async def wait_for_wakeup(self, timeout: float) -> bool:
+        """Wait for a wakeup, or the timeout. False if the broker is unreachable."""
+        ...
+
+    async def acquire_lease(self, run_id: UUID, ttl: float) -> int:
+        """Lease a run to this worker, returning the attempt number."""
+        ...
+
+    async def renew_lease(self, run_id: UUID, ttl: float) -> None: ...
+
+    async def has_leases(self, run_ids: Sequence[UUID]) -> list[bool]: ...
+
+    def sweep_lock(self) -> AbstractAsyncContextManager:
+        """Lock held while sweeping runs whose lease expired."""
+        ...
+
+    async def send_control(
+        self, run_ids: Sequence[UUID], action: str, *, persist: bool = True
+    ) -> None:
+        """Publish a control message to runs. Persisted ones are also seen by
+        runs that only start listening later (see `get_control`)."""
+        ...
+
+    async def get_control(self, run_id: UUID) -> bytes | None: ...
+
+    def subscriber(self) -> Subscriber: ...
+
+    async def publish(
+        self, run_id: UUID, event: str, message: bytes, *, resumable: bool = False
+    ) -> None:
+        """Publish a frame to a run's stream."""
+        ...
+
+
+# redis
+
+
+class RedisSubscriber:
+    def __init__(self) -> None:
+        self.pubsub = get_pubsub()
+
+    async def subscribe_run(self, run_id: UUID, stream_mode: str | None = None) -> None:
+        await subscribe_run(self.pubsub, run_id, stream_mode)
+
+    async def subscribe_control(self, run_id: UUID) -> None:
+        await self.pubsub.subscribe(CHANNEL_RUN_CONTROL.format(run_id))
+
+    async def get_message(
+        self, ignore_subscribe_messages: bool = False, timeout: float | None = None
+    ) -> PubSubMessage | None:
+        return await self.pubsub.get_message(ignore_subscribe_messages, timeout=timeout)
+
+    async def listen(self) -> PubSubMessage | None:
+        return await self.pubsub.listen()
+
+    async def replay(self, run_id: UUID, last_event_id: str) -> list[PubSubMessage]:
+        # run streams aren't buffered in Redis
+        return []
+
+    def close(self) -> None:
+        self.pubsub.close()
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> bool | None:
+        self.close()
+
+
+class RedisBroker:
+    async def start(self) -> None:
+        await start_redis()
+
+    async def stop(self) -> None:
+        await stop_redis()
+
+    async def ping(self) -> None:
+        await get_redis().ping()
+
+    def stats(self) -> dict[str, Any]:
+        return {"redis": redis_stats()}
+
+    async def wake_up_worker(self) -> None:
+        await get_redis().lpush(LIST_RUN_QUEUE, [1])
+
+    async def wait_for_wakeup(self, timeout: float) -> bool:
+        try:
+            await get_redis_noretry().blpop([LIST_RUN_QUEUE], timeout=timeout)
+        except coredis.exceptions.ConnectionError:
+            return False
+        return True
+
+    async def acquire_lease(self, run_id: UUID, ttl: float) -> int:
+        # the run's keys share a hash tag, so this is one round trip in cluster mode
+        async with await get_redis().pipeline() as pipe:
+            await pipe.set(STRING_RUN_RUNNING.format(run_id), "1", ex=int(ttl))
+            await pipe.incrby(STRING_RUN_ATTEMPT.format(run_id), 1)
+            await pipe.expire(STRING_RUN_ATTEMPT.format(run_id), ATTEMPT_TTL_SECS)
+            _, attempt, _ = await pipe.execute()
+        return attempt
+
+    async def renew_lease(self, run_id: UUID, ttl: float) -> None:
+        await get_redis().set(STRING_RUN_RUNNING.format(run_id), "1", ex=int(ttl))
+
+    async def has_leases(self, run_ids: Sequence[UUID]) -> list[bool]:
+        exists = await get_redis().mget(
+            [STRING_RUN_RUNNING.format(run_id) for run_id in run_ids]
+        )
+        return [value is not None for value in exists]
+
+    def sweep_lock(self) -> AbstractAsyncContextManager:
+        return LuaLock(get_redis_noretry(), LOCK_RUN_SWEEP, timeout=30.0)
+
+    async def send_control(
+        self, run_ids: Sequence[UUID], action: str, *, persist: bool = True
+    ) -> None:
+        if not persist and len(run_ids) == 1:
+            await publish(get_redis(), CHANNEL_RUN_CONTROL.format(run_ids[0]), action)
+            return
+        async with await get_redis().pipeline() as pipe:
+            for run_id in run_ids:
+                if persist:
+                    await pipe.set(
+                        STRING_RUN_CONTROL.format(run_id), action, ex=CONTROL_TTL_SECS
+                    )
+                await publish(pipe, CHANNEL_RUN_CONTROL.format(run_id), action)
+            await pipe.execute()
+
+    async def get_control(self, run_id: UUID) -> bytes | None:
+        return await get_redis().get(STRING_RUN_CONTROL.format(run_id))
+
+    def subscriber(self) -> RedisSubscriber:
+        return RedisSubscriber()
+
+    async def publish(
+        self, run_id: UUID, event: str, message: bytes, *, resumable: bool = False
+    ) -> None:
+        channel = run_stream_channel(run_id, event)
+        if not STREAM_CODEC.needs_split(message):
+            await publish(get_redis(), channel, message)
+            return
+        # compress and fragment large frames off the event loop
+        frames = await run_in_executor(None, STREAM_CODEC.split, message)
+        redis = get_redis()
+        for frame in frames:
+            await publish(redis, channel, frame)
+
+
+# in-process
+
+
+class InMemSubscriber:
+    """Subscription on the StreamManager. Runs are keyed by run ID alone, as
+    publishers don't always know the thread ID."""
+
+    def __init__(self, manager: StreamManager) -> None:
+        self.manager = manager
+        # one queue for all subscriptions, like a single pubsub connection
+        self.queue = ContextQueue(manager.queue_size, policy=manager.policy)
+        self.run_ids: set[UUID] = set()
+        self.control_run_ids: set[UUID] = set()
+        # exact stream channels to deliver, None for all modes of the run
+        self.stream_modes: dict[UUID, set[bytes] | None] = {}
+        # IDs of replayed messages, which may also have been queued
+        self.replayed: set[bytes] = set()
+        # the stream ID each resumed run's messages were replayed after
+        self.resumed_after: dict[UUID, StreamId] = {}
+
+    async def subscribe_run(self, run_id: UUID, stream_mode: str | None = None) -> None:
+        run_id = _ensure_uuid(run_id)
+        if stream_mode is None:
+            self.stream_modes[run_id] = None
+        elif (modes := self.stream_modes.setdefault(run_id, set())) is not None:
+            modes.add(CHANNEL_RUN_STREAM.format(run_id, stream_mode).encode())
+        if run_id not in self.run_ids:
+            self.run_ids.add(run_id)
+            await self.manager.add_queue(run_id, None, self.queue)
+        await self.subscribe_control(run_id)
+
+    async def subscribe_control(self, run_id: UUID) -> None:
+        run_id = _ensure_uuid(run_id)
+        if run_id not in self.control_run_ids:
+            self.control_run_ids.add(run_id)
+            await self.manager.add_control_queue(run_id, None, self.queue)
+
+    def _to_message(self, message: Message) -> PubSubMessage | None:
+        if not message.is_control:
+            run_id = _run_id_from_topic(message.topic)
+            modes = self.stream_modes.get(run_id)
+            if modes is not None and message.topic not in modes:
+                return None
+            if self.replayed and message.id in self.replayed:
+                self.replayed.discard(message.id)
+                return None
+            if (
+                resumed_after := self.resumed_after.get(run_id)
+            ) is not None and _parse_stream_id(message.id.decode()) <= resumed_after:
+                return None
+        return {
+            "type": "message",
+            "channel": message.topic,
+            "data": message.data,
+            "id": message.id,
+        }
+
+    async def get_message(
+        self, ignore_subscribe_messages: bool = False, timeout: float | None = None
+    ) -> PubSubMessage | None:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            try:
+                message = await asyncio.wait_for(self.queue.get(), remaining)
+            except TimeoutError:
+                return None
+            if (event := self._to_message(message)) is not None:
+                return event
+
+    async def listen(self) -> PubSubMessage | None:
+        return await self.get_message()
+
+    async def replay(self, run_id: UUID, last_event_id: str) -> list[PubSubMessage]:
+        run_id = _ensure_uuid(run_id)
+        events = [
+            event
+            for message in self.manager.restore_messages(run_id, None, last_event_id)
+            if (event := self._to_message(message)) is not None
+        ]
+        self.replayed.update(event["id"] for event in events)
+        if (resumed_after := _parse_stream_id(last_event_id)) is not None:
+            self.resumed_after[run_id] = resumed_after
+        return events
+
+    def close(self) -> None:
+        for run_id in self.run_ids:
+            _discard_queue(self.manager.queues, run_id, self.queue)
+        for run_id in self.control_run_ids:
+            _discard_queue(self.manager.control_queues, run_id, self.queue)
+        self.run_ids.clear()
+        self.control_run_ids.clear()
+        self.replayed.clear()
+        self.resumed_after.clear()
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> bool | None:
+        self.close()
+
+
+def _discard_queue(
+    queues: dict[Any, dict[UUID, list[ContextQueue]]],
+    run_id: UUID,
+    queue: ContextQueue,
+) -> None:
+    by_run = queues.get(THREADLESS_KEY, {})
+    if queue in by_run.get(run_id, ()):
+        by_run[run_id].remove(queue)
+        if not by_run[run_id]:
+            del by_run[run_id]
+
+
+def _run_id_from_topic(topic: bytes) -> UUID | None:
+    # topics are the Redis channel names, with a {run_id} hash tag
+    start = topic.find(b"{")
+    end = topic.find(b"}", start)
+    try:
+        return UUID(topic[start + 1 : end].decode())
+    except ValueError:
+        return None
+
+
+class InMemBroker:
+    def __init__(self) -> None:
+        self.wakeups = asyncio.Semaphore(0)
+        # run_id -> lease expiry
+        self.leases: dict[UUID, float] = {}
+        # run_id -> (attempt, expiry)
+        self.attempts: dict[UUID, tuple[int, float]] = {}
+        # run_id -> (action, expiry)
+        self.control: dict[UUID, tuple[bytes, float]] = {}
+        self.lock = asyncio.Lock()
+
+    @property
+    def manager(self) -> StreamManager:
+        return get_stream_manager()
+
+    async def start(self) -> None:
+        await start_stream()
+
+    async def stop(self) -> None:
+        await stop_stream()
+
+    async def ping(self) -> None:
+        pass
+
+    def stats(self) -> dict[str, Any]:
+        return {"streams": stream_stats()}
+
+    async def wake_up_worker(self) -> None:
+        self.wakeups.release()
+
+    async def wait_for_wakeup(self, timeout: float) -> bool:
+        with suppress(TimeoutError):
+            await asyncio.wait_for(self.wakeups.acquire(), timeout)
+        return True
+
+    def _expire(self, entries: dict[UUID, tuple[Any, float]], now: float) -> None:
+        for run_id in [r for r, (_, expiry) in entries.items() if expiry <= now]:
+            del entries[run_id]
+
+    async def acquire_lease(self, run_id: UUID, ttl: float) -> int:
+        run_id = _ensure_uuid(run_id)
+        now = time.monotonic()
+        self._expire(self.attempts, now)
+        self.leases[run_id] = now + ttl
+        attempt = self.attempts.get(run_id, (0, 0.0))[0] + 1
+        self.attempts[run_id] = (attempt, now + ATTEMPT_TTL_SECS)
+        return attempt
+
+    async def renew_lease(self, run_id: UUID, ttl: float) -> None:
+        self.leases[_ensure_uuid(run_id)] = time.monotonic() + ttl
+
+    async def has_leases(self, run_ids: Sequence[UUID]) -> list[bool]:
+        now = time.monotonic()
+        self.leases = {r: expiry for r, expiry in self.leases.items() if expiry > now}
+        return [_ensure_uuid(run_id) in self.leases for run_id in run_ids]
+
+    def sweep_lock(self) -> AbstractAsyncContextManager:
+        return self.lock
+
+    async def send_control(
+        self, run_ids: Sequence[UUID], action: str, *, persist: bool = True
+    ) -> None:
+        now = time.monotonic()
+        self._expire(self.control, now)
+        data = action.encode()
+        for run_id in map(_ensure_uuid, run_ids):
+            channel = CHANNEL_RUN_CONTROL.format(run_id).encode()
+            await self.manager.put(run_id, None, Message(topic=channel, data=data))
+            # the manager keeps the last control message forever, expire it here
+            self.manager.control_keys.get(THREADLESS_KEY, {}).pop(run_id, None)
+            if persist:
+                self.control[run_id] = (data, now + CONTROL_TTL_SECS)
+
+    async def get_control(self, run_id: UUID) -> bytes | None:
+        action, expiry = self.control.get(_ensure_uuid(run_id), (None, 0.0))
+        return action if expiry > time.monotonic() else None
+
+    def subscriber(self) -> InMemSubscriber:
+        return InMemSubscriber(self.manager)
+
+    async def publish(
+        self, run_id: UUID, event: str, message: bytes, *, resumable: bool = False
+    ) -> None:
+        channel = CHANNEL_RUN_STREAM.format(run_id, event).encode()
+        await self.manager.put(
+            run_id, None, Message(topic=channel, data=message), resumable=resumable
+        )
+
+
+_broker: Broker = InMemBroker() if BROKER_BACKEND == "inmem" else RedisBroker()
+
+
+def get_broker() -> Broker:
+    return _broker
@@ -17,7 +17,10 @@ from psycopg_pool import AsyncConnectionPool
 
 import api.config as config
 from api.serde import Fragment, json_dumpb
-from storage.redis import get_redis, redis_stats, start_redis, stop_redis
+from storage.async_postgres_checkpointer import COMPACTION_STATS
+from storage.blob_cache import BLOB_CACHE
+from storage.broker import get_broker
+from storage.partitioning import PARTITION_STATS, setup_checkpoint_partitions
 
 Row: TypeAlias = dict[str, Any]
 
@@ -35,8 +38,8 @@ async def healthcheck() -> None:
     async with connect() as conn:
         async with conn.transaction():
             await conn.execute("SELECT 1")
-    # check redis
-    await get_redis().ping()
+    # check broker
+    await get_broker().ping()
 
 
 @asynccontextmanager
@@ -44,25 +47,27 @@ async def connect(*, __test__: bool = False) -> AsyncIterator[AsyncConnection[Di
     if __test__:
         async with await create_conn(__test__) as conn:
             yield conn
-    elif threading.current_thread() is not threading.main_thread():
-        # Use thread-local connection pool
-        if not hasattr(_thread_local, "pg_pool"):
-            # Create a new pool for this thread on first use
-            _thread_local.pg_pool = create_pool(__test__=__test__, thread_local=True)
-            await _thread_local.pg_pool.open(wait=True)
-            logger.info(
-                "Created new thread-local Postgres connection pool",
-                thread_name=threading.current_thread().name,
-            )
-
-        # Use the thread-local pool
-        async with _thread_local.pg_pool.connection() as conn:
-            yield conn
     else:
-        async with _pg_pool.connection() as conn:
+        async with (await current_pool()).connection() as conn:
             yield conn
 
 
+async def current_pool() -> AsyncConnectionPool[AsyncConnection[DictRow]]:
+    """Get the pool for the current thread, creating it on first use."""
+    if threading.current_thread() is threading.main_thread():
+        return _pg_pool
+    # Use thread-local connection pool
+    if not hasattr(_thread_local, "pg_pool"):
+        # Create a new pool for this thread on first use
+        _thread_local.pg_pool = create_pool(thread_local=True)
+        await _thread_local.pg_pool.open(wait=True)
+        logger.info(
+            "Created new thread-local Postgres connection pool",
+            thread_name=threading.current_thread().name,
+        )
+    return _thread_local.pg_pool
+
+
 # Define an configure function that sets JSON adapters for each new connection
 async def _configure_connection(conn: AsyncConnection[DictRow]):
     # Register custom JSON dumps/loads on this connection
@@ -214,6 +219,8 @@ async def start_pool() -> None:
     print("3")
     # migrate database
     await migrate()
+    async with connect() as conn:
+        await setup_checkpoint_partitions(conn)
     print("4")
     await migrate_vector_index()
 
@@ -221,8 +228,8 @@ async def start_pool() -> None:
     # start stats loop
     _stats_task = asyncio.create_task(stats_loop())
     print("6")
-    # start redis
-    await start_redis()
+    # start broker
+    await get_broker().start()
 
 
 async def stats_loop() -> None:
@@ -245,15 +252,18 @@ async def stop_pool() -> None:
     # close main pool (thread-local pools are closed when the thread exits)
     await _pg_pool.close()
     _pg_pool = None
-    # stop redis
-    await stop_redis()
+    # stop broker
+    await get_broker().stop()
 
 
-def pool_stats() -> dict[str, dict[str, int]]:
+def pool_stats() -> dict[str, dict[str, Any]]:
     """Get stats for the main Postgres pool"""
     return {
         "postgres": _pg_pool.get_stats(),
-        "redis": redis_stats(),
+        **get_broker().stats(),
+        "checkpoint_blob_cache": BLOB_CACHE.stats(),
+        "checkpoint_compaction": dict(COMPACTION_STATS),
+        "checkpoint_partitions": dict(PARTITION_STATS),
     }
 
 
@@ -268,6 +278,7 @@ __all__ = [
     "start_pool",
     "stop_pool",
     "connect",
+    "current_pool",
     "pool_stats",
     "get_pool",
 ]
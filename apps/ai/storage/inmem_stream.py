@@ -1,24 +1,72 @@
 import asyncio
 import logging
+import sys
 import time
+from bisect import bisect_right
 from collections import defaultdict
 from collections.abc import Iterator
 from dataclasses import dataclass
+from typing import Any, Literal
 from uuid import UUID
 
+from api.config import (
+    RESUMABLE_STREAM_MAX_MESSAGES,
+    RESUMABLE_STREAM_TTL_SECONDS,
+    STREAM_SLOW_CONSUMER_POLICY,
+    STREAM_SUBSCRIBER_QUEUE_SIZE,
+)
+
 logger = logging.getLogger(__name__)
 
+SlowConsumerPolicy = Literal["drop-oldest", "coalesce-values", "disconnect"]
+
+# how often expired replay buffers are swept, at most
+SWEEP_INTERVAL_SECS = 1.0
+
 
 def _ensure_uuid(id: str | UUID) -> UUID:
     return UUID(id) if isinstance(id, str) else id
 
 
-def _generate_ms_seq_id() -> str:
-    """Generate a Redis-like millisecond-sequence ID (e.g., '1234567890123-0')"""
-    # Get current time in milliseconds
-    ms = int(time.time() * 1000)
-    # For simplicity, always use sequence 0 since we're not handling high throughput
-    return f"{ms}-0"
+StreamId = tuple[int, int]
+
+
+class StreamIdGenerator:
+    """Generate Redis-like millisecond-sequence IDs (e.g., '1234567890123-0')
+
+    IDs strictly increase, even for messages in the same millisecond or when
+    the wall clock goes backwards."""
+
+    __slots__ = ("last",)
+
+    def __init__(self) -> None:
+        self.last: StreamId = (0, -1)
+
+    def next(self) -> StreamId:
+        ms = int(time.time() * 1000)
+        last_ms, last_seq = self.last
+        self.last = (ms, 0) if ms > last_ms else (last_ms, last_seq + 1)
+        return self.last
+
+
+def _format_stream_id(stream_id: StreamId) -> bytes:
+    return f"{stream_id[0]}-{stream_id[1]}".encode()
+
+
+def _parse_stream_id(stream_id: str) -> StreamId | None:
+    """Parse a `ms-seq` ID, also accepting `ms` and `ms-*`.
+    Returns None for "-", the start of the stream, and for malformed IDs,
+    which replay the whole stream."""
+    if stream_id == "-":
+        return None
+    ms, _, seq = stream_id.partition("-")
+    try:
+        if seq == "*":
+            return int(ms), sys.maxsize
+        return int(ms), int(seq) if seq else 0
+    except ValueError:
+        logger.warning(f"Replaying the whole stream for malformed ID {stream_id!r}")
+        return None
 
 
 @dataclass
@@ -27,9 +75,47 @@ class Message:
     data: bytes
     id: bytes | None = None
 
+    @property
+    def nbytes(self) -> int:
+        return len(self.topic) + len(self.data) + (len(self.id) if self.id else 0)
+
+    @property
+    def is_control(self) -> bool:
+        return self.topic.endswith(b":control")
+
+    @property
+    def is_values(self) -> bool:
+        """Whether this is a full-state `values` event, which supersedes older ones."""
+        mode = self.topic.rsplit(b":", 1)[-1]
+        return mode.split(b"|", 1)[0] == b"values"
+
+
+class SlowConsumerError(Exception):
+    """Raised when reading from a queue that was disconnected for falling behind."""
+
 
 class ContextQueue(asyncio.Queue):
-    """Queue that supports async context manager protocol"""
+    """Queue that supports async context manager protocol
+
+    Publishing never blocks: once the queue holds `maxsize` messages, the
+    slow consumer policy decides what to do with the new one.
+    - "drop-oldest": discard the oldest queued message
+    - "coalesce-values": replace the last queued `values` message of the same
+      topic (falling back to "drop-oldest" for other events)
+    - "disconnect": drop everything and fail the consumer's next `get()`
+
+    Control messages, such as a run's "done", don't count towards `maxsize`
+    and are never dropped, so a lagging consumer still sees them in order.
+    """
+
+    def __init__(self, maxsize: int = 0, *, policy: SlowConsumerPolicy = "drop-oldest"):
+        super().__init__(maxsize)
+        self.policy = policy
+        self.nbytes = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.disconnected = False
+        self.controls = 0
 
     async def __aenter__(self):
         return self
@@ -41,18 +127,196 @@ class ContextQueue(asyncio.Queue):
         exc_tb: object | None,
     ) -> None:
         # Clear the queue
-        while not self.empty():
-            try:
-                self.get_nowait()
-            except asyncio.QueueEmpty:
-                break
+        self._queue.clear()
+        self.nbytes = 0
+        self.controls = 0
+
+    def _put(self, item: Message) -> None:
+        self._queue.append(item)
+        self.nbytes += item.nbytes
+        self.controls += item.is_control
+
+    def _get(self) -> Message:
+        item = self._queue.popleft()
+        self.nbytes -= item.nbytes
+        self.controls -= item.is_control
+        return item
+
+    def full(self) -> bool:
+        return 0 < self.maxsize <= self.qsize() - self.controls
+
+    async def put(self, item: Message) -> None:
+        self.put_nowait(item)
+
+    def put_nowait(self, item: Message) -> None:
+        if self.disconnected:
+            return
+        if self.full() and not item.is_control:
+            if self.policy == "disconnect":
+                self.disconnect()
+                return
+            if self.policy == "coalesce-values" and self._coalesce(item):
+                return
+            self._drop_oldest()
+        # asyncio.Queue.put_nowait, without its check for a full queue, as
+        # control messages may exceed `maxsize`
+        self._put(item)
+        self._unfinished_tasks += 1
+        self._finished.clear()
+        self._wakeup_next(self._getters)
+
+    def _drop_oldest(self) -> None:
+        """Drop the oldest message other than control messages."""
+        for idx, queued in enumerate(self._queue):
+            if not queued.is_control:
+                del self._queue[idx]
+                self.nbytes -= queued.nbytes
+                self.dropped += 1
+                return
+
+    async def get(self) -> Message:
+        if self.disconnected:
+            raise SlowConsumerError("Stream consumer fell behind and was disconnected")
+        return await super().get()
+
+    def get_nowait(self) -> Message:
+        if self.disconnected:
+            raise SlowConsumerError("Stream consumer fell behind and was disconnected")
+        return super().get_nowait()
+
+    def disconnect(self) -> None:
+        self.disconnected = True
+        self.dropped += len(self._queue)
+        self._queue.clear()
+        self.nbytes = 0
+        self.controls = 0
+        # fail any consumer currently waiting on get()
+        for getter in self._getters:
+            if not getter.done():
+                getter.set_exception(
+                    SlowConsumerError(
+                        "Stream consumer fell behind and was disconnected"
+                    )
+                )
+
+    def _coalesce(self, item: Message) -> bool:
+        if not item.is_values:
+            return False
+        for idx in range(len(self._queue) - 1, -1, -1):
+            queued = self._queue[idx]
+            if queued.topic == item.topic:
+                # move the newer snapshot to the back to keep event order
+                del self._queue[idx]
+                self.nbytes -= queued.nbytes
+                self._put(item)
+                self.coalesced += 1
+                return True
+        return False
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "queued_messages": self.qsize(),
+            "queued_bytes": self.nbytes,
+            "max_messages": self.maxsize,
+            "dropped_messages": self.dropped,
+            "coalesced_messages": self.coalesced,
+            "disconnected": self.disconnected,
+        }
+
+
+class ReplayBuffer:
+    """Ring buffer of a run's resumable messages, indexed by stream ID.
+
+    Also owns the run's stream ID sequence. Holds at most `maxlen` messages and
+    expires `ttl` seconds after the run last published anything."""
+
+    __slots__ = (
+        "ids",
+        "messages",
+        "start",
+        "sequence",
+        "maxlen",
+        "ttl",
+        "nbytes",
+        "evicted",
+        "expires_at",
+    )
+
+    def __init__(self, maxlen: int, ttl: float) -> None:
+        # parallel lists, sorted by ID; entries before `start` are evicted
+        self.ids: list[StreamId] = []
+        self.messages: list[Message] = []
+        self.start = 0
+        self.sequence = StreamIdGenerator()
+        self.maxlen = maxlen
+        self.ttl = ttl
+        self.nbytes = 0
+        self.evicted = 0
+        self.expires_at = time.monotonic() + ttl
+
+    def __len__(self) -> int:
+        return len(self.messages) - self.start
+
+    def __iter__(self) -> Iterator[Message]:
+        return iter(self.messages[self.start :])
+
+    def next_id(self) -> StreamId:
+        self.expires_at = time.monotonic() + self.ttl
+        return self.sequence.next()
+
+    def append(self, stream_id: StreamId, message: Message) -> None:
+        self.ids.append(stream_id)
+        self.messages.append(message)
+        self.nbytes += message.nbytes
+        while len(self) > self.maxlen:
+            self.nbytes -= self.messages[self.start].nbytes
+            self.start += 1
+            self.evicted += 1
+        if self.start >= self.maxlen:
+            # compact, amortized O(1) per evicted message
+            del self.ids[: self.start]
+            del self.messages[: self.start]
+            self.start = 0
+
+    def after(self, stream_id: StreamId | None) -> list[Message]:
+        """Messages with an ID greater than `stream_id`, found by bisection."""
+        if stream_id is None:
+            return self.messages[self.start :]
+        if self.evicted and len(self) and stream_id < self.ids[self.start]:
+            logger.warning(
+                f"Replaying from {stream_id}, but messages up to "
+                f"{self.ids[self.start]} were evicted from the replay buffer"
+            )
+        idx = bisect_right(self.ids, stream_id, lo=self.start)
+        return self.messages[idx:]
+
+    def expired(self, now: float) -> bool:
+        return now >= self.expires_at
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "buffered_messages": len(self),
+            "buffered_bytes": self.nbytes,
+            "evicted_messages": self.evicted,
+        }
 
 
 THREADLESS_KEY = "no-thread"
 
 
 class StreamManager:
-    def __init__(self):
+    def __init__(
+        self,
+        *,
+        queue_size: int = STREAM_SUBSCRIBER_QUEUE_SIZE,
+        policy: SlowConsumerPolicy = STREAM_SLOW_CONSUMER_POLICY,
+        buffer_size: int = RESUMABLE_STREAM_MAX_MESSAGES,
+        buffer_ttl: float = RESUMABLE_STREAM_TTL_SECONDS,
+    ):
+        self.queue_size = queue_size
+        self.policy = policy
+        self.buffer_size = buffer_size
+        self.buffer_ttl = buffer_ttl
         self.queues = defaultdict(
             lambda: defaultdict(list)
         )  # Dict[str, List[asyncio.Queue]]
@@ -60,9 +324,11 @@ class StreamManager:
         self.control_queues = defaultdict(lambda: defaultdict(list))
         self.thread_streams = defaultdict(list)
 
-        self.message_stores = defaultdict(
-            lambda: defaultdict(list[Message])
-        )  # Dict[str, List[Message]]
+        self.message_stores: defaultdict[UUID | str, dict[UUID, ReplayBuffer]] = (
+            defaultdict(dict)
+        )
+        self.thread_sequence = StreamIdGenerator()
+        self._last_sweep = time.monotonic()
 
     def get_queues(
         self, run_id: UUID | str, thread_id: UUID | str | None
@@ -107,21 +373,24 @@ class StreamManager:
         else:
             thread_id = _ensure_uuid(thread_id)
 
-        message.id = _generate_ms_seq_id().encode()
+        if (buffer := self.message_stores[thread_id].get(run_id)) is None:
+            buffer = self.message_stores[thread_id][run_id] = ReplayBuffer(
+                self.buffer_size, self.buffer_ttl
+            )
+        stream_id = buffer.next_id()
+        message.id = _format_stream_id(stream_id)
         # For resumable run streams, embed the generated message ID into the frame
         topic = message.topic.decode()
         if resumable:
-            self.message_stores[thread_id][run_id].append(message)
+            buffer.append(stream_id, message)
         if "control" in topic:
             self.control_keys[thread_id][run_id] = message
-            queues = self.control_queues[thread_id][run_id]
+            queues = self.control_queues.get(thread_id, {}).get(run_id)
         else:
-            queues = self.queues[thread_id][run_id]
-        coros = [queue.put(message) for queue in queues]
-        results = await asyncio.gather(*coros, return_exceptions=True)
-        for result in results:
-            if isinstance(result, Exception):
-                logger.exception(f"Failed to put message in queue: {result}")
+            queues = self.queues.get(thread_id, {}).get(run_id)
+        if queues:
+            self._publish(queues, message)
+        self._maybe_sweep()
 
     async def put_thread(
         self,
@@ -129,19 +398,53 @@ class StreamManager:
         message: Message,
     ) -> None:
         thread_id = _ensure_uuid(thread_id)
-        message.id = _generate_ms_seq_id().encode()
-        queues = self.thread_streams[thread_id]
-        coros = [queue.put(message) for queue in queues]
-        results = await asyncio.gather(*coros, return_exceptions=True)
-        for result in results:
-            if isinstance(result, Exception):
-                logger.exception(f"Failed to put message in queue: {result}")
+        message.id = _format_stream_id(self.thread_sequence.next())
+        if queues := self.thread_streams.get(thread_id):
+            self._publish(queues, message)
+
+    def _publish(self, queues: list[ContextQueue], message: Message) -> None:
+        # Publishing never waits on a subscriber, slow ones are handled by
+        # the queue's slow consumer policy.
+        for queue in queues:
+            try:
+                queue.put_nowait(message)
+            except Exception as exc:
+                logger.exception(f"Failed to put message in queue: {exc}")
+        if any(queue.disconnected for queue in queues):
+            logger.warning(
+                f"Disconnected slow stream consumer on {message.topic.decode()}"
+            )
+            queues[:] = [queue for queue in queues if not queue.disconnected]
+
+    def _maybe_sweep(self) -> None:
+        now = time.monotonic()
+        if now - self._last_sweep >= SWEEP_INTERVAL_SECS:
+            self._last_sweep = now
+            self.sweep_expired(now)
+
+    def sweep_expired(self, now: float | None = None) -> int:
+        """Drop replay buffers whose TTL has elapsed, returning how many were dropped."""
+        now = time.monotonic() if now is None else now
+        dropped = 0
+        for thread_id in list(self.message_stores):
+            buffers = self.message_stores[thread_id]
+            for run_id in [r for r, buffer in buffers.items() if buffer.expired(now)]:
+                del buffers[run_id]
+                dropped += 1
+            if not buffers:
+                del self.message_stores[thread_id]
+        return dropped
 
     async def add_queue(
-        self, run_id: UUID | str, thread_id: UUID | str | None
+        self,
+        run_id: UUID | str,
+        thread_id: UUID | str | None,
+        queue: ContextQueue | None = None,
     ) -> asyncio.Queue:
+        """Subscribe to a run's stream, with a new queue unless one is given."""
         run_id = _ensure_uuid(run_id)
-        queue = ContextQueue()
+        if queue is None:
+            queue = ContextQueue(self.queue_size, policy=self.policy)
         if thread_id is None:
             thread_id = THREADLESS_KEY
         else:
@@ -150,20 +453,26 @@ class StreamManager:
         return queue
 
     async def add_control_queue(
-        self, run_id: UUID | str, thread_id: UUID | str | None
+        self,
+        run_id: UUID | str,
+        thread_id: UUID | str | None,
+        queue: ContextQueue | None = None,
     ) -> asyncio.Queue:
+        """Subscribe to a run's control messages, with a new queue unless one is given."""
         run_id = _ensure_uuid(run_id)
         if thread_id is None:
             thread_id = THREADLESS_KEY
         else:
             thread_id = _ensure_uuid(thread_id)
-        queue = ContextQueue()
+        if queue is None:
+            # control messages are never dropped, whatever the size
+            queue = ContextQueue(self.queue_size, policy="drop-oldest")
         self.control_queues[thread_id][run_id].append(queue)
         return queue
 
     async def add_thread_stream(self, thread_id: UUID | str) -> asyncio.Queue:
         thread_id = _ensure_uuid(thread_id)
-        queue = ContextQueue()
+        queue = ContextQueue(self.queue_size, policy=self.policy)
         self.thread_streams[thread_id].append(queue)
         return queue
 
@@ -176,7 +485,9 @@ class StreamManager:
         else:
             thread_id = _ensure_uuid(thread_id)
         if thread_id in self.queues and run_id in self.queues[thread_id]:
-            self.queues[thread_id][run_id].remove(queue)
+            # slow consumers may already have been disconnected and removed
+            if queue in self.queues[thread_id][run_id]:
+                self.queues[thread_id][run_id].remove(queue)
             if not self.queues[thread_id][run_id]:
                 del self.queues[thread_id][run_id]
 
@@ -192,7 +503,8 @@ class StreamManager:
             thread_id in self.control_queues
             and run_id in self.control_queues[thread_id]
         ):
-            self.control_queues[thread_id][run_id].remove(queue)
+            if queue in self.control_queues[thread_id][run_id]:
+                self.control_queues[thread_id][run_id].remove(queue)
             if not self.control_queues[thread_id][run_id]:
                 del self.control_queues[thread_id][run_id]
 
@@ -207,17 +519,11 @@ class StreamManager:
             thread_id = _ensure_uuid(thread_id)
         if message_id is None:
             return
-        try:
-            # Handle ms-seq format (e.g., "1234567890123-0")
-            if thread_id in self.message_stores:
-                for message in self.message_stores[thread_id][run_id]:
-                    if message.id.decode() > message_id:
-                        yield message
-        except TypeError:
-            # Try integer format if ms-seq fails
-            message_idx = int(message_id) + 1
-            if run_id in self.message_stores:
-                yield from self.message_stores[thread_id][run_id][message_idx:]
+        buffer = self.message_stores.get(thread_id, {}).get(run_id)
+        if buffer is None:
+            return
+        # Handle ms-seq format (e.g., "1234567890123-0")
+        yield from buffer.after(_parse_stream_id(message_id))
 
     def get_queues_by_thread_id(self, thread_id: UUID | str) -> list[asyncio.Queue]:
         """Get all queues for a specific thread_id across all runs."""
@@ -230,6 +536,38 @@ class StreamManager:
 
         return all_queues
 
+    def stats(self) -> dict[str, Any]:
+        """Memory usage of subscriber queues and replay buffers, per run."""
+        runs: dict[tuple[UUID | str, UUID], dict[str, Any]] = {}
+
+        def run_stats(thread_id: UUID | str, run_id: UUID) -> dict[str, Any]:
+            if (key := (thread_id, run_id)) not in runs:
+                runs[key] = {
+                    "thread_id": str(thread_id),
+                    "run_id": str(run_id),
+                    "subscribers": [],
+                    "buffered_messages": 0,
+                    "buffered_bytes": 0,
+                    "evicted_messages": 0,
+                }
+            return runs[key]
+
+        for thread_id, by_run in self.queues.items():
+            for run_id, queues in by_run.items():
+                run_stats(thread_id, run_id)["subscribers"].extend(
+                    queue.stats() for queue in queues
+                )
+        for thread_id, buffers in self.message_stores.items():
+            for run_id, buffer in buffers.items():
+                run_stats(thread_id, run_id).update(buffer.stats())
+        for entry in runs.values():
+            entry["queued_bytes"] = sum(s["queued_bytes"] for s in entry["subscribers"])
+        return {
+            "queued_bytes": sum(entry["queued_bytes"] for entry in runs.values()),
+            "buffered_bytes": sum(entry["buffered_bytes"] for entry in runs.values()),
+            "runs": list(runs.values()),
+        }
+
 
 # Global instance
 stream_manager = StreamManager()
@@ -267,3 +605,8 @@ async def stop_stream() -> None:
 def get_stream_manager() -> StreamManager:
     """Get the global stream manager instance."""
     return stream_manager
+
+
+def stream_stats() -> dict[str, Any]:
+    """Get memory usage stats for the global stream manager."""
+    return stream_manager.stats()
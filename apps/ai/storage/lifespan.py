@@ -57,6 +57,10 @@ async def lifespan(
             else:
                 await logger.ainfo("Using custom store. Skipping store TTL sweeper.")
             tg.create_task(thread_ttl.thread_ttl_sweep_loop())
+            if config.CHECKPOINT_RETENTION_KEEP_LATEST > 0:
+                tg.create_task(thread_ttl.checkpoint_compaction_loop())
+            if config.CHECKPOINT_PARTITIONING == "time":
+                tg.create_task(thread_ttl.checkpoint_partition_loop())
 
             if feature_flags.USE_RUNTIME_CONTEXT_API:
                 from langgraph._internal._constants import CONFIG_KEY_RUNTIME
@@ -0,0 +1,4 @@
+-- Content of at least CHECKPOINT_BLOB_STORE_MIN_BYTES lives in the external
+-- blob store under "location", and "blob" is NULL.
+ALTER TABLE checkpoint_blob_content ALTER COLUMN "blob" DROP NOT NULL;
+ALTER TABLE checkpoint_blob_content ADD COLUMN IF NOT EXISTS "location" text NULL;
@@ -0,0 +1,15 @@
+-- A forked thread reads the checkpoints, writes and blobs of its parent
+-- thread with checkpoint_id < "fork_checkpoint_id" as its own, and stores its
+-- own copy of the fork checkpoint. The parent can't be deleted while forks
+-- reference it: their inherited rows are copied into them first.
+CREATE TABLE IF NOT EXISTS thread_fork (
+	thread_id uuid NOT NULL,
+	parent_thread_id uuid NOT NULL,
+	fork_checkpoint_id uuid NOT NULL,
+	created_at timestamptz DEFAULT now() NOT NULL,
+	CONSTRAINT thread_fork_pkey PRIMARY KEY (thread_id),
+	CONSTRAINT thread_fork_thread_id_fkey FOREIGN KEY (thread_id) REFERENCES thread(thread_id) ON DELETE CASCADE,
+	CONSTRAINT thread_fork_parent_thread_id_fkey FOREIGN KEY (parent_thread_id) REFERENCES thread(thread_id)
+);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS thread_fork_parent_thread_id_idx ON thread_fork USING btree (parent_thread_id);
@@ -1,25 +1,22 @@
 import asyncio
 import json
 import logging
+from collections import deque
 from collections.abc import AsyncIterator, Callable, Sequence
 from contextlib import AsyncExitStack, asynccontextmanager
 from datetime import UTC, datetime
 from typing import TYPE_CHECKING, Any, AsyncContextManager, Literal, cast  # noqa: UP035
 from uuid import UUID, uuid4
 
-import coredis
-import coredis.commands
-import coredis.exceptions
-import coredis.pool
 import orjson  # Make sure this is already imported
 import psycopg.errors
 import structlog
-from coredis.recipes.locks import LuaLock
 from croniter import croniter
 from langgraph.checkpoint.base.id import uuid6
+from langgraph.errors import InvalidUpdateError
 from langgraph.pregel.debug import CheckpointPayload
 from langgraph.pregel.types import StateSnapshot
-from langgraph.types import Interrupt
+from langgraph.types import Interrupt, StateUpdate
 from langgraph_sdk import Auth
 from psycopg import AsyncConnection
 from psycopg.rows import DictRow
@@ -29,7 +26,14 @@ from starlette.exceptions import HTTPException
 from api import __version__
 from api.asyncio import SimpleTaskGroup, ValueEvent, create_task
 from api.auth.custom import handle_event
-from api.config import BG_JOB_HEARTBEAT, BG_JOB_INTERVAL
+from api.command import map_cmd
+from api.config import (
+    BG_JOB_HEARTBEAT,
+    BG_JOB_INTERVAL,
+    THREAD_SEARCH_DEFAULT_FIELDS,
+    THREAD_TTL,
+    THREAD_TTL_SWEEP_BATCH_SIZE,
+)
 from api.errors import UserInterrupt, UserRollback
 from api.graph import (
     GRAPHS,
@@ -39,6 +43,13 @@ from api.graph import (
     graph_exists,
 )
 from api.schema import (
+    ASSISTANT_FIELDS,
+    ASSISTANT_JSON_FIELDS,
+    CRON_FIELDS,
+    CRON_JSON_FIELDS,
+    THREAD_FIELDS,
+    THREAD_JSON_FIELDS,
+    THREAD_LIST_FIELDS,
     Assistant,
     Checkpoint,
     Config,
@@ -49,11 +60,14 @@ from api.schema import (
     MetadataValue,
     MultitaskStrategy,
     OnConflictBehavior,
+    Page,
     QueueStats,
     Run,
     RunStatus,
+    SearchCount,
     StreamMode,
     Thread,
+    ThreadState,
     ThreadStatus,
     ThreadUpdateResponse,
 )
@@ -63,24 +77,21 @@ from api.schema import (
 from api.serde import Fragment, ajson_loads
 from api.state import state_snapshot_to_thread_state
 from api.utils import fetchone, get_auth_ctx, next_cron_date
-from api.utils.stream_codec import decode_stream_message
+from api.utils.stream_codec import FragmentBuffer, decode_stream_message
 
 # from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
 from storage.async_postgres_checkpointer import (
     AsyncPostgresCheckpointer as AsyncPostgresSaver,
 )
+from storage.async_postgres_checkpointer import BulkCheckpointer, detach_forks
+from storage.broker import Subscriber, get_broker
 from storage.database import connect
+from storage.inmem_stream import SlowConsumerError
+from storage.pagination import search_page
 from storage.redis import (
     CHANNEL_RUN_CONTROL,
     CHANNEL_RUN_STREAM,
-    LIST_RUN_QUEUE,
-    LOCK_RUN_SWEEP,
-    STRING_RUN_ATTEMPT,
-    STRING_RUN_CONTROL,
-    STRING_RUN_RUNNING,
-    get_pubsub,
-    get_redis,
-    get_redis_noretry,
+    SHARDED_PUBSUB,
 )
 
 if TYPE_CHECKING:
@@ -88,7 +99,7 @@ if TYPE_CHECKING:
 
 logger = structlog.stdlib.get_logger(__name__)
 
-StreamHandler = coredis.commands.pubsub.BasePubSub[bytes, coredis.pool.ConnectionPool]
+StreamHandler = Subscriber
 
 WAIT_TIMEOUT = 5  # seconds, set to DRAIN_TIMEOUT when switching to "drain" state
 DRAIN_TIMEOUT = 0.01  # drain queue, but don't wait for more
@@ -141,8 +152,10 @@ class Assistants(Authenticated):
         sort_by: str | None = None,
         sort_order: str | None = None,
         select: list[str] | None = None,
+        cursor: str | None = None,
+        count: SearchCount = "exact",
         ctx: Auth.types.BaseAuthContext | None = None,
-    ) -> tuple[AsyncIterator[Assistant], int]:
+    ) -> tuple[AsyncIterator[Assistant], Page]:
         metadata = metadata if metadata is not None else {}
         filters = await Assistants.handle_event(
             ctx,
@@ -152,69 +165,52 @@ class Assistants(Authenticated):
             ),
         )
 
-        # Build select clause
-        select_clause = "*"
-        if select:
-            # Sanitize select columns to prevent SQL injection
-            select_clause = ", ".join(select)
-
-        # Build base query for counting total
-        count_query = """SELECT COUNT(*) FROM assistant
-        WHERE graph_id = ANY(%(graph_ids)s) AND metadata @> %(metadata)s"""
-        query = f"""SELECT {select_clause} FROM assistant
-        WHERE graph_id = ANY(%(graph_ids)s) AND metadata @> %(metadata)s"""
+        conditions = [
+            "assistant.graph_id = ANY(%(graph_ids)s)",
+            "assistant.metadata @> %(metadata)s",
+        ]
         params = {"graph_ids": list(GRAPHS.keys()), "metadata": Jsonb(metadata)}
 
         if graph_id:
             assert_graph_exists(graph_id)
-            query += " AND graph_id = %(graph_id)s"
-            count_query += " AND graph_id = %(graph_id)s"
+            conditions.append("assistant.graph_id = %(graph_id)s")
             params["graph_id"] = graph_id
 
         filter_clause, filter_params = _build_filter_query(
             filters=filters,
             table_alias="assistant",
+            prefix="",
         )
         if filter_params:
-            query += filter_clause
-            count_query += filter_clause
+            conditions.append(filter_clause)
             params.update(filter_params)
 
-        # Add sorting
-        if sort_by:
-            # Validate sort_by to prevent SQL injection
-            valid_sort_fields = [
-                "assistant_id",
-                "graph_id",
-                "name",
-                "created_at",
-                "updated_at",
-            ]
-            if sort_by in valid_sort_fields:
-                sort_direction = "ASC" if sort_order == "asc" else "DESC"
-                query += f" ORDER BY {sort_by} {sort_direction}"
-            else:
-                query += " ORDER BY created_at DESC"
-        else:
-            query += " ORDER BY created_at DESC"
-
-        query += " LIMIT %(limit)s OFFSET %(offset)s"
-        params["limit"] = limit
-        params["offset"] = offset
-
-        # Execute both queries
-        async with conn.pipeline():
-            cur = await conn.execute(query, params, binary=True)
-            count_cur = await conn.execute(
-                count_query,
-                {k: v for k, v in params.items() if k not in ["limit", "offset"]},
-                binary=True,
-            )
-
-        total = await count_cur.fetchone()
-        total_count = total["count"] if total else 0
-
-        return (row async for row in cur), total_count
+        # Validate sort_by to prevent SQL injection
+        valid_sort_fields = [
+            "assistant_id",
+            "graph_id",
+            "name",
+            "created_at",
+            "updated_at",
+        ]
+        return await search_page(
+            conn,
+            table="assistant",
+            from_clause="assistant",
+            conditions=conditions,
+            params=params,
+            select=select,
+            fields=ASSISTANT_FIELDS,
+            json_fields=ASSISTANT_JSON_FIELDS,
+            id_column="assistant_id",
+            sort_by=sort_by if sort_by in valid_sort_fields else "created_at",
+            sort_order=sort_order,
+            nullable=("name",),
+            limit=limit,
+            offset=offset,
+            cursor=cursor,
+            count=count,
+        )
 
     @staticmethod
     async def count(
@@ -617,8 +613,10 @@ class Threads(Authenticated):
         sort_by: str | None = None,
         sort_order: str | None = None,
         select: list[str] | None = None,
+        cursor: str | None = None,
+        count: SearchCount = "exact",
         ctx: Auth.types.BaseAuthContext | None = None,
-    ) -> tuple[AsyncIterator[Thread], int]:
+    ) -> tuple[AsyncIterator[Thread], Page]:
         metadata = metadata if metadata is not None else {}
         values = values if values is not None else {}
         filters = await Threads.handle_event(
@@ -638,68 +636,49 @@ class Threads(Authenticated):
             prefix="",
         )
 
-        # Build select clause
-        select_clause = "*"
-        if select:
-            # Sanitize select columns to prevent SQL injection
-            select_clause = ", ".join(select)
-
-        # Build base query for counting total
-        count_query = "SELECT COUNT(*) FROM thread"
-        query = f"SELECT {select_clause} FROM thread"
-        params = {"limit": limit, "offset": offset}
+        params = {}
         where_clauses = []
 
         if ids:
             # Convert string UUIDs to UUID objects
             uuid_ids = [UUID(id_str) for id_str in ids]
-            where_clauses.append("thread_id = ANY(%(ids)s)")
+            where_clauses.append("thread.thread_id = ANY(%(ids)s)")
             params["ids"] = uuid_ids
         if metadata:
-            where_clauses.append("metadata @> %(metadata)s")
+            where_clauses.append("thread.metadata @> %(metadata)s")
             params["metadata"] = Jsonb(metadata)
         if values:
-            where_clauses.append("values @> %(values)s")
+            where_clauses.append("thread.values @> %(values)s")
             params["values"] = Jsonb(values)
         if status:
-            where_clauses.append("status = %(status)s")
+            where_clauses.append("thread.status = %(status)s")
             params["status"] = status
         if filter_params:
             where_clauses.append(filter_clause)
             params.update(filter_params)
 
-        if where_clauses:
-            where_clause = " WHERE " + " AND ".join(where_clauses)
-            query += where_clause
-            count_query += where_clause
-
-        # Add sorting
-        if sort_by:
-            # Validate sort_by to prevent SQL injection
-            valid_sort_fields = ["thread_id", "status", "created_at", "updated_at"]
-            if sort_by in valid_sort_fields:
-                sort_direction = "ASC" if sort_order == "asc" else "DESC"
-                query += f" ORDER BY {sort_by} {sort_direction}"
-            else:
-                query += " ORDER BY created_at DESC"
-        else:
-            query += " ORDER BY created_at DESC"
-
-        query += " LIMIT %(limit)s OFFSET %(offset)s"
-
-        # Execute both queries
-        async with conn.pipeline():
-            cur = await conn.execute(query, params, binary=True)
-            count_cur = await conn.execute(
-                count_query,
-                {k: v for k, v in params.items() if k not in ["limit", "offset"]},
-                binary=True,
-            )
-
-        total = await count_cur.fetchone()
-        total_count = total["count"] if total else 0
-
-        return (row async for row in cur), total_count
+        if not select and THREAD_SEARCH_DEFAULT_FIELDS == "light":
+            select = THREAD_LIST_FIELDS
+
+        # Validate sort_by to prevent SQL injection
+        valid_sort_fields = ["thread_id", "status", "created_at", "updated_at"]
+        return await search_page(
+            conn,
+            table="thread",
+            from_clause="thread",
+            conditions=where_clauses,
+            params=params,
+            select=select,
+            fields=THREAD_FIELDS,
+            json_fields=THREAD_JSON_FIELDS,
+            id_column="thread_id",
+            sort_by=sort_by if sort_by in valid_sort_fields else "created_at",
+            sort_order=sort_order,
+            limit=limit,
+            offset=offset,
+            cursor=cursor,
+            count=count,
+        )
 
     @staticmethod
     async def count(
@@ -799,8 +778,6 @@ class Threads(Authenticated):
         ctx: Auth.types.BaseAuthContext | None = None,
     ) -> AsyncIterator[Thread]:
         """Insert or update a thread."""
-        # TODO: Implement TTL support once database schema supports TTL columns
-        # For now, we accept the ttl parameter but don't use it
         metadata = metadata if metadata is not None else {}
         filters = await Threads.handle_event(
             ctx,
@@ -811,8 +788,13 @@ class Threads(Authenticated):
         )
 
         query = """WITH inserted_thread as (
-            INSERT INTO thread (thread_id, metadata)
-            values (%(thread_id)s, %(metadata)s)
+            INSERT INTO thread (thread_id, metadata, ttl_minutes, expires_at)
+            values (
+                %(thread_id)s,
+                %(metadata)s,
+                %(ttl_minutes)s::double precision,
+                now() + %(ttl_minutes)s::double precision * interval '1 minute'
+            )
             ON CONFLICT (thread_id) DO NOTHING
             RETURNING *
         )
@@ -821,6 +803,7 @@ class Threads(Authenticated):
         params = {
             "thread_id": thread_id,
             "metadata": Jsonb(metadata),
+            "ttl_minutes": _ttl_minutes(ttl, default=True),
         }
         if if_exists == "do_nothing":
             # return the row if it already exists
@@ -854,8 +837,6 @@ class Threads(Authenticated):
         ttl: dict | None = None,
         ctx: Auth.types.BaseAuthContext | None = None,
     ) -> AsyncIterator[Thread]:
-        # TODO: Implement TTL support once database schema supports TTL columns
-        # For now, we accept the ttl parameter but don't use it
         metadata = metadata if metadata is not None else {}
         filters = await Threads.handle_event(
             ctx,
@@ -870,10 +851,16 @@ class Threads(Authenticated):
         if filter_params:
             params.update(filter_params)
             where_clause += filter_clause
+        set_ttl = ""
+        if ttl is not None:
+            params["ttl_minutes"] = _ttl_minutes(ttl)
+            set_ttl = """,
+            ttl_minutes = %(ttl_minutes)s::double precision,
+            expires_at = now() + %(ttl_minutes)s::double precision * interval '1 minute'"""
 
         cur = await conn.execute(
             f"""update thread
-            set metadata = metadata || %(metadata)s
+            set metadata = metadata || %(metadata)s{set_ttl}
             {where_clause}
             returning *;""",
             params,
@@ -909,6 +896,7 @@ class Threads(Authenticated):
         async with await conn.execute(
             """update thread set
             updated_at = now(),
+            expires_at = now() + ttl_minutes * interval '1 minute',
             values = %(values)s,
             interrupts = %(interrupts)s,
             status = case
@@ -999,6 +987,7 @@ class Threads(Authenticated):
             await conn.execute(
                 """UPDATE thread SET
                 updated_at = now(),
+                expires_at = now() + ttl_minutes * interval '1 minute',
                 values = %(values)s,
                 interrupts = %(interrupts)s,
                 metadata = metadata || %(graph_metadata)s,
@@ -1041,6 +1030,13 @@ class Threads(Authenticated):
             table_alias="thread",
         )
         params = {"thread_id": thread_id, **filter_params}
+        # forks of the thread first get a copy of what they inherit from it
+        cur = await conn.execute(
+            f"SELECT thread_id FROM thread WHERE thread_id = %(thread_id)s{filter_clause} FOR UPDATE",
+            params,
+        )
+        if thread_ids := [row["thread_id"] for row in await cur.fetchall()]:
+            await detach_forks(conn, thread_ids)
         cur = await conn.execute(
             f"DELETE FROM thread WHERE thread_id = %(thread_id)s{filter_clause} RETURNING thread_id",
             params,
@@ -1054,7 +1050,13 @@ class Threads(Authenticated):
         thread_id: UUID,
         ctx: Auth.types.BaseAuthContext | None = None,
     ) -> AsyncIterator[Thread]:
-        """Create a copy of an existing thread."""
+        """Create a copy of an existing thread.
+
+        The copy is a fork: it gets its own copy of the latest checkpoint and
+        its writes, and reads the earlier checkpoints, writes and blob
+        versions of the thread through thread_fork, so copying doesn't grow
+        with the thread's history.
+        """
         filters = await Threads.handle_event(
             ctx,
             "read",
@@ -1077,73 +1079,210 @@ class Threads(Authenticated):
 
         async with conn.pipeline():
             cur = await conn.execute(
-                f"""INSERT INTO thread (thread_id, metadata)
-                SELECT %(new_thread_id)s, metadata
+                f"""INSERT INTO thread (thread_id, metadata, ttl_minutes, expires_at)
+                SELECT
+                    %(new_thread_id)s,
+                    metadata,
+                    ttl_minutes,
+                    now() + ttl_minutes * interval '1 minute'
                 FROM thread
                 {where_clause}
+                -- held until the fork is committed, see compact_checkpoints
+                FOR SHARE
                 ON CONFLICT (thread_id) DO NOTHING
                 RETURNING *""",
                 query_thread_params,
             )
-            # then, copy all of the checkpoint data in parallel
-            await asyncio.gather(
-                conn.execute(
-                    f"""
+            # then, fork from the latest checkpoint, which the thread always
+            # stores itself, even when it is a fork too. The copy has no run,
+            # so deleting the thread's runs doesn't delete it.
+            await conn.execute(
+                f"""
+                WITH fork AS (
+                    SELECT
+                        checkpoints.checkpoint_id,
+                        checkpoints.parent_checkpoint_id,
+                        checkpoints.checkpoint,
+                        checkpoints.metadata
+                    FROM checkpoints
+                    {thread_join}
+                    {where_clause}
+                        AND checkpoint_ns = ''
+                    ORDER BY checkpoint_id DESC
+                    LIMIT 1
+                ), fork_checkpoint AS (
                     INSERT INTO checkpoints (run_id, thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, checkpoint, metadata)
-                    SELECT run_id, %(new_thread_id)s, checkpoint_ns, checkpoint_id, parent_checkpoint_id, checkpoint, jsonb_set(
-                        checkpoints.metadata,
+                    SELECT NULL, %(new_thread_id)s, '', checkpoint_id, parent_checkpoint_id, checkpoint, jsonb_set(
+                        fork.metadata,
                         '{{thread_id}}',
                         to_jsonb(%(new_thread_id)s)
                     )
-                    FROM checkpoints
-                    {thread_join}
-                    {where_clause}
-                    ON CONFLICT DO NOTHING
-                    """,
-                    query_thread_params,
-                ),
-                conn.execute(
-                    f"""
-                    INSERT INTO checkpoint_blobs (thread_id, checkpoint_ns, channel, version, type, blob)
-                    SELECT %(new_thread_id)s, checkpoint_ns, channel, version, type, blob
-                    FROM checkpoint_blobs
-                    {thread_join}
-                    {where_clause}
-                    ON CONFLICT DO NOTHING
-                    """,
-                    query_thread_params,
-                ),
-                conn.execute(
-                    f"""
-                    INSERT INTO checkpoint_writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, blob)
-                    SELECT %(new_thread_id)s, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, blob
-                    FROM checkpoint_writes
-                    {thread_join}
-                    {where_clause}
-                    ON CONFLICT DO NOTHING
-                    """,
-                    query_thread_params,
-                ),
+                    FROM fork
+                ), fork_writes AS (
+                    INSERT INTO checkpoint_writes (thread_id, checkpoint_ns, checkpoint_id, task_id, task_path, idx, channel, type, blob)
+                    SELECT %(new_thread_id)s, '', cw.checkpoint_id, cw.task_id, cw.task_path, cw.idx, cw.channel, cw.type, cw.blob
+                    FROM fork
+                    INNER JOIN checkpoint_writes cw
+                        ON cw.thread_id = %(thread_id)s
+                        AND cw.checkpoint_ns = ''
+                        AND cw.checkpoint_id = fork.checkpoint_id
+                )
+                INSERT INTO thread_fork (thread_id, parent_thread_id, fork_checkpoint_id)
+                SELECT %(new_thread_id)s, %(thread_id)s, checkpoint_id
+                FROM fork
+                """,
+                query_thread_params,
             )
         return (row async for row in cur)
 
     @staticmethod
     async def sweep_ttl(
         conn: AsyncConnection[DictRow],
+        batch_size: int = THREAD_TTL_SWEEP_BATCH_SIZE,
     ) -> tuple[int, int]:
-        """Sweep threads based on TTL configuration.
+        """Delete threads whose TTL expired, with their checkpoint data.
+
+        Expired threads are claimed `batch_size` at a time with SKIP LOCKED,
+        so concurrent sweepers and writers don't wait on each other, and each
+        batch commits on its own before yielding to the event loop. Threads
+        with pending or running runs are skipped; their next status update
+        pushes the expiry back.
 
         Returns tuple of (threads_processed, threads_deleted).
-        Currently a stub implementation since TTL is not fully implemented.
         """
-        # TODO: Implement TTL sweeping once database schema supports TTL columns
-        # For now, return 0 to indicate no threads were processed or deleted
-        return (0, 0)
+        processed = deleted = 0
+        while True:
+            batch_start = asyncio.get_running_loop().time()
+            async with conn.transaction():
+                cur = await conn.execute(
+                    """select thread_id from thread
+                    where expires_at < now()
+                        and not exists (
+                            select 1 from run
+                            where run.thread_id = thread.thread_id
+                                and run.status in ('pending', 'running')
+                        )
+                    order by expires_at
+                    limit %s
+                    for update skip locked""",
+                    (batch_size,),
+                )
+                thread_ids = [row["thread_id"] for row in await cur.fetchall()]
+                if thread_ids:
+                    await detach_forks(conn, thread_ids)
+                    # delete the checkpoint data explicitly rather than by
+                    # cascade, so each table is cleared with one index scan
+                    for table in (
+                        "checkpoint_writes",
+                        "checkpoint_blobs",
+                        "checkpoints",
+                    ):
+                        await conn.execute(
+                            f"delete from {table} where thread_id = any(%s::uuid[])",
+                            (thread_ids,),
+                        )
+                    cur = await conn.execute(
+                        "delete from thread where thread_id = any(%s::uuid[])",
+                        (thread_ids,),
+                    )
+                    processed += len(thread_ids)
+                    deleted += cur.rowcount
+            if thread_ids:
+                await logger.adebug(
+                    "Swept expired threads",
+                    threads_deleted=cur.rowcount,
+                    duration=asyncio.get_running_loop().time() - batch_start,
+                )
+            if len(thread_ids) < batch_size:
+                return processed, deleted
+            await asyncio.sleep(0)
 
     class State(Authenticated):
         # treat this like threads resource
         resource = "threads"
 
+        @staticmethod
+        async def latest(
+            conn: AsyncConnection[DictRow],
+            thread_id: UUID,
+            ctx: Auth.types.BaseAuthContext | None = None,
+        ) -> ThreadState | None:
+            """Get the latest state of an idle thread from the thread row.
+
+            Runs and state updates leave the final values on the thread, so for
+            an idle thread they match its latest checkpoint and there are no
+            next tasks. Only that checkpoint's id, parent and metadata are read,
+            not its blobs, and the graph isn't built. Returns None when the row
+            may not reflect the latest checkpoint, e.g. while a run is in
+            progress or after an interrupt or error, where the caller should
+            fall back to `get`.
+            """
+            filters = await Threads.handle_event(
+                ctx,
+                "read",
+                Auth.types.ThreadsRead(thread_id=thread_id),
+            )
+            filter_clause, filter_params = _build_filter_query(
+                filters=filters,
+                table_alias="thread",
+            )
+            cur = await conn.execute(
+                f"""select
+                    thread.status,
+                    thread.values,
+                    thread.updated_at >= (latest.checkpoint->>'ts')::timestamptz
+                        as up_to_date,
+                    latest.checkpoint_id,
+                    latest.parent_checkpoint_id,
+                    latest.metadata,
+                    latest.checkpoint->>'ts' as created_at
+                from thread
+                left join lateral (
+                    select checkpoint_id, parent_checkpoint_id, metadata, checkpoint
+                    from checkpoints
+                    where checkpoints.thread_id = thread.thread_id
+                        and checkpoints.checkpoint_ns = ''
+                    order by checkpoint_id desc
+                    limit 1
+                ) latest on true
+                where thread.thread_id = %(thread_id)s{filter_clause}""",
+                {"thread_id": thread_id, **filter_params},
+                binary=True,
+            )
+            row = await fetchone(aiter(cur))
+            if (
+                row["status"] != "idle"
+                or row["values"] is None
+                or row["checkpoint_id"] is None
+                or not row["up_to_date"]
+            ):
+                return None
+            checkpoint: Checkpoint = {
+                "thread_id": str(thread_id),
+                "checkpoint_ns": "",
+                "checkpoint_id": str(row["checkpoint_id"]),
+            }
+            parent_checkpoint: Checkpoint | None = (
+                {**checkpoint, "checkpoint_id": str(row["parent_checkpoint_id"])}
+                if row["parent_checkpoint_id"]
+                else None
+            )
+            return {
+                "values": row["values"],
+                "next": [],
+                "tasks": [],
+                "metadata": row["metadata"],
+                "created_at": row["created_at"],
+                "checkpoint": checkpoint,
+                "parent_checkpoint": parent_checkpoint,
+                "interrupts": [],
+                # below are deprecated
+                "checkpoint_id": checkpoint["checkpoint_id"],
+                "parent_checkpoint_id": parent_checkpoint["checkpoint_id"]
+                if parent_checkpoint
+                else None,
+            }
+
         @staticmethod
         async def get(
             conn: AsyncConnection[DictRow],
@@ -1151,14 +1290,9 @@ class Threads(Authenticated):
             subgraphs: bool,
             ctx: Auth.types.BaseAuthContext | None = None,
         ) -> StateSnapshot:
-            checkpointer = AsyncPostgresSaver(conn)
-            # fetch both in parallel
-            async with conn.pipeline():
-                thread, checkpoint = await asyncio.gather(
-                    Threads.get(conn, config["configurable"]["thread_id"], ctx=ctx),
-                    checkpointer.aget_iter(cast("RunnableConfig", config)),
-                )
-            thread = await fetchone(thread)
+            thread = await fetchone(
+                await Threads.get(conn, config["configurable"]["thread_id"], ctx=ctx)
+            )
             metadata = await ajson_loads(thread["metadata"])
             thread_config = await ajson_loads(thread["config"])
 
@@ -1166,9 +1300,8 @@ class Threads(Authenticated):
 
             if graph_id := metadata.get("graph_id"):
                 # format latest checkpoint for response
-                checkpointer.latest_iter = checkpoint
                 async with get_graph(
-                    graph_id, thread_config, checkpointer=checkpointer
+                    graph_id, thread_config, checkpointer=AsyncPostgresSaver(conn)
                 ) as graph:
                     return await graph.aget_state(config, subgraphs=subgraphs)
             else:
@@ -1197,30 +1330,28 @@ class Threads(Authenticated):
                 Auth.types.ThreadsUpdate(thread_id=thread_id),
             )
 
-            checkpointer = AsyncPostgresSaver(conn) 
-            # fetch both in parallel
-            async with conn.pipeline():
-                thread, checkpoint = await asyncio.gather(
-                    Threads.get(
-                        conn,
-                        config["configurable"]["thread_id"],
-                        ctx=ctx,
-                        # This lets us use update filters on the get
-                        # operation if we want
-                        filters=filters,
-                    ),
-                    checkpointer.aget_iter(cast("RunnableConfig", config)),
-                ) 
-            thread = await fetchone(thread)
+            thread = await fetchone(
+                await Threads.get(
+                    conn,
+                    config["configurable"]["thread_id"],
+                    ctx=ctx,
+                    # This lets us use update filters on the get
+                    # operation if we want
+                    filters=filters,
+                )
+            )
             metadata = await ajson_loads(thread["metadata"])
             thread_config = await ajson_loads(thread["config"])
             if graph_id := metadata.get("graph_id"):
                 # update state
                 config["configurable"].setdefault("graph_id", graph_id)
-                checkpointer.latest_iter = checkpoint
                 async with AsyncExitStack() as stack:
                     graph = await stack.enter_async_context(
-                        get_graph(graph_id, thread_config, checkpointer=checkpointer)
+                        get_graph(
+                            graph_id,
+                            thread_config,
+                            checkpointer=AsyncPostgresSaver(conn),
+                        )
                     )
                     await stack.enter_async_context(conn.transaction())
                     next_config = await graph.aupdate_state(
@@ -1248,10 +1379,69 @@ class Threads(Authenticated):
         @staticmethod
         async def bulk(
             conn: AsyncConnection[DictRow],
+            *,
             config: Config,
-            supersteps: dict[str, Any],
-        ) -> StateSnapshot:
-            pass
+            supersteps: Sequence[dict[str, Any]],
+            ctx: Auth.types.BaseAuthContext | None = None,
+        ) -> ThreadUpdateResponse:
+            """Apply several supersteps of updates to a thread's state.
+
+            The graph is built once, checkpoints are kept in memory between
+            supersteps and written in one pipelined transaction at the end, and
+            the thread's values and status are updated once.
+            """
+            thread_id = UUID(config["configurable"]["thread_id"])
+            filters = await Threads.State.handle_event(
+                ctx,
+                "update",
+                Auth.types.ThreadsUpdate(thread_id=thread_id),
+            )
+            thread = await fetchone(
+                await Threads.get(conn, thread_id, ctx=ctx, filters=filters)
+            )
+            metadata = await ajson_loads(thread["metadata"])
+            thread_config = await ajson_loads(thread["config"])
+            if not (graph_id := metadata.get("graph_id")):
+                raise HTTPException(status_code=400, detail="Thread has no graph ID.")
+            config["configurable"].setdefault("graph_id", graph_id)
+            updates = [
+                [
+                    StateUpdate(
+                        map_cmd(update["command"])
+                        if update.get("command")
+                        else update.get("values"),
+                        update.get("as_node"),
+                    )
+                    for update in superstep["updates"]
+                ]
+                for superstep in supersteps
+            ]
+            checkpointer = BulkCheckpointer(conn)
+            async with (
+                get_graph(graph_id, thread_config, checkpointer=checkpointer) as graph,
+                conn.transaction(),
+            ):
+                try:
+                    next_config = await graph.abulk_update_state(
+                        cast("RunnableConfig", config), updates
+                    )
+                except (InvalidUpdateError, ValueError) as e:
+                    raise HTTPException(status_code=400, detail=str(e)) from e
+                # served from the checkpoint kept in memory
+                state = await graph.aget_state(next_config)
+                await checkpointer.aflush()
+                await Threads.set_status(
+                    conn,
+                    thread_id,
+                    state_snapshot_to_thread_state(state),
+                    None,
+                )
+            return {
+                "checkpoint": next_config["configurable"],
+                # below are deprecated
+                **next_config,
+                "checkpoint_id": next_config["configurable"]["checkpoint_id"],
+            }
 
         @staticmethod
         async def list(
@@ -1261,18 +1451,33 @@ class Threads(Authenticated):
             limit: int = 10,
             before: str | Checkpoint | None = None,
             metadata: MetadataInput = None,
+            channels: Sequence[str] | None = None,
             ctx: Auth.types.BaseAuthContext | None = None,
         ) -> list[StateSnapshot]:
-            """Get the history of a thread."""
+            """Get the history of a thread.
+
+            If `channels` is given, only those state channels are loaded and
+            returned in `values`. The other state channels are never fetched or
+            deserialized, so the tasks of each state only see the requested ones.
+            """
             thread = await fetchone(
                 await Threads.get(conn, config["configurable"]["thread_id"], ctx=ctx)
             )
             thread_metadata = await ajson_loads(thread["metadata"])
             thread_config = await ajson_loads(thread["config"])
             if graph_id := thread_metadata.get("graph_id"):
+                checkpointer = AsyncPostgresSaver(conn)
                 async with get_graph(
-                    graph_id, thread_config, checkpointer=AsyncPostgresSaver(conn)
+                    graph_id, thread_config, checkpointer=checkpointer
                 ) as graph:
+                    if channels is not None:
+                        # internal trigger channels still load, so `next` is unaffected
+                        output_channels = graph.stream_channels_asis
+                        if isinstance(output_channels, str):
+                            output_channels = [output_channels]
+                        checkpointer.skip_channels = frozenset(
+                            output_channels
+                        ).difference(channels)
                     result = [
                         c
                         async for c in graph.aget_state_history(
@@ -1286,6 +1491,17 @@ class Threads(Authenticated):
                             ),
                         )
                     ]
+                    if channels is not None:
+                        result = [
+                            c._replace(
+                                values={
+                                    k: v for k, v in c.values.items() if k in channels
+                                }
+                            )
+                            if isinstance(c.values, dict)
+                            else c
+                            for c in result
+                        ]
                     return result
             else:
                 return []
@@ -1330,11 +1546,7 @@ class Runs(Authenticated):
         # - a run is marked for retry - Runs.set_status()
         # - a run finishes with other runs pending in same thread - Threads.set_status()
         if wait:
-            try:
-                await get_redis_noretry().blpop(
-                    [LIST_RUN_QUEUE], timeout=BG_JOB_INTERVAL
-                )
-            except coredis.exceptions.ConnectionError:
+            if not await get_broker().wait_for_wakeup(BG_JOB_INTERVAL):
                 yield None
                 return
         else:
@@ -1368,23 +1580,15 @@ class Runs(Authenticated):
                 ) as cur:
                     run = await cur.fetchone()
             if run is not None:
-                async with await get_redis().pipeline() as pipe:
-                    await pipe.set(
-                        STRING_RUN_RUNNING.format(run["run_id"]),
-                        "1",
-                        ex=BG_JOB_HEARTBEAT,
-                    )
-                    await pipe.incrby(STRING_RUN_ATTEMPT.format(run["run_id"]), 1)
-                    await pipe.expire(STRING_RUN_ATTEMPT.format(run["run_id"]), 60)
-                    (
-                        run["kwargs"],
-                        run["metadata"],
-                        (_, attempt, _),
-                    ) = await asyncio.gather(
-                        ajson_loads(run["kwargs"]),
-                        ajson_loads(run["metadata"]),
-                        pipe.execute(),
-                    )
+                (
+                    run["kwargs"],
+                    run["metadata"],
+                    attempt,
+                ) = await asyncio.gather(
+                    ajson_loads(run["kwargs"]),
+                    ajson_loads(run["metadata"]),
+                    get_broker().acquire_lease(run["run_id"], BG_JOB_HEARTBEAT),
+                )
         if run is not None:
             yield run, attempt
         else:
@@ -1401,7 +1605,10 @@ class Runs(Authenticated):
         """Enter a run, listen for cancellation while running, signal when done."
         This method should be called as a context manager by a worker executing a run.
         """
-        async with get_pubsub() as pubsub, SimpleTaskGroup(cancel=True) as tg:
+        async with (
+            get_broker().subscriber() as pubsub,
+            SimpleTaskGroup(cancel=True) as tg,
+        ):
             done = ValueEvent()
             # start listener, will be cancelled when exiting context
             tg.create_task(listen_for_cancellation(pubsub=pubsub, run_id=run_id, thread_id=thread_id, done=done))
@@ -1411,14 +1618,14 @@ class Runs(Authenticated):
             try:
                 yield done
                 # signal done
-                await get_redis().publish(CHANNEL_RUN_CONTROL.format(run_id), "done")
+                await get_broker().send_control([run_id], "done", persist=False)
             finally:
                 hb.cancel()
 
     @staticmethod
     async def sweep(conn: AsyncConnection[DictRow]) -> list[UUID]:
         """Sweep runs that have been in running state for too long."""
-        async with LuaLock(get_redis_noretry(), LOCK_RUN_SWEEP, timeout=30.0):
+        async with get_broker().sweep_lock():
             cur = await conn.execute(
                 """
                     select run_id
@@ -1429,13 +1636,11 @@ class Runs(Authenticated):
             run_ids = [row["run_id"] async for row in cur]
             if not run_ids:
                 return []
-            exists = await get_redis().mget(
-                [STRING_RUN_RUNNING.format(run_id) for run_id in run_ids]
-            )
+            leased = await get_broker().has_leases(run_ids)
             to_sweep = [
                 run_id
-                for run_id, exists in zip(run_ids, exists, strict=True)
-                if exists is None
+                for run_id, leased in zip(run_ids, leased, strict=True)
+                if not leased
             ]
             if to_sweep:
                 try:
@@ -1504,7 +1709,7 @@ class Runs(Authenticated):
 
         thread_query_cte = (
             f"""WITH inserted_thread AS (
-                INSERT INTO thread (thread_id, status, metadata, config)
+                INSERT INTO thread (thread_id, status, metadata, config, ttl_minutes, expires_at)
                 SELECT
                     %(thread_id)s,
                     'busy',
@@ -1518,7 +1723,9 @@ class Runs(Authenticated):
                         'configurable',
                             coalesce((assistant.config -> 'configurable'), '{{}}') ||
                             coalesce(%(config)s::jsonb -> 'configurable', '{{}}')
-                       )
+                       ),
+                    %(ttl_minutes)s::double precision,
+                    now() + %(ttl_minutes)s::double precision * interval '1 minute'
                 FROM assistant
                 WHERE assistant_id = %(assistant_id)s
                 ON CONFLICT (thread_id) DO NOTHING
@@ -1548,6 +1755,7 @@ class Runs(Authenticated):
             "status": status,
             "user_id": user_id,
             "after_seconds": f"{after_seconds} second",
+            "ttl_minutes": _ttl_minutes(None, default=True),
         }
         params.update(filter_params)
 
@@ -1803,73 +2011,69 @@ SELECT * FROM inflight_runs"""
             thread_join = "JOIN thread USING (thread_id)"
             params.update(filter_params)
 
-        async with await get_redis().pipeline() as pipe:
-            for run_id in run_ids:
-                await pipe.set(STRING_RUN_CONTROL.format(run_id), action, ex=60)
-                await pipe.publish(CHANNEL_RUN_CONTROL.format(run_id), action)
-            cur, _ = await asyncio.gather(
-                conn.execute(
-                    f"""
-                    with
-
-                    running as (
-                        select run_id
-                        from run
-                        {thread_join}
-                        where run_id = any(%(run_ids)s)
-                            and thread_id = %(thread_id)s
-                            {filter_clause}
-                            and run.status = 'running'
-                    ),
-
-                    -- Not currently being worked on
-                    pending as (
-                        select run_id
-                        from run
-                        {thread_join}
-                        where run_id = any(%(run_ids)s)
-                            and thread_id = %(thread_id)s
-                            {filter_clause}
-                            and run.status = 'pending'
-                    ),
+        cur, _ = await asyncio.gather(
+            conn.execute(
+                f"""
+                with
 
-                    updated as (
-                        update run
-                        set status = 'interrupted'
-                        from pending
-                        where run.run_id = pending.run_id
-                        and %(action)s = 'interrupt'
-                        returning run.run_id
-                    ),
+                running as (
+                    select run_id
+                    from run
+                    {thread_join}
+                    where run_id = any(%(run_ids)s)
+                        and thread_id = %(thread_id)s
+                        {filter_clause}
+                        and run.status = 'running'
+                ),
 
-                    deleted AS (
-                        DELETE FROM run
-                        USING pending
-                        WHERE run.run_id = pending.run_id
-                        AND %(action)s = 'rollback'
-                        RETURNING run.run_id
-                    ),
+                -- Not currently being worked on
+                pending as (
+                    select run_id
+                    from run
+                    {thread_join}
+                    where run_id = any(%(run_ids)s)
+                        and thread_id = %(thread_id)s
+                        {filter_clause}
+                        and run.status = 'pending'
+                ),
 
-                    unioned as (
-                        select run_id, true as done
-                        from updated
-                        union all
-                        select run_id, true as done
-                        from deleted
-                        union all
-                        select run_id, false as done
-                        from running
-                    )
+                updated as (
+                    update run
+                    set status = 'interrupted'
+                    from pending
+                    where run.run_id = pending.run_id
+                    and %(action)s = 'interrupt'
+                    returning run.run_id
+                ),
 
-                    select run_id, bool_and(done) as done
-                    from unioned
-                    group by run_id
-                    """,
-                    params,
-                    binary=True,
+                deleted AS (
+                    DELETE FROM run
+                    USING pending
+                    WHERE run.run_id = pending.run_id
+                    AND %(action)s = 'rollback'
+                    RETURNING run.run_id
                 ),
-                pipe.execute(),
-            )
+
+                unioned as (
+                    select run_id, true as done
+                    from updated
+                    union all
+                    select run_id, true as done
+                    from deleted
+                    union all
+                    select run_id, false as done
+                    from running
+                )
+
+                select run_id, bool_and(done) as done
+                from unioned
+                group by run_id
+                """,
+                params,
+                binary=True,
+            ),
+            get_broker().send_control(run_ids, action),
+        )
         found = [row["run_id"] async for row in cur]
         if len(found) == len(run_ids):
             logger.info(
@@ -1948,16 +2152,8 @@ SELECT * FROM inflight_runs"""
             # Validate access to the thread before subscribing
             await Runs.Stream.check_run_stream_auth(run_id, thread_id, ctx=ctx)
             
-            pubsub = get_pubsub()
-            control_channel = CHANNEL_RUN_CONTROL.format(run_id)
-            if stream_mode is None:
-                await pubsub.psubscribe(
-                    CHANNEL_RUN_STREAM.format(run_id, "*"), control_channel
-                )
-            else:
-                await pubsub.subscribe(
-                    CHANNEL_RUN_STREAM.format(run_id, stream_mode), control_channel
-                )
+            pubsub = get_broker().subscriber()
+            await pubsub.subscribe_run(run_id, stream_mode)
             return pubsub
 
         @staticmethod
@@ -1998,6 +2194,7 @@ SELECT * FROM inflight_runs"""
             stream_channel: StreamHandler | None = None,
             cancel_on_disconnect: bool = False,
             stream_mode: StreamMode | None = None,
+            last_event_id: str | None = None,
             ctx: Auth.types.BaseAuthContext | None = None,
         ) -> AsyncIterator[tuple[bytes, bytes, bytes | None]]:
             """Stream the run output, either from a stream handler or a stream mode.
@@ -2011,6 +2208,8 @@ SELECT * FROM inflight_runs"""
                 cancel_on_disconnect: If True, cancel the run when client disconnects.
                 stream_mode: The stream mode to subscribe to (e.g., "values", "updates").
                     If None, subscribes to all modes using pattern matching.
+                last_event_id: Resume after this stream ID, replaying the buffered
+                    messages of resumable runs first.
                 ctx: Authentication context.
             """
             await Runs.Stream.check_run_stream_auth(run_id, thread_id, ctx=ctx)
@@ -2019,31 +2218,53 @@ SELECT * FROM inflight_runs"""
             pubsub: StreamHandler | None = None
             try:
                 # Use pre-subscribed channel if provided, otherwise create new pubsub
-                pubsub = stream_channel if stream_channel is not None else get_pubsub()
+                pubsub = (
+                    stream_channel
+                    if stream_channel is not None
+                    else get_broker().subscriber()
+                )
                 
                 async with pubsub, connect() as conn:
                     control_channel = CHANNEL_RUN_CONTROL.format(run_id)
                     
                     # Only subscribe if we created a new pubsub (no pre-subscribed channel)
                     if stream_channel is None:
-                        if stream_mode is None:
-                            await pubsub.psubscribe(
-                                CHANNEL_RUN_STREAM.format(run_id, "*"), control_channel
-                            )
-                        else:
-                            await pubsub.subscribe(
-                                CHANNEL_RUN_STREAM.format(run_id, stream_mode),
-                                control_channel,
-                            )
+                        await pubsub.subscribe_run(run_id, stream_mode)
+                    # sharded pubsub delivers all stream modes on one channel
+                    only_event = (
+                        stream_mode.encode()
+                        if SHARDED_PUBSUB and stream_mode is not None
+                        else None
+                    )
                     logger.info(
                         "Joined run stream",
                         run_id=str(run_id),
                         thread_id=str(thread_id),
                     )
                     len_prefix = len(CHANNEL_RUN_STREAM.format(run_id, "").encode())
+                    fragments = FragmentBuffer()
                     timeout = WAIT_TIMEOUT
+                    # subscribed first, so nothing is missed between the two
+                    replayed = deque(
+                        await pubsub.replay(run_id, last_event_id)
+                        if last_event_id
+                        else ()
+                    )
                     while True:
-                        event = await pubsub.get_message(True, timeout=timeout)
+                        if replayed:
+                            event = replayed.popleft()
+                        else:
+                            try:
+                                event = await pubsub.get_message(True, timeout=timeout)
+                            except SlowConsumerError as exc:
+                                # the subscription was dropped for falling behind
+                                logger.warning(
+                                    "Run stream consumer disconnected",
+                                    run_id=str(run_id),
+                                    thread_id=str(thread_id),
+                                )
+                                yield b"error", orjson.dumps({"error": str(exc)}), None
+                                break
                         if event:
                             if event["channel"] == control_channel.encode():
                                 if event["data"] == b"done":
@@ -2056,12 +2277,22 @@ SELECT * FROM inflight_runs"""
                                     break
                             else:
                                 packet = decode_stream_message(
-                                    event["data"], channel=event["channel"]
+                                    event["data"],
+                                    channel=event["channel"],
+                                    fragments=fragments,
                                 )
+                                if packet is None:
+                                    # more fragments to come
+                                    continue
+                                if (
+                                    only_event is not None
+                                    and packet.event_bytes != only_event
+                                ):
+                                    continue
                                 yield (
                                     packet.event_bytes,
                                     packet.message_bytes,
-                                    packet.stream_id_bytes,
+                                    packet.stream_id_bytes or event.get("id"),
                                 )
                                 if log:
                                     logger.debug(
@@ -2102,7 +2333,7 @@ SELECT * FROM inflight_runs"""
             thread_id: UUID | None = None,
             resumable: bool = False,
         ) -> None:
-            await get_redis().publish(CHANNEL_RUN_STREAM.format(run_id, event), message)
+            await get_broker().publish(run_id, event, message, resumable=resumable)
 
 
 class Crons(Authenticated):
@@ -2329,8 +2560,13 @@ LIMIT 1
         thread_id: UUID | None,
         limit: int,
         offset: int,
+        sort_by: str | None = None,
+        sort_order: str | None = None,
+        select: list[str] | None = None,
+        cursor: str | None = None,
+        count: SearchCount = "exact",
         ctx: Auth.types.BaseAuthContext | None = None,
-    ) -> AsyncIterator[Cron]:
+    ) -> tuple[AsyncIterator[Cron], Page]:
         """Search all cron jobs"""
         filters = await Crons.handle_event(
             ctx,
@@ -2347,46 +2583,56 @@ LIMIT 1
         filter_clause, filter_params = _build_filter_query(
             filters=filters,
             table_alias=table_aliases,
+            prefix="",
         )
         threads_join = (
             "JOIN thread USING (thread_id)" if (thread_id and filter_params) else ""
         )
 
-        # Construct base query with joins
-        query = f"SELECT cron.* FROM cron {threads_join} WHERE 1=1"
+        conditions = []
         params: dict[str, Any] = {}
 
         if thread_id:
-            query += " AND cron.thread_id = %(thread_id)s"
+            conditions.append("cron.thread_id = %(thread_id)s")
             params["thread_id"] = thread_id
         if assistant_id:
-            query += " AND cron.assistant_id = %(assistant_id)s"
+            conditions.append("cron.assistant_id = %(assistant_id)s")
             params["assistant_id"] = assistant_id
 
         if filter_params:
-            query += filter_clause
+            conditions.append(filter_clause)
             params.update(filter_params)
 
-        query += " ORDER BY cron.created_at DESC LIMIT %(limit)s OFFSET %(offset)s"
-        params.update(
-            {
-                "limit": limit,
-                "offset": offset,
-            }
+        # Validate sort_by to prevent SQL injection
+        valid_sort_fields = [
+            "cron_id",
+            "assistant_id",
+            "thread_id",
+            "next_run_date",
+            "end_time",
+            "created_at",
+            "updated_at",
+        ]
+        return await search_page(
+            conn,
+            table="cron",
+            from_clause=f"cron {threads_join}",
+            conditions=conditions,
+            params=params,
+            # "now" is only computed for next()
+            select=select and [field for field in select if field != "now"],
+            fields=CRON_FIELDS - {"now"},
+            json_fields=CRON_JSON_FIELDS,
+            id_column="cron_id",
+            sort_by=sort_by if sort_by in valid_sort_fields else "created_at",
+            sort_order=sort_order,
+            nullable=("thread_id", "end_time", "next_run_date"),
+            limit=limit,
+            offset=offset,
+            cursor=cursor,
+            count=count,
         )
 
-        cur = await conn.execute(query, params, binary=True)
-        result = [row async for row in cur]
-        all_results = []
-        async for r in await conn.execute("SELECT * FROM cron WHERE 1 = 1"):
-            all_results.append(r)
-
-        async def consume():
-            for row in result:
-                yield row
-
-        return consume()
-
 
 async def cancel_run(
     thread_id: UUID, run_id: UUID, ctx: Auth.types.BaseAuthContext | None = None
@@ -2400,8 +2646,8 @@ async def listen_for_cancellation(
 ):
     """Listen for cancellation messages and set the done event accordingly."""
     try:
-        await pubsub.subscribe(CHANNEL_RUN_CONTROL.format(run_id))
-        if start_value := await get_redis().get(STRING_RUN_CONTROL.format(run_id)):
+        await pubsub.subscribe_control(run_id)
+        if start_value := await get_broker().get_control(run_id):
             if start_value == b"rollback":
                 done.set(UserRollback())
             elif start_value == b"interrupt":
@@ -2425,11 +2671,11 @@ async def listen_for_cancellation(
 
 async def heartbeat(run_id: UUID):
     """Heartbeat to keep run from getting sweeped back to pending."""
-    redis = get_redis()
+    broker = get_broker()
     while True:
         await asyncio.sleep(BG_JOB_HEARTBEAT / 2)
         try:
-            await redis.set(STRING_RUN_RUNNING.format(run_id), "1", ex=BG_JOB_HEARTBEAT)
+            await broker.renew_lease(run_id, BG_JOB_HEARTBEAT)
         except Exception as exc:
             logger.exception("Heartbeat iterationfailed", exc_info=exc)
 
@@ -2437,7 +2683,7 @@ async def heartbeat(run_id: UUID):
 async def wake_up_worker(delay: float = 0) -> None:
     if delay:
         await asyncio.sleep(delay)
-    await get_redis().lpush(LIST_RUN_QUEUE, [1])
+    await get_broker().wake_up_worker()
 
 
 LANGGRAPH_PY_MINOR = tuple(map(int, __version__.split(".")[:2]))
@@ -2475,6 +2721,17 @@ def _patch_interrupt(
         }
 
 
+def _ttl_minutes(ttl: dict | None, *, default: bool = False) -> float | None:
+    """Get a thread's TTL in minutes, or THREAD_TTL's default_ttl if `default`."""
+    if ttl and ttl.get("ttl") is not None:
+        if (strategy := ttl.get("strategy", "delete")) != "delete":
+            raise HTTPException(
+                status_code=422, detail=f"Unsupported TTL strategy: {strategy}"
+            )
+        return float(ttl["ttl"])
+    return (THREAD_TTL or {}).get("default_ttl") if default else None
+
+
 def _build_filter_query(
     *,
     filters: Auth.types.FilterType | None,
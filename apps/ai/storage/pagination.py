@@ -0,0 +1,207 @@
+"""Keyset pagination and row counts for the search endpoints.
+
+Search results are ordered by the sort field, then by the row's id, so each
+row has a distinct position. The cursor of the next page encodes the
+position of the last row returned, and the next page is read from there
+with a row comparison an index can seek to, instead of reading and skipping
+`offset` rows. As in ORDER BY, NULL sort values come first in descending
+order and last in ascending order.
+
+Selected fields are checked against the table's fields. Sub-paths of its
+JSON fields, as in "values.messages[-1]", are extracted in the query, so
+only that part of the document is read out and sent.
+
+With count="exact" the matching rows are counted with the same filters,
+with "estimate" the planner's row estimate is read from EXPLAIN, and with
+"none" they aren't counted. The total is known anyway on the last page of
+an offset search.
+"""
+
+import base64
+from collections.abc import AsyncIterator, Collection
+from typing import Any
+
+import orjson
+from psycopg import AsyncConnection
+from psycopg.rows import DictRow
+from starlette.exceptions import HTTPException
+
+from api.schema import Page, SearchCount
+from api.utils import parse_select_path
+
+
+def encode_cursor(sort_by: str, sort_order: str, value: Any, id: Any) -> str:
+    """Encode the position of a row in results sorted by `sort_by`."""
+    data = orjson.dumps([sort_by, sort_order, value, id])
+    return base64.urlsafe_b64encode(data).decode()
+
+
+def decode_cursor(cursor: str, sort_by: str, sort_order: str) -> tuple[Any, Any]:
+    """Decode a cursor into the sort value and id of the row it points after."""
+    try:
+        cursor_sort_by, cursor_sort_order, value, id = orjson.loads(
+            base64.urlsafe_b64decode(cursor)
+        )
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=422, detail="Invalid cursor") from e
+    if (cursor_sort_by, cursor_sort_order) != (sort_by, sort_order):
+        raise HTTPException(
+            status_code=422,
+            detail=f"Cursor is for results sorted by {cursor_sort_by} {cursor_sort_order}",
+        )
+    return value, id
+
+
+def select_columns(
+    table: str,
+    select: list[str],
+    fields: Collection[str],
+    json_fields: Collection[str],
+    params: dict[str, Any],
+) -> list[tuple[str, str]]:
+    """Build the (column, alias) of each selected field, adding path params.
+
+    Raises HTTP 422 for fields that aren't `fields` or sub-paths of
+    `json_fields`.
+    """
+    columns = []
+    for i, field in enumerate(select):
+        if field in fields:
+            columns.append((f"{table}.{field}", field))
+        elif (path := parse_select_path(field)) and path[0] in json_fields:
+            params[f"select_path_{i}"] = path[1]
+            columns.append(
+                (f"{table}.{path[0]} #> %(select_path_{i})s", f"select_path_{i}")
+            )
+        else:
+            raise HTTPException(
+                status_code=422, detail=f"Invalid select field: {field}"
+            )
+    return columns
+
+
+def keyset_condition(
+    column: str, id_column: str, descending: bool, nullable: bool, null: bool
+) -> str:
+    """Match the rows after %(cursor_value)s, %(cursor_id)s in sort order.
+
+    `null` tells whether the cursor's sort value is NULL. Ascending past a
+    value of a nullable column still includes its NULLs, which an index on it
+    can't seek to as directly.
+    """
+    op = "<" if descending else ">"
+    if column == id_column:
+        return f"{id_column} {op} %(cursor_id)s"
+    if null:
+        after_null = f"{column} IS NULL AND {id_column} {op} %(cursor_id)s"
+        return f"({after_null} OR {column} IS NOT NULL)" if descending else after_null
+    after = f"({column}, {id_column}) {op} (%(cursor_value)s, %(cursor_id)s)"
+    if nullable and not descending:
+        return f"({after} OR {column} IS NULL)"
+    return after
+
+
+async def search_page(
+    conn: AsyncConnection[DictRow],
+    *,
+    table: str,
+    from_clause: str,
+    conditions: list[str],
+    params: dict[str, Any],
+    select: list[str] | None,
+    fields: Collection[str],
+    json_fields: Collection[str] = (),
+    id_column: str,
+    sort_by: str,
+    sort_order: str | None,
+    nullable: Collection[str] = (),
+    limit: int,
+    offset: int,
+    cursor: str | None,
+    count: SearchCount,
+) -> tuple[AsyncIterator[DictRow], Page]:
+    """Run a search for a page of rows of `table`.
+
+    Columns are qualified with `table`, so `from_clause` can join others.
+    `select` is checked against `fields` and sub-paths of `json_fields`, and
+    `nullable` names the sort fields that can hold NULLs.
+    """
+    sort_order = "asc" if sort_order == "asc" else "desc"
+    direction = sort_order.upper()
+    where = " AND ".join(conditions) or "TRUE"
+    page_conditions = list(conditions)
+    params = {**params, "limit": limit + 1, "offset": offset}
+    if cursor:
+        if offset:
+            raise HTTPException(
+                status_code=422, detail="Cannot page by both offset and cursor"
+            )
+        params["cursor_value"], params["cursor_id"] = decode_cursor(
+            cursor, sort_by, sort_order
+        )
+        page_conditions.append(
+            keyset_condition(
+                f"{table}.{sort_by}",
+                f"{table}.{id_column}",
+                sort_order == "desc",
+                sort_by in nullable,
+                params["cursor_value"] is None,
+            )
+        )
+
+    # the next cursor is made of the last row's sort field and id
+    columns = [f"{table}.*"]
+    projection: list[tuple[str, str]] = []
+    if select:
+        projection = select_columns(table, select, fields, json_fields, params)
+        extra = [c for c in dict.fromkeys((sort_by, id_column)) if c not in select]
+        columns = [
+            f"{column} AS {alias}"
+            for column, alias in (*projection, *((f"{table}.{c}", c) for c in extra))
+        ]
+    query = f"""SELECT {", ".join(columns)} FROM {from_clause}
+        WHERE {" AND ".join(page_conditions) or "TRUE"}
+        ORDER BY {table}.{sort_by} {direction}, {table}.{id_column} {direction}
+        LIMIT %(limit)s OFFSET %(offset)s"""
+
+    async with conn.pipeline():
+        cur = await conn.execute(query, params, binary=True)
+        if count == "exact":
+            count_cur = await conn.execute(
+                f"SELECT COUNT(*) FROM {from_clause} WHERE {where}", params
+            )
+        elif count == "estimate":
+            count_cur = await conn.execute(
+                f"EXPLAIN (FORMAT JSON) SELECT 1 FROM {from_clause} WHERE {where}",
+                params,
+            )
+    rows = await cur.fetchall()
+
+    page = Page(next_offset=None, next_cursor=None, total=None, total_estimate=None)
+    if len(rows) > limit:
+        del rows[limit:]
+        last = rows[-1]
+        page["next_cursor"] = encode_cursor(
+            sort_by, sort_order, last[sort_by], last[id_column]
+        )
+        if not cursor:
+            page["next_offset"] = offset + limit
+    elif not cursor and (rows or not offset):
+        page["total"] = offset + len(rows)
+    if count == "exact":
+        page["total"] = (await count_cur.fetchone())["count"]
+    elif count == "estimate":
+        plan = (await count_cur.fetchone())["QUERY PLAN"]
+        page["total_estimate"] = int(plan[0]["Plan"]["Plan Rows"])
+
+    # rows keep the selected fields only, named as selected
+    aliases = [
+        (field, alias)
+        for field, (_, alias) in zip(select or (), projection, strict=True)
+    ]
+
+    async def consume():
+        for row in rows:
+            yield {field: row[alias] for field, alias in aliases} if aliases else row
+
+    return consume(), page
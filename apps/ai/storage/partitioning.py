@@ -0,0 +1,357 @@
+"""Declarative partitioning of the checkpoint tables.
+
+With CHECKPOINT_PARTITIONING="hash", checkpoints, checkpoint_writes and
+checkpoint_blobs are hash-partitioned by thread_id. With "time", checkpoints
+and checkpoint_writes are range-partitioned by checkpoint_id, which is a
+uuid6 and so sorts by creation time, and a range that expired under
+CHECKPOINT_PARTITION_RETENTION_DAYS is dropped as a whole. Blob versions are
+shared by checkpoints of different ranges, so checkpoint_blobs is
+hash-partitioned in both modes.
+"""
+
+import asyncio
+import re
+from datetime import UTC, datetime, timedelta
+from typing import Literal
+from uuid import UUID
+
+import structlog
+from psycopg import AsyncConnection
+from psycopg.errors import CheckViolation, LockNotAvailable
+from psycopg.rows import DictRow
+
+from api.config import (
+    CHECKPOINT_COMPACTION_BATCH_SIZE,
+    CHECKPOINT_COMPACTION_THROTTLE_SECS,
+    CHECKPOINT_PARTITION_COUNT,
+    CHECKPOINT_PARTITION_INTERVAL_DAYS,
+    CHECKPOINT_PARTITION_PREMAKE,
+    CHECKPOINT_PARTITION_RETENTION_DAYS,
+    CHECKPOINT_PARTITIONING,
+)
+from storage.async_postgres_checkpointer import (
+    COMPACTION_STATS,
+    delete_orphan_blob_versions,
+)
+
+logger = structlog.stdlib.get_logger(__name__)
+
+TIME_PARTITIONED_TABLES = ("checkpoints", "checkpoint_writes")
+HASH_PARTITIONED_TABLES = ("checkpoint_blobs",)
+
+# Serializes conversions and partition maintenance across servers.
+PARTITIONING_LOCK_ID = 0x6C67_6370  # "lgcp"
+
+# Dropping a partition takes an exclusive lock on its parent table, and every
+# query on the table queues behind the waiting drop, so give up quickly.
+DROP_LOCK_TIMEOUT = "2s"
+
+# Offset of the uuid6 epoch (1582-10-15) from the Unix epoch, in 100ns units.
+UUID_EPOCH_OFFSET = 0x01B21DD213814000
+
+SELECT_PARTITION_STRATEGY_SQL = """
+    SELECT p.partstrat
+    FROM pg_class c
+    LEFT JOIN pg_partitioned_table p ON p.partrelid = c.oid
+    WHERE c.oid = to_regclass(%s)
+"""
+
+SELECT_PARTITIONS_SQL = """
+    SELECT child.relname AS name, pg_get_expr(child.relpartbound, child.oid) AS bound
+    FROM pg_inherits
+    INNER JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    WHERE pg_inherits.inhparent = to_regclass(%s)
+"""
+
+SELECT_FOREIGN_KEYS_SQL = """
+    SELECT conname AS name, pg_get_constraintdef(oid) AS definition
+    FROM pg_constraint
+    WHERE conrelid = to_regclass(%s) AND contype = 'f'
+"""
+
+SELECT_PARTITION_THREADS_SQL = """
+    SELECT DISTINCT thread_id, checkpoint_ns FROM "{partition}"
+"""
+
+RANGE_BOUND_RE = re.compile(r"FROM \('([0-9a-f-]{36})'\) TO \('([0-9a-f-]{36})'\)")
+
+# Totals since startup, for the metrics endpoint.
+PARTITION_STATS = {
+    "partitions_created": 0,
+    "partitions_dropped": 0,
+}
+
+
+def _checkpoint_id_at(at: datetime) -> UUID:
+    """The lowest uuid6 checkpoint id that can be generated at or after `at`."""
+    timestamp = (at - datetime(1970, 1, 1, tzinfo=UTC)) // timedelta(
+        microseconds=1
+    ) * 10 + UUID_EPOCH_OFFSET
+    return UUID(int=(timestamp >> 12) << 80 | 0x6 << 76 | (timestamp & 0x0FFF) << 64)
+
+
+def _checkpoint_id_time(checkpoint_id: UUID) -> datetime:
+    timestamp = (checkpoint_id.int >> 80) << 12 | (checkpoint_id.int >> 64) & 0x0FFF
+    return datetime(1970, 1, 1, tzinfo=UTC) + timedelta(
+        microseconds=(timestamp - UUID_EPOCH_OFFSET) // 10
+    )
+
+
+def _interval() -> timedelta:
+    return timedelta(days=CHECKPOINT_PARTITION_INTERVAL_DAYS)
+
+
+def _range_start(at: datetime) -> datetime:
+    """Start of the partition range containing `at`, counted from the Unix epoch."""
+    epoch = datetime(1970, 1, 1, tzinfo=UTC)
+    return epoch + (at - epoch) // _interval() * _interval()
+
+
+async def _strategy(conn: AsyncConnection[DictRow], table: str) -> str | None:
+    cur = await conn.execute(SELECT_PARTITION_STRATEGY_SQL, (table,))
+    row = await cur.fetchone()
+    return row["partstrat"] if row else None
+
+
+async def _partition_table(
+    conn: AsyncConnection[DictRow],
+    table: str,
+    strategy: Literal["hash", "range"],
+    now: datetime,
+) -> None:
+    """Replace `table` with a partitioned table with the same columns and indexes.
+
+    A hash-partitioned table gets CHECKPOINT_PARTITION_COUNT partitions and the
+    existing rows are copied into them. For a range-partitioned table, the
+    existing table becomes the default partition without copying, and ranges
+    start with the one after `now`.
+    """
+    cur = await conn.execute(SELECT_FOREIGN_KEYS_SQL, (table,))
+    foreign_keys = await cur.fetchall()
+    old = f"{table}_default" if strategy == "range" else f"{table}_unpartitioned"
+    key = "checkpoint_id" if strategy == "range" else "thread_id"
+    await conn.execute(f"ALTER TABLE {table} RENAME TO {old}")
+    await conn.execute(
+        f"""CREATE TABLE {table} (
+            LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+                INCLUDING INDEXES INCLUDING STORAGE
+        ) PARTITION BY {strategy.upper()} ({key})"""
+    )
+    if strategy == "range":
+        # added before attaching, so the partition's own keys are reused
+        for fk in foreign_keys:
+            await conn.execute(
+                f'ALTER TABLE {table} ADD CONSTRAINT "{fk["name"]}" {fk["definition"]}'
+            )
+        await conn.execute(f"ALTER TABLE {table} ATTACH PARTITION {old} DEFAULT")
+        # Creating a range scans the default partition for rows that belong in
+        # it, unless a constraint rules them out. Validated after commit.
+        first = _checkpoint_id_at(_range_start(now) + _interval())
+        await conn.execute(
+            f"""ALTER TABLE {old} ADD CONSTRAINT {old}_before_ranges
+            CHECK (checkpoint_id < '{first}') NOT VALID"""
+        )
+        return
+    for remainder in range(CHECKPOINT_PARTITION_COUNT):
+        await conn.execute(
+            f"""CREATE TABLE {table}_p{remainder} PARTITION OF {table}
+            FOR VALUES WITH (MODULUS {CHECKPOINT_PARTITION_COUNT}, REMAINDER {remainder})"""
+        )
+    await conn.execute(f"INSERT INTO {table} SELECT * FROM {old}")
+    await conn.execute(f"DROP TABLE {old}")
+    # added after copying, so they're validated in one pass
+    for fk in foreign_keys:
+        await conn.execute(
+            f'ALTER TABLE {table} ADD CONSTRAINT "{fk["name"]}" {fk["definition"]}'
+        )
+
+
+async def _create_time_partitions(
+    conn: AsyncConnection[DictRow], table: str, now: datetime
+) -> int:
+    """Create the ranges of `table` through CHECKPOINT_PARTITION_PREMAKE ahead.
+
+    Ranges before the latest existing one are never created, as their rows
+    are already in the default partition. Returns the number created.
+    """
+    interval = _interval()
+    cur = await conn.execute(SELECT_PARTITIONS_SQL, (table,))
+    ends = [
+        _checkpoint_id_time(UUID(match.group(2)))
+        for row in await cur.fetchall()
+        if (match := RANGE_BOUND_RE.search(row["bound"]))
+    ]
+    # the range containing now may already have rows in the default partition
+    start = max(ends) if ends else _range_start(now) + interval
+    created = 0
+    while start <= _range_start(now) + CHECKPOINT_PARTITION_PREMAKE * interval:
+        lower, upper = _checkpoint_id_at(start), _checkpoint_id_at(start + interval)
+        try:
+            async with conn.transaction():
+                await conn.execute(
+                    f"""CREATE TABLE {table}_p{start:%Y%m%d} PARTITION OF {table}
+                    FOR VALUES FROM ('{lower}') TO ('{upper}')"""
+                )
+            created += 1
+        except CheckViolation:
+            # maintenance fell behind and rows of the range are in the default
+            # partition, where they stay until deleted row by row
+            await logger.awarning(
+                "Checkpoint partition range has rows in the default partition",
+                table=table,
+                start=start.isoformat(),
+            )
+        start += interval
+    return created
+
+
+async def setup_checkpoint_partitions(conn: AsyncConnection[DictRow]) -> None:
+    """Partition the checkpoint tables as configured by CHECKPOINT_PARTITIONING.
+
+    Tables already partitioned are left as they are, so changing the strategy
+    of a partitioned deployment requires migrating the data by hand.
+    """
+    if CHECKPOINT_PARTITIONING == "none":
+        return
+    time_strategy = "range" if CHECKPOINT_PARTITIONING == "time" else "hash"
+    now = datetime.now(UTC)
+    converted: list[str] = []
+    async with conn.transaction():
+        await conn.execute("SELECT pg_advisory_xact_lock(%s)", (PARTITIONING_LOCK_ID,))
+        for table in TIME_PARTITIONED_TABLES + HASH_PARTITIONED_TABLES:
+            strategy = time_strategy if table in TIME_PARTITIONED_TABLES else "hash"
+            current = await _strategy(conn, table)
+            if current is None:
+                await logger.ainfo(f"Partitioning {table} by {strategy}", table=table)
+                await _partition_table(conn, table, strategy, now)
+                converted.append(table)
+            elif current != strategy[0]:
+                await logger.awarning(
+                    f"{table} is already partitioned with another strategy",
+                    table=table,
+                    strategy=strategy,
+                )
+    for table in converted:
+        if table in TIME_PARTITIONED_TABLES and time_strategy == "range":
+            await _validate_default_partition(conn, table)
+    await maintain_checkpoint_partitions(conn, drop_expired=False)
+
+
+async def _validate_default_partition(
+    conn: AsyncConnection[DictRow], table: str
+) -> None:
+    """Validate the check keeping the default partition before the ranges.
+
+    Unlike adding a validated constraint, this lets writes proceed while the
+    partition is scanned.
+    """
+    constraint = f"{table}_default_before_ranges"
+    try:
+        async with conn.transaction():
+            await conn.execute(
+                f"ALTER TABLE {table}_default VALIDATE CONSTRAINT {constraint}"
+            )
+    except CheckViolation:
+        # e.g. rows with checkpoint ids other than uuid6, so creating a range
+        # will scan the default partition instead
+        await logger.awarning(
+            f"{table}_default has rows after the first range", table=table
+        )
+        async with conn.transaction():
+            await conn.execute(
+                f"ALTER TABLE {table}_default DROP CONSTRAINT {constraint}"
+            )
+
+
+async def maintain_checkpoint_partitions(
+    conn: AsyncConnection[DictRow],
+    *,
+    drop_expired: bool = True,
+    batch_size: int = CHECKPOINT_COMPACTION_BATCH_SIZE,
+    throttle_secs: float = CHECKPOINT_COMPACTION_THROTTLE_SECS,
+) -> dict[str, int]:
+    """Create upcoming time partitions and drop expired ones.
+
+    A checkpoints range is dropped together with the checkpoint_writes range
+    of the same bounds once the whole range is older than
+    CHECKPOINT_PARTITION_RETENTION_DAYS. Blob versions only the dropped
+    checkpoints referenced are then deleted per thread, like compaction does.
+    Returns the counts of this pass.
+    """
+    stats = dict.fromkeys(PARTITION_STATS, 0)
+    blob_stats = {"blobs_deleted": 0}
+    if CHECKPOINT_PARTITIONING != "time":
+        return stats
+    now = datetime.now(UTC)
+    expired: list[str] = []
+    async with conn.transaction():
+        await conn.execute("SELECT pg_advisory_xact_lock(%s)", (PARTITIONING_LOCK_ID,))
+        for table in TIME_PARTITIONED_TABLES:
+            if await _strategy(conn, table) != "r":
+                return stats
+            stats["partitions_created"] += await _create_time_partitions(
+                conn, table, now
+            )
+        if drop_expired and CHECKPOINT_PARTITION_RETENTION_DAYS > 0:
+            cutoff = now - timedelta(days=CHECKPOINT_PARTITION_RETENTION_DAYS)
+            cur = await conn.execute(SELECT_PARTITIONS_SQL, ("checkpoints",))
+            expired = sorted(
+                row["name"]
+                for row in await cur.fetchall()
+                if (match := RANGE_BOUND_RE.search(row["bound"]))
+                and _checkpoint_id_time(UUID(match.group(2))) <= cutoff
+            )
+    for partition in expired:
+        await _drop_time_partition(
+            conn, partition, batch_size, throttle_secs, stats, blob_stats
+        )
+    for key, count in stats.items():
+        PARTITION_STATS[key] += count
+    COMPACTION_STATS["blobs_deleted"] += blob_stats["blobs_deleted"]
+    return stats
+
+
+async def _drop_time_partition(
+    conn: AsyncConnection[DictRow],
+    partition: str,
+    batch_size: int,
+    throttle_secs: float,
+    stats: dict[str, int],
+    blob_stats: dict[str, int],
+) -> None:
+    writes_partition = partition.replace("checkpoints_", "checkpoint_writes_", 1)
+    try:
+        async with conn.transaction():
+            await conn.execute(f"SET LOCAL lock_timeout = '{DROP_LOCK_TIMEOUT}'")
+            cur = await conn.execute(
+                SELECT_PARTITION_THREADS_SQL.format(partition=partition)
+            )
+            threads = [
+                (row["thread_id"], row["checkpoint_ns"]) for row in await cur.fetchall()
+            ]
+            await conn.execute(f'DROP TABLE IF EXISTS "{writes_partition}"')
+            await conn.execute(f'DROP TABLE "{partition}"')
+    except LockNotAvailable:
+        await logger.ainfo(
+            "Checkpoint partition busy, dropping it on the next pass",
+            partition=partition,
+        )
+        return
+    stats["partitions_dropped"] += 1
+    await logger.ainfo(
+        "Dropped expired checkpoint partition",
+        partition=partition,
+        threads=len(threads),
+    )
+    for thread_id, checkpoint_ns in threads:
+        await delete_orphan_blob_versions(
+            conn, thread_id, checkpoint_ns, batch_size, throttle_secs, blob_stats
+        )
+        await asyncio.sleep(0)
+
+
+__all__ = [
+    "PARTITION_STATS",
+    "maintain_checkpoint_partitions",
+    "setup_checkpoint_partitions",
+]
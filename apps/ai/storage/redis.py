@@ -1,7 +1,8 @@
 import asyncio
 import threading
+from collections.abc import Awaitable
 from types import TracebackType
-from typing import Self
+from typing import Any, Self
 
 import coredis
 import coredis.commands
@@ -12,7 +13,9 @@ import structlog
 from api.config import (
     REDIS_CLUSTER,
     REDIS_CONNECT_TIMEOUT,
+    REDIS_KEY_PREFIX,
     REDIS_MAX_CONNECTIONS,
+    REDIS_SHARDED_PUBSUB,
     REDIS_URI,
     STATS_INTERVAL_SECS,
 )
@@ -32,6 +35,8 @@ _cls_cp = (
     coredis.pool.ClusterConnectionPool if REDIS_CLUSTER else coredis.pool.ConnectionPool
 )
 _cls_cl = coredis.RedisCluster if REDIS_CLUSTER else coredis.Redis
+# sharded pubsub routes channels to nodes like keys, so it needs cluster mode
+SHARDED_PUBSUB = REDIS_CLUSTER and REDIS_SHARDED_PUBSUB
 
 
 async def start_redis() -> None:
@@ -142,7 +147,9 @@ def get_pubsub() -> coredis.commands.pubsub.BasePubSub[
                 connect_timeout=REDIS_CONNECT_TIMEOUT,
             )
         pool = _thread_local.redis_pool
-    if REDIS_CLUSTER:
+    if SHARDED_PUBSUB:
+        return ShardedPubSub(pool)
+    elif REDIS_CLUSTER:
         return ClusterPubSub(pool)
     else:
         return PubSub(pool)
@@ -174,12 +181,65 @@ class ClusterPubSub(coredis.commands.pubsub.ClusterPubSub[bytes]):
         self.close()
 
 
-# keys
+class ShardedPubSub(coredis.commands.pubsub.ShardedPubSub[bytes]):
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> bool | None:
+        self.close()
 
-CHANNEL_RUN_STREAM = "run:{}:stream:{}"
-CHANNEL_RUN_CONTROL = "run:{}:control"
-STRING_RUN_CONTROL = "run:{}:control"
-STRING_RUN_ATTEMPT = "run:{}:attempt"
-STRING_RUN_RUNNING = "run:{}:running"
-LIST_RUN_QUEUE = "run:queue"
-LOCK_RUN_SWEEP = "run:sweep"
+
+# keys
+# All keys and channels of a run share the {run_id} hash tag, so in cluster mode
+# they map to one slot and per-run pipelines and subscriptions hit a single node.
+
+CHANNEL_RUN_STREAM = REDIS_KEY_PREFIX + "run:{{{}}}:stream:{}"
+CHANNEL_RUN_STREAMS = REDIS_KEY_PREFIX + "run:{{{}}}:stream"
+CHANNEL_RUN_CONTROL = REDIS_KEY_PREFIX + "run:{{{}}}:control"
+STRING_RUN_CONTROL = REDIS_KEY_PREFIX + "run:{{{}}}:control"
+STRING_RUN_ATTEMPT = REDIS_KEY_PREFIX + "run:{{{}}}:attempt"
+STRING_RUN_RUNNING = REDIS_KEY_PREFIX + "run:{{{}}}:running"
+LIST_RUN_QUEUE = REDIS_KEY_PREFIX + "run:queue"
+LOCK_RUN_SWEEP = REDIS_KEY_PREFIX + "run:sweep"
+
+
+def run_stream_channel(run_id: object, event: str) -> str:
+    """Channel to publish a run's stream event to.
+    Sharded pubsub has no pattern subscriptions, so there all events of a run
+    share one channel, and subscribers filter on the event in the frame."""
+    if SHARDED_PUBSUB:
+        return CHANNEL_RUN_STREAMS.format(run_id)
+    return CHANNEL_RUN_STREAM.format(run_id, event)
+
+
+async def subscribe_run(
+    pubsub: coredis.commands.pubsub.BasePubSub[bytes, coredis.pool.ConnectionPool],
+    run_id: object,
+    stream_mode: str | None = None,
+) -> None:
+    """Subscribe to a run's control channel and stream, for one or all modes."""
+    control_channel = CHANNEL_RUN_CONTROL.format(run_id)
+    if SHARDED_PUBSUB:
+        await pubsub.subscribe(CHANNEL_RUN_STREAMS.format(run_id), control_channel)
+    elif stream_mode is None:
+        await pubsub.psubscribe(CHANNEL_RUN_STREAM.format(run_id, "*"), control_channel)
+    else:
+        await pubsub.subscribe(
+            CHANNEL_RUN_STREAM.format(run_id, stream_mode), control_channel
+        )
+
+
+def publish(
+    client: coredis.Redis[bytes] | coredis.RedisCluster[bytes] | Any,
+    channel: str,
+    message: bytes | str,
+) -> Awaitable[int]:
+    """PUBLISH, or SPUBLISH with sharded pubsub. Accepts pipelines too."""
+    if SHARDED_PUBSUB:
+        return client.spublish(channel, message)
+    return client.publish(channel, message)
@@ -0,0 +1,41 @@
+"""Fixtures for tests against the Postgres database at DATABASE_URI.
+
+The database is expected to be migrated already, as the server does on
+startup. Tests using `conn` are skipped when it can't be reached.
+"""
+
+from collections.abc import AsyncIterator
+from uuid import uuid4
+
+import psycopg
+import pytest
+from psycopg import AsyncConnection
+from psycopg.rows import DictRow
+
+from api.utils import fetchone
+from storage.database import create_conn
+from storage.ops import Threads
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+@pytest.fixture
+async def conn() -> AsyncIterator[AsyncConnection[DictRow]]:
+    try:
+        conn = await create_conn(__test__=True)
+    except psycopg.OperationalError as e:
+        pytest.skip(f"Postgres is not available: {e}")
+    await conn.set_autocommit(True)
+    async with conn:
+        yield conn
+
+
+@pytest.fixture
+async def thread_id(conn: AsyncConnection[DictRow]) -> str:
+    """Create a thread to store checkpoints under."""
+    thread_id = uuid4()
+    await fetchone(await Threads.put(conn, thread_id, metadata={}, if_exists="raise"))
+    return str(thread_id)
@@ -0,0 +1,79 @@
+from typing import Annotated, Any, TypedDict
+
+import pytest
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage
+from langgraph.graph import END, START, StateGraph, add_messages
+
+from storage.async_postgres_checkpointer import (
+    DELTA_TYPE,
+    AsyncPostgresCheckpointer,
+    LazyChannelValues,
+    _Undecoded,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+class State(TypedDict):
+    messages: Annotated[list[AnyMessage], add_messages]
+
+
+def edit_first(state: State) -> dict[str, Any]:
+    # update a message in place, keeping the list and the message objects
+    state["messages"][0].content = f"edited {len(state['messages'])}"
+    return {"messages": [AIMessage("reply")]}
+
+
+def build(checkpointer: AsyncPostgresCheckpointer):
+    graph = StateGraph(State)
+    graph.add_node("edit_first", edit_first)
+    graph.add_edge(START, "edit_first")
+    graph.add_edge("edit_first", END)
+    return graph.compile(checkpointer=checkpointer)
+
+
+async def blob_types(conn, thread_id: str) -> list[str]:
+    cur = await conn.execute(
+        "SELECT type FROM checkpoint_blobs WHERE thread_id = %s AND channel = 'messages' ORDER BY version",
+        (thread_id,),
+    )
+    return [row["type"] for row in await cur.fetchall()]
+
+
+async def test_message_updated_in_place_is_stored(conn, thread_id):
+    config = {"configurable": {"thread_id": thread_id}}
+    graph = build(AsyncPostgresCheckpointer(conn))
+    await graph.ainvoke({"messages": [HumanMessage("first")]}, config)
+
+    # a new checkpointer seeds its delta bases from the stored checkpoint
+    graph = build(AsyncPostgresCheckpointer(conn))
+    await graph.ainvoke({"messages": [HumanMessage("second")]}, config)
+
+    state = await build(AsyncPostgresCheckpointer(conn)).aget_state(config)
+    assert [m.content for m in state.values["messages"]] == [
+        "edited 3",
+        "reply",
+        "second",
+        "reply",
+    ]
+    history = [
+        [m.content for m in snapshot.values.get("messages", [])]
+        async for snapshot in graph.aget_state_history(config)
+    ]
+    assert history[0] == ["edited 3", "reply", "second", "reply"]
+    assert DELTA_TYPE in await blob_types(conn, thread_id)
+
+
+async def test_get_tuple_leaves_channel_values_undecoded(conn, thread_id):
+    config = {"configurable": {"thread_id": thread_id}}
+    checkpointer = AsyncPostgresCheckpointer(conn)
+    await build(checkpointer).ainvoke({"messages": [HumanMessage("first")]}, config)
+
+    checkpointer = AsyncPostgresCheckpointer(conn)
+    checkpoint_tuple = await checkpointer.aget_tuple(config)
+    channel_values = checkpoint_tuple.checkpoint["channel_values"]
+    assert isinstance(channel_values, LazyChannelValues)
+    assert channel_values
+    assert all(
+        type(dict.__getitem__(channel_values, k)) is _Undecoded for k in channel_values
+    )
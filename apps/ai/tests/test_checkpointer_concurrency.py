@@ -0,0 +1,80 @@
+import asyncio
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from uuid import uuid4
+
+import pytest
+from psycopg import AsyncConnection
+
+from api.config import N_JOBS_PER_WORKER
+from api.utils import fetchone
+from storage.async_postgres_checkpointer import AsyncPostgresCheckpointer
+from storage.database import create_pool
+from storage.ops import Threads
+from tests.test_write_behind import STEPS, build, stored_history
+
+pytestmark = pytest.mark.anyio
+
+TURNS = 3
+# the thread of the run a task belongs to
+RUN: ContextVar[str] = ContextVar("run")
+
+
+@pytest.fixture
+async def pool(conn):
+    pool = create_pool(__test__=True)
+    await pool.open(wait=True)
+    async with pool:
+        yield pool
+
+
+async def test_concurrent_runs_share_no_connection(conn, pool, monkeypatch):
+    # connection -> the run whose pipeline is open on it
+    active: dict[int, str] = {}
+    pipelines: list[tuple[object, str]] = []
+    overlaps = []
+    open_pipeline = AsyncConnection.pipeline
+
+    @asynccontextmanager
+    async def pipeline(self):
+        run = RUN.get()
+        if (other := active.get(id(self))) is not None:
+            overlaps.append((run, other))
+        active[id(self)] = run
+        try:
+            async with open_pipeline(self) as p:
+                pipelines.append((p, run))
+                # let the other runs issue their writes meanwhile
+                await asyncio.sleep(0)
+                yield p
+        finally:
+            del active[id(self)]
+
+    monkeypatch.setattr(AsyncConnection, "pipeline", pipeline)
+    checkpointer = AsyncPostgresCheckpointer(pool)
+    graph = build(checkpointer)
+    thread_ids = [str(uuid4()) for _ in range(N_JOBS_PER_WORKER)]
+    for thread_id in thread_ids:
+        await fetchone(
+            await Threads.put(conn, thread_id, metadata={}, if_exists="raise")
+        )
+
+    async def run(thread_id: str) -> None:
+        RUN.set(thread_id)
+        config = {"configurable": {"thread_id": thread_id}}
+        for _ in range(TURNS):
+            await graph.ainvoke({"steps": []}, config, durability="sync")
+
+    await asyncio.gather(*(run(thread_id) for thread_id in thread_ids))
+
+    assert not overlaps
+    assert pipelines, "pooled writes weren't pipelined"
+    runs_by_pipeline: dict[int, set[str]] = {}
+    for p, run in pipelines:
+        runs_by_pipeline.setdefault(id(p), set()).add(run)
+    assert all(len(runs) == 1 for runs in runs_by_pipeline.values())
+    assert {run for _, run in pipelines} == set(thread_ids)
+    for thread_id in thread_ids:
+        history = await stored_history(conn, thread_id)
+        assert len(history) == TURNS * (STEPS + 2)
+        assert history[0][0] == {"steps": list(range(STEPS)) * TURNS}
@@ -0,0 +1,40 @@
+import pytest
+
+from api.utils import fetchone
+from storage.async_postgres_checkpointer import (
+    AsyncPostgresCheckpointer,
+    compact_checkpoints,
+)
+from storage.ops import Threads
+from tests.test_write_behind import STEPS, build, stored_history
+
+pytestmark = pytest.mark.anyio
+
+
+async def run_turns(conn, thread_id: str, turns: int) -> None:
+    graph = build(AsyncPostgresCheckpointer(conn))
+    config = {"configurable": {"thread_id": thread_id}}
+    for _ in range(turns):
+        await graph.ainvoke({"steps": []}, config, durability="sync")
+
+
+async def test_compaction_keeps_checkpoints_forks_inherit(conn, thread_id):
+    await run_turns(conn, thread_id, 2)
+    fork = await fetchone(await Threads.copy(conn, thread_id))
+    fork_id = str(fork["thread_id"])
+    fork_history = await stored_history(conn, fork_id)
+    assert len(fork_history) == 2 * (STEPS + 2)
+    await run_turns(conn, thread_id, 2)
+
+    stats = await compact_checkpoints(conn, keep_latest=1, throttle_secs=0)
+
+    # the parent's checkpoints after the fork checkpoint were compacted
+    assert stats["checkpoints_deleted"] >= STEPS
+    parent_history = await stored_history(conn, thread_id)
+    assert len(parent_history) < 4 * (STEPS + 2)
+    assert parent_history[-len(fork_history) :] == fork_history
+    assert await stored_history(conn, fork_id) == fork_history
+    state = await build(AsyncPostgresCheckpointer(conn)).aget_state(
+        {"configurable": {"thread_id": fork_id}}
+    )
+    assert state.values == {"steps": list(range(STEPS)) * 2}
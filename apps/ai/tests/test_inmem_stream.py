@@ -0,0 +1,95 @@
+import asyncio
+from unittest import mock
+from uuid import uuid4
+
+import pytest
+from hypothesis import given
+from hypothesis import strategies as st
+
+from storage import inmem_stream
+from storage.broker import InMemSubscriber
+from storage.inmem_stream import Message, StreamManager, _parse_stream_id
+from storage.redis import CHANNEL_RUN_CONTROL, CHANNEL_RUN_STREAM
+
+
+def test_parse_stream_id():
+    assert _parse_stream_id("1724342400000-3") == (1724342400000, 3)
+    assert _parse_stream_id("1724342400000") == (1724342400000, 0)
+    assert _parse_stream_id("-") is None
+    # malformed IDs replay the whole stream
+    assert _parse_stream_id("abc-1") is None
+    assert _parse_stream_id("1724342400000-x") is None
+
+
+async def resume(
+    clock: list[int], subscribed_at: int, replayed_at: int, resume_after: int | None
+) -> tuple[list[bytes], list[bytes]]:
+    """Publish a message per clock reading, resuming a subscriber mid-way.
+
+    Returns the data of the messages published and of those received.
+    """
+    manager = StreamManager(queue_size=len(clock), buffer_size=len(clock))
+    run_id = uuid4()
+    topic = CHANNEL_RUN_STREAM.format(run_id, "values").encode()
+    subscriber = InMemSubscriber(manager)
+    published: list[Message] = []
+    received = []
+    with mock.patch.object(
+        inmem_stream.time, "time", side_effect=[ms / 1000 for ms in clock]
+    ):
+        for i in range(len(clock)):
+            if i == subscribed_at:
+                await subscriber.subscribe_run(run_id)
+            if i == replayed_at:
+                last_event_id = (
+                    published[resume_after].id.decode()
+                    if resume_after is not None
+                    else "-"
+                )
+                received += await subscriber.replay(run_id, last_event_id)
+            message = Message(topic=topic, data=str(i).encode())
+            await manager.put(run_id, None, message, resumable=True)
+            published.append(message)
+    while event := await subscriber.get_message(timeout=0.01):
+        received.append(event)
+    return [m.data for m in published], [event["data"] for event in received]
+
+
+@given(
+    clock=st.lists(st.integers(1_000, 1_005), min_size=1, max_size=40),
+    data=st.data(),
+)
+def test_resume_delivers_every_message_once_in_order(clock, data):
+    n = len(clock)
+    subscribed_at = data.draw(st.integers(0, n - 1))
+    replayed_at = data.draw(st.integers(subscribed_at, n - 1))
+    resume_after = data.draw(st.none() | st.integers(-1, replayed_at - 1))
+    if resume_after == -1:
+        resume_after = None
+    published, received = asyncio.run(
+        resume(clock, subscribed_at, replayed_at, resume_after)
+    )
+    start = 0 if resume_after is None else resume_after + 1
+    assert received == published[start:]
+
+
+@pytest.mark.anyio
+async def test_lagging_subscriber_keeps_control_messages():
+    manager = StreamManager(queue_size=2, policy="drop-oldest")
+    run_id = uuid4()
+    topic = CHANNEL_RUN_STREAM.format(run_id, "values").encode()
+    subscriber = InMemSubscriber(manager)
+    await subscriber.subscribe_run(run_id)
+    for i in range(5):
+        await manager.put(run_id, None, Message(topic=topic, data=str(i).encode()))
+    await manager.put(
+        run_id,
+        None,
+        Message(topic=CHANNEL_RUN_CONTROL.format(run_id).encode(), data=b"done"),
+    )
+    for i in range(5, 7):
+        await manager.put(run_id, None, Message(topic=topic, data=str(i).encode()))
+    received = []
+    while event := await subscriber.get_message(timeout=0.01):
+        received.append(event["data"])
+    assert received == [b"done", b"5", b"6"]
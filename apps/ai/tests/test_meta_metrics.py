@@ -0,0 +1,39 @@
+from uuid import uuid4
+
+import pytest
+
+from api.api import meta
+from storage import inmem_stream
+from storage.inmem_stream import Message, StreamManager
+from storage.redis import CHANNEL_RUN_STREAM
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_stream_metrics(monkeypatch):
+    manager = StreamManager(queue_size=1)
+    monkeypatch.setattr(inmem_stream, "stream_manager", manager)
+    run_id = uuid4()
+    topic = CHANNEL_RUN_STREAM.format(run_id, "values").encode()
+    await manager.add_queue(run_id, None)
+    for data in (b"first", b"second"):
+        await manager.put(run_id, None, Message(topic=topic, data=data), True)
+
+    metrics = meta.stream_metrics()
+    run_labels = f'run_id="{run_id}"'
+    [queued] = [
+        m for m in metrics if m.startswith("lg_api_stream_subscriber_queued_messages{")
+    ]
+    assert run_labels in queued and 'subscriber="0"' in queued
+    assert queued.endswith(" 1")
+    [dropped] = [
+        m
+        for m in metrics
+        if m.startswith("lg_api_stream_subscriber_dropped_messages_total{")
+    ]
+    assert dropped.endswith(" 1")
+    [buffered] = [
+        m for m in metrics if m.startswith("lg_api_stream_run_buffered_messages{")
+    ]
+    assert run_labels in buffered and buffered.endswith(" 2")
+    assert "# TYPE lg_api_stream_run_evicted_messages_total counter" in metrics
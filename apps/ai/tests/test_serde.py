@@ -0,0 +1,58 @@
+import uuid
+from datetime import UTC, datetime
+
+import pytest
+import zstandard
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from api import serde
+
+
+def history(n: int) -> list:
+    messages = []
+    for i in range(n):
+        messages.append(HumanMessage(f"question {i} " * 20, id=str(uuid.uuid4())))
+        messages.append(
+            AIMessage(
+                f"answer {i}",
+                tool_calls=[{"name": "search", "args": {"q": i}, "id": f"call_{i}"}],
+            )
+        )
+        messages.append(ToolMessage(f"result {i}", tool_call_id=f"call_{i}"))
+    return messages
+
+
+@pytest.mark.parametrize("checkpoint_serde", ["jsonplus", "msgpack"])
+@pytest.mark.parametrize(
+    "value",
+    [
+        [],
+        history(1),
+        history(10),
+        [uuid.uuid4(), datetime.now(UTC), {"a": [1, 2.5, None]}, b"raw", "x" * 1000],
+        list(range(70_000)),
+    ],
+    ids=["empty", "short", "long", "mixed", "large"],
+)
+def test_dumps_typed_items_matches_dumps_typed(monkeypatch, checkpoint_serde, value):
+    monkeypatch.setattr(serde, "CHECKPOINT_SERDE", checkpoint_serde)
+    serializer = serde.Serializer()
+    items = serializer.dumps_items(value)
+    assert items is not None
+    assert serializer.dumps_typed_items(items) == serializer.dumps_typed(value)
+
+
+def test_dumps_items_falls_back_for_unserializable_items():
+    assert serde.Serializer().dumps_items([1, object()]) is None
+
+
+def test_loads_typed_names_missing_dictionary(monkeypatch):
+    monkeypatch.setattr(serde, "CHECKPOINT_COMPRESSION_MIN_BYTES", 1)
+    samples = [serde.typed_msgpack_dumps(message) for message in history(200)]
+    dictionary = zstandard.train_dictionary(4096, samples)
+    serializer = serde.Serializer(compression_dict=dictionary)
+    data = serializer.dumps_typed(history(2))
+    assert data[0].endswith(serde.ZSTD_SUFFIX)
+
+    with pytest.raises(ValueError, match=str(dictionary.dict_id())):
+        serde.Serializer().loads_typed(data)
@@ -0,0 +1,79 @@
+import asyncio
+from collections.abc import AsyncIterator
+from typing import Any
+
+import pytest
+
+from api import sse
+
+pytestmark = pytest.mark.anyio
+
+SCOPE = {"type": "http", "method": "GET", "path": "/", "headers": []}
+INTERVAL = 0.05
+
+
+@pytest.fixture(autouse=True)
+def heartbeats(monkeypatch) -> sse.HeartbeatScheduler:
+    scheduler = sse.HeartbeatScheduler(interval=INTERVAL, tick=INTERVAL / 5)
+    monkeypatch.setattr(sse, "HEARTBEATS", scheduler)
+    return scheduler
+
+
+async def idle_body() -> AsyncIterator[bytes]:
+    await asyncio.Event().wait()
+    yield b""
+
+
+def open_stream(received: list[bytes], stalled: bool = False) -> asyncio.Task:
+    async def receive() -> dict[str, Any]:
+        await asyncio.Event().wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict[str, Any]) -> None:
+        if message["type"] == "http.response.body" and message.get("body"):
+            if stalled:
+                await asyncio.Event().wait()
+            received.append(message["body"])
+
+    return asyncio.create_task(
+        sse.EventSourceResponse(idle_body())(SCOPE, receive, send)
+    )
+
+
+async def heartbeat_tasks(n: int) -> tuple[int, list[list[bytes]]]:
+    """Most tasks running besides the streams' own while `n` streams idle."""
+    before = len(asyncio.all_tasks())
+    received: list[list[bytes]] = [[] for _ in range(n)]
+    streams = [open_stream(r) for r in received]
+    most = 0
+    for _ in range(100):
+        await asyncio.sleep(INTERVAL / 20)
+        most = max(most, len(asyncio.all_tasks()) - before)
+    for stream in streams:
+        stream.cancel()
+    await asyncio.gather(*streams, return_exceptions=True)
+    # the scheduler exits once no streams are open
+    await sse.HEARTBEATS.task
+    # a stream runs in its task, with a child listening for disconnects
+    return most - 2 * n, received
+
+
+async def test_heartbeat_task_count_is_flat():
+    few, few_received = await heartbeat_tasks(10)
+    many, many_received = await heartbeat_tasks(200)
+    # just the scheduler's
+    assert few == many == 1
+    for received in (few_received, many_received):
+        assert all(received), "a stream got no heartbeat"
+        assert {body for r in received for body in r} == {sse.HEARTBEAT_PAYLOAD}
+
+
+async def test_stalled_stream_is_cancelled():
+    stalled = open_stream([], stalled=True)
+    received: list[bytes] = []
+    other = open_stream(received)
+    await asyncio.sleep(INTERVAL * 5)
+    assert stalled.done()
+    assert len(received) >= 3
+    other.cancel()
+    await asyncio.gather(other, return_exceptions=True)
@@ -0,0 +1,78 @@
+import os
+
+from api.config import MAX_STREAM_CHUNK_SIZE_BYTES, STREAM_SPLIT_THRESHOLD_BYTES
+from api.utils.stream_codec import (
+    FragmentBuffer,
+    StreamCodec,
+    StreamPacket,
+    decode_stream_message,
+)
+
+MESSAGE = os.urandom(1024 * 16) * 4
+
+
+def split_codec() -> StreamCodec:
+    return StreamCodec(max_frame_size=1024, compress_min_size=512, split_frames=True)
+
+
+def test_split_frames_disabled():
+    codec = StreamCodec(max_frame_size=1024, compress_min_size=512)
+    frame = codec.encode("values", MESSAGE, stream_id="1-0")
+    assert not codec.split_frames
+    assert not codec.needs_split(frame)
+    assert codec.split(frame) == [frame]
+
+
+def test_split_frames_round_trip():
+    codec = split_codec()
+    frame = codec.encode("values", MESSAGE, stream_id="1-0")
+    frames = codec.split(frame)
+    assert len(frames) > 1
+    assert all(len(f) <= codec.max_frame_size for f in frames)
+
+    fragments = FragmentBuffer()
+    *head, last = [decode_stream_message(f, fragments=fragments) for f in frames]
+    assert head == [None] * len(head)
+    assert last.message_bytes == MESSAGE
+    assert last.event_bytes == b"values"
+    assert last.stream_id_bytes == b"1-0"
+    assert not fragments.pending
+
+
+def test_split_multi_megabyte_frame():
+    # frames between the split threshold and MAX_STREAM_CHUNK_SIZE_BYTES
+    codec = StreamCodec(split_frames=True)
+    assert codec.max_frame_size == STREAM_SPLIT_THRESHOLD_BYTES
+    assert codec.max_frame_size < MAX_STREAM_CHUNK_SIZE_BYTES
+    message = os.urandom(8 * 1024 * 1024)
+    frame = codec.encode("values", message, stream_id="1-0")
+    frames = codec.split(frame)
+    assert len(frames) >= len(frame) // codec.max_frame_size
+    assert all(len(f) <= codec.max_frame_size for f in frames)
+
+    fragments = FragmentBuffer()
+    packets = [decode_stream_message(f, fragments=fragments) for f in reversed(frames)]
+    assert packets[:-1] == [None] * (len(frames) - 1)
+    assert packets[-1].message_bytes == message
+
+
+def fragment(index: int, count: int) -> StreamPacket:
+    return StreamPacket(
+        version=1,
+        event=b"values",
+        message=b"chunk",
+        stream_id=None,
+        fragment=(b"12345678", index, count),
+    )
+
+
+def test_fragment_buffer_drops_malformed_index():
+    fragments = FragmentBuffer()
+    assert fragments.add(fragment(2, 2)) is None
+    assert fragments.add(fragment(0, 0)) is None
+    assert not fragments.pending
+
+    assert fragments.add(fragment(0, 2)) is None
+    # the count of the first fragment seen holds for the message
+    assert fragments.add(fragment(2, 3)) is None
+    assert fragments.add(fragment(1, 2)).message_bytes == b"chunkchunk"
@@ -0,0 +1,155 @@
+from contextlib import asynccontextmanager
+from typing import Annotated, Any, TypedDict
+from uuid import uuid4
+
+import httpx
+import jsonschema_rs
+import pytest
+from langchain_core.messages import AnyMessage
+from langgraph.graph import END, START, StateGraph, add_messages
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+
+from api import graph as graph_module
+from api.api import threads as threads_api
+from api.errors import http_exception_handler, validation_error_handler
+from api.utils import fetchone
+from storage import ops
+from storage.async_postgres_checkpointer import BulkCheckpointer
+from storage.ops import Threads
+
+pytestmark = pytest.mark.anyio
+
+GRAPH_ID = "bulk_state_test"
+
+
+class State(TypedDict):
+    messages: Annotated[list[AnyMessage], add_messages]
+
+
+def reply(state: State) -> dict[str, Any]:
+    return {"messages": [{"role": "ai", "content": "reply"}]}
+
+
+@pytest.fixture
+async def client(conn, monkeypatch):
+    builder = StateGraph(State)
+    builder.add_node("reply", reply)
+    builder.add_edge(START, "reply")
+    builder.add_edge("reply", END)
+    monkeypatch.setitem(graph_module.GRAPHS, GRAPH_ID, builder.compile())
+
+    @asynccontextmanager
+    async def connect():
+        yield conn
+
+    monkeypatch.setattr(threads_api, "connect", connect)
+    app = Starlette(
+        routes=threads_api.threads_routes,
+        exception_handlers={
+            HTTPException: http_exception_handler,
+            jsonschema_rs.ValidationError: validation_error_handler,
+        },
+    )
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        yield client
+
+
+@pytest.fixture
+async def graph_thread_id(conn) -> str:
+    thread_id = uuid4()
+    await fetchone(
+        await Threads.put(
+            conn, thread_id, metadata={"graph_id": GRAPH_ID}, if_exists="raise"
+        )
+    )
+    return str(thread_id)
+
+
+def update(content: str, as_node: str = "reply") -> dict[str, Any]:
+    return {
+        "values": {"messages": [{"role": "human", "content": content}]},
+        "as_node": as_node,
+    }
+
+
+async def checkpoint_count(conn, thread_id: str) -> int:
+    cur = await conn.execute(
+        "SELECT count(*) FROM checkpoints WHERE thread_id = %s", (thread_id,)
+    )
+    return (await cur.fetchone())["count"]
+
+
+async def test_bulk_update_applies_supersteps(client, graph_thread_id):
+    response = await client.post(
+        f"/threads/{graph_thread_id}/state/bulk",
+        json={
+            "supersteps": [
+                {"updates": [update("first")]},
+                {"updates": [update("second")]},
+            ]
+        },
+    )
+    assert response.status_code == 200, response.text
+    checkpoint_id = response.json()["checkpoint"]["checkpoint_id"]
+
+    thread = (await client.get(f"/threads/{graph_thread_id}")).json()
+    assert thread["status"] == "idle"
+    assert [m["content"] for m in thread["values"]["messages"]] == ["first", "second"]
+    state = (await client.get(f"/threads/{graph_thread_id}/state")).json()
+    assert state["checkpoint"]["checkpoint_id"] == checkpoint_id
+    assert state["next"] == []
+
+
+async def test_bulk_update_rejects_invalid_update(client, conn, graph_thread_id):
+    response = await client.post(
+        f"/threads/{graph_thread_id}/state/bulk",
+        json={
+            "supersteps": [
+                {"updates": [update("first")]},
+                {"updates": [update("second", as_node="missing")]},
+            ]
+        },
+    )
+    assert response.status_code == 400
+    assert "missing" in response.json()["detail"]
+    # no superstep was written
+    assert await checkpoint_count(conn, graph_thread_id) == 0
+
+
+async def test_bulk_update_rejects_invalid_body(client, conn, graph_thread_id):
+    response = await client.post(
+        f"/threads/{graph_thread_id}/state/bulk",
+        json={"supersteps": [{"updates": []}]},
+    )
+    assert response.status_code == 422
+    assert await checkpoint_count(conn, graph_thread_id) == 0
+
+
+async def test_bulk_update_flushes_before_setting_status(
+    client, graph_thread_id, monkeypatch
+):
+    calls = []
+    aflush = BulkCheckpointer.aflush
+    set_status = Threads.set_status
+
+    async def recording_aflush(self):
+        calls.append(("aflush", len(self.pending)))
+        await aflush(self)
+
+    async def recording_set_status(*args, **kwargs):
+        calls.append(("set_status", None))
+        return await set_status(*args, **kwargs)
+
+    monkeypatch.setattr(BulkCheckpointer, "aflush", recording_aflush)
+    monkeypatch.setattr(ops.Threads, "set_status", recording_set_status)
+    response = await client.post(
+        f"/threads/{graph_thread_id}/state/bulk",
+        json={"supersteps": [{"updates": [update("first")]}]},
+    )
+    assert response.status_code == 200, response.text
+    # reads flush the (empty) queue first, the last flush writes the supersteps
+    assert [name for name, _ in calls][-2:] == ["aflush", "set_status"]
+    assert calls[-2][1] > 0
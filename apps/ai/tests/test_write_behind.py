@@ -0,0 +1,102 @@
+import operator
+from typing import Annotated, Any, TypedDict
+from uuid import uuid4
+
+import pytest
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.graph import END, START, StateGraph
+
+from api.utils import fetchone
+from storage.async_postgres_checkpointer import (
+    AsyncPostgresCheckpointer,
+    WriteBehindCheckpointer,
+)
+from storage.ops import Threads
+
+pytestmark = pytest.mark.anyio
+
+STEPS = 5
+
+
+class State(TypedDict):
+    steps: Annotated[list[int], operator.add]
+
+
+def step(i: int):
+    def call(state: State) -> dict[str, Any]:
+        return {"steps": [i]}
+
+    return call
+
+
+def build(checkpointer: AsyncPostgresCheckpointer):
+    graph = StateGraph(State)
+    previous = START
+    for i in range(STEPS):
+        graph.add_node(f"step_{i}", step(i))
+        graph.add_edge(previous, f"step_{i}")
+        previous = f"step_{i}"
+    graph.add_edge(previous, END)
+    return graph.compile(checkpointer=checkpointer)
+
+
+async def stored_history(conn, thread_id: str) -> list[tuple[Any, Any]]:
+    """Read a thread's history with a checkpointer that has nothing queued."""
+    graph = build(AsyncPostgresCheckpointer(conn))
+    config = {"configurable": {"thread_id": thread_id}}
+    return [
+        (snapshot.values, snapshot.metadata["step"], len(snapshot.tasks))
+        async for snapshot in graph.aget_state_history(config)
+    ]
+
+
+async def test_flushed_run_matches_synchronous_run(conn, thread_id):
+    checkpointer = WriteBehindCheckpointer(conn, max_batch=2)
+    config = {"configurable": {"thread_id": thread_id}}
+    await build(checkpointer).ainvoke({"steps": []}, config, durability="async")
+    await checkpointer.aflush()
+    assert not checkpointer.pending
+
+    sync_thread_id = uuid4()
+    await fetchone(
+        await Threads.put(conn, sync_thread_id, metadata={}, if_exists="raise")
+    )
+    await build(AsyncPostgresCheckpointer(conn)).ainvoke(
+        {"steps": []},
+        {"configurable": {"thread_id": str(sync_thread_id)}},
+        durability="sync",
+    )
+
+    history = await stored_history(conn, thread_id)
+    assert history[0][0] == {"steps": list(range(STEPS))}
+    assert len(history) == STEPS + 2
+    assert history == await stored_history(conn, str(sync_thread_id))
+
+
+async def test_reads_flush_queued_writes(conn, thread_id):
+    checkpointer = WriteBehindCheckpointer(conn)
+    graph = build(checkpointer)
+    config = {"configurable": {"thread_id": thread_id}}
+    await graph.ainvoke({"steps": []}, config, durability="async")
+
+    state = await graph.aget_state(config)
+    assert state.values == {"steps": list(range(STEPS))}
+    assert not checkpointer.pending
+    assert (await stored_history(conn, thread_id))[0][0] == state.values
+
+
+async def test_failed_flush_is_raised(conn, thread_id, monkeypatch):
+    checkpointer = WriteBehindCheckpointer(conn)
+
+    async def fail(batch: list[Any]) -> None:
+        raise RuntimeError("flush failed")
+
+    monkeypatch.setattr(checkpointer, "_write", fail)
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    await checkpointer.aput(config, empty_checkpoint(), {}, {})
+    with pytest.raises(RuntimeError, match="flush failed"):
+        await checkpointer.aflush()
+    # later puts fail too, instead of writing after the lost statements
+    with pytest.raises(RuntimeError, match="flush failed"):
+        await checkpointer.aput(config, empty_checkpoint(), {}, {})
+    assert not checkpointer.pending